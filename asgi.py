@@ -0,0 +1,338 @@
+"""
+ASGI Module
+Punto de entrada alternativo: las mismas rutas de backend.py bajo un servidor
+ASGI (uvicorn) en un solo proceso. /events se atiende con corrutinas (un
+suscriptor no ocupa un hilo) y el resto de las rutas corre en un pool de
+hilos; los cuerpos de respuesta se envían por bloques desde el event loop, así
+que un stream lento no retiene un hilo durante toda la transferencia.
+
+Uso:
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT
+"""
+
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import backend
+from config import Config
+
+CHUNK_SIZE = 64 * 1024
+
+
+class FileWrapper:
+    """
+    ``wsgi.file_wrapper`` del puente: envía Content-Length bytes desde la
+    posición actual del archivo (media_files lo usa también para rangos)
+    """
+
+    respects_content_length = True
+
+    def __init__(self, filelike, block_size=CHUNK_SIZE):
+        self.filelike = filelike
+        self.block_size = block_size
+
+    def __iter__(self):
+        return iter(lambda: self.filelike.read(self.block_size), b'')
+
+    def close(self):
+        close = getattr(self.filelike, 'close', None)
+        if close:
+            close()
+
+
+class RequestBody:
+    """``wsgi.input`` que pide los bloques del cuerpo al event loop a medida que la app los lee"""
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = bytearray()
+        self.more_body = True
+        self.disconnected = False
+
+    def _pull(self):
+        message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+        if message['type'] == 'http.disconnect':
+            self.more_body = False
+            self.disconnected = True
+            return
+        self._buffer += message.get('body', b'')
+        self.more_body = message.get('more_body', False)
+
+    def _take(self, size):
+        if size < 0 or size >= len(self._buffer):
+            data = bytes(self._buffer)
+            self._buffer.clear()
+        else:
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        return data
+
+    def read(self, size=-1):
+        size = -1 if size is None else size
+        while self.more_body and (size < 0 or len(self._buffer) < size):
+            self._pull()
+        return self._take(size)
+
+    def readline(self, size=-1):
+        size = -1 if size is None else size
+        while self.more_body and b'\n' not in self._buffer and (size < 0 or len(self._buffer) < size):
+            self._pull()
+        end = self._buffer.find(b'\n') + 1 or len(self._buffer)
+        return self._take(end if size < 0 else min(end, size))
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+
+async def wait_disconnect(receive, body=None):
+    """Consume los mensajes pendientes del cliente hasta que se desconecta"""
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            if body is not None:
+                body.disconnected = True
+            return
+
+
+def _header_value(headers, name):
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class WSGIBridge:
+    """
+    Ejecuta la app WSGI en ``executor``. A diferencia de un adaptador que
+    corre la petición completa en un hilo, la respuesta se envía desde el event
+    loop y cada bloque se lee en el pool: el hilo se libera entre bloques y los
+    archivos (FileWrapper) se leen de a ``CHUNK_SIZE`` respetando Content-Length.
+    """
+
+    def __init__(self, wsgi_app, executor):
+        self.wsgi_app = wsgi_app
+        self.executor = executor
+
+    def environ(self, scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'SERVER_SOFTWARE': 'asgi-bridge',
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.input_terminated': True,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+            'wsgi.file_wrapper': FileWrapper,
+        }
+        for key, value in scope['headers']:
+            key = key.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                key = f'HTTP_{key}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
+
+    async def __call__(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        body = RequestBody(receive, loop)
+        environ = self.environ(scope, body)
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+            return lambda data: None  # write() heredado: ninguna ruta lo usa
+
+        def call_app():
+            iterable = self.wsgi_app(environ, start_response)
+            first = None
+            if not started:
+                # start_response diferido hasta el primer bloque
+                iterator = iter(iterable)
+                first = next(iterator, b'')
+            return iterable, first
+
+        try:
+            iterable, first = await loop.run_in_executor(self.executor, call_app)
+        except Exception as e:
+            print(f"Error in ASGI bridge: {e}")
+            await send({'type': 'http.response.start', 'status': 500,
+                        'headers': [(b'content-type', b'text/plain')]})
+            await send({'type': 'http.response.body', 'body': b'Internal Server Error'})
+            return
+
+        # La app ya leyó lo que necesitaba del cuerpo: desde aquí solo interesa la desconexión
+        watcher = asyncio.ensure_future(wait_disconnect(receive, body)) if not body.disconnected else None
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': started['status'],
+                'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in started['headers']],
+            })
+            if first:
+                await send({'type': 'http.response.body', 'body': first, 'more_body': True})
+            if scope['method'] == 'HEAD':
+                pass
+            elif isinstance(iterable, FileWrapper):
+                length = _header_value(started['headers'], 'content-length')
+                await self._send_file(loop, iterable, int(length) if length else None, send, body)
+            else:
+                await self._send_iterable(loop, iter(iterable), send, body)
+            if not body.disconnected:
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            close = getattr(iterable, 'close', None)
+            if close:
+                await loop.run_in_executor(self.executor, close)
+
+    async def _send_file(self, loop, wrapper, remaining, send, body):
+        read = wrapper.filelike.read
+        while not body.disconnected and (remaining is None or remaining > 0):
+            size = wrapper.block_size if remaining is None else min(wrapper.block_size, remaining)
+            chunk = await loop.run_in_executor(self.executor, read, size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+    async def _send_iterable(self, loop, iterator, send, body):
+        while not body.disconnected:
+            chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+
+class AsyncEventStream:
+    """
+    /events nativo: cada suscriptor es una corrutina con un cursor sobre el
+    buffer del EventBroker. ``publish`` (desde cualquier hilo) despierta al
+    event loop, que despierta de una vez a todos los suscriptores.
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.closing = False
+        self._loop = None
+        self._changed = None
+        broker.add_listener(self._on_publish)
+
+    def bind(self, loop):
+        if self._loop is None:
+            self._loop = loop
+            self._changed = asyncio.Event()
+
+    def close(self):
+        self.closing = True
+        self._wake()
+
+    def _on_publish(self):
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        if self._changed is not None:
+            changed, self._changed = self._changed, asyncio.Event()
+            changed.set()
+
+    async def _send(self, send, text):
+        await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+
+    async def __call__(self, scope, receive, send):
+        self.bind(asyncio.get_running_loop())
+        last_event_id = _header_value(scope['headers'], b'last-event-id')
+        if last_event_id:
+            last_event_id = last_event_id.decode('latin-1')
+        else:
+            last_event_id = parse_qs(scope['query_string'].decode('latin-1')).get('last_event_id', [None])[0]
+
+        position, reset = self.broker.open(last_event_id)
+        disconnected = asyncio.ensure_future(wait_disconnect(receive))
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream; charset=utf-8'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no'),
+                    (b'access-control-allow-origin', b'*'),
+                ],
+            })
+            await self._send(send, f'retry: {self.broker.retry_ms}\n\n')
+            if reset:
+                await self._send(send, self.broker.reset_event())
+            while not self.closing:
+                # Se toma el Event antes de leer: una publicación posterior lo marca
+                changed = self._changed
+                text, position = self.broker.read(position)
+                if text:
+                    await self._send(send, text)
+                    continue
+                waiter = asyncio.ensure_future(changed.wait())
+                done, _ = await asyncio.wait((waiter, disconnected), timeout=self.broker.heartbeat,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                if disconnected in done:
+                    return
+                if not done:
+                    await self._send(send, ': heartbeat\n\n')
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            disconnected.cancel()
+            self.broker.close()
+
+
+class ASGIApp:
+    def __init__(self, wsgi_app, broker, threads):
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='asgi')
+        self.bridge = WSGIBridge(wsgi_app, self.executor)
+        self.events = AsyncEventStream(broker)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            if scope['path'] == '/events' and scope['method'] == 'GET':
+                await self.events(scope, receive, send)
+            else:
+                await self.bridge(scope, receive, send)
+        else:
+            await send({'type': 'websocket.close'})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.events.bind(asyncio.get_running_loop())
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # Los suscriptores de /events terminan para que el servidor pueda cerrar
+                self.events.close()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+app = ASGIApp(backend.app, backend.event_broker, Config.ASGI_THREADS)
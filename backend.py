@@ -1,237 +1,402 @@
-from flask import Flask, request, jsonify, send_from_directory, send_file, Response
+from flask import Flask, request, jsonify, send_file, make_response, g, Response
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from dataclasses import dataclass
-from typing import Optional, List
+from werkzeug.security import safe_join
+import hmac
 import os
-import uuid
-import pickle
-import requests
+import random
+import time
+from urllib.parse import urlparse
+from http_client import HTTPClient, parse_pool_sizes
+from preview_cache import PreviewCache, PreviewFetchError
+from media_files import IMMUTABLE_CACHE_CONTROL, serve_media
+from upload_store import UploadError, UploadStore
+from media_metadata import MetadataIndex
+from events import EventBroker
+import metrics
+from metrics import REGISTRY
+from profiler import PROFILER
+from rwlock import RWLock
+from transcoder import RENDITIONS, Transcoder, rendition_for_mimetypes
 from youtube_integration import YouTubeIntegration
+from playlist_engine import Track, IndexedPlaylist
+from playlist_journal import PlaylistJournal
+from search_index import LookupIndex, SearchIndex
+from download_jobs import DownloadJobQueue, FAILED as JOB_FAILED
 from config import Config
 
+class TracedJSONProvider(DefaultJSONProvider):
+    """jsonify y app.json.dumps cuentan como 'serialization' en las peticiones lentas"""
+
+    def dumps(self, obj, **kwargs):
+        with PROFILER.span('serialization'):
+            return super().dumps(obj, **kwargs)
+
 app = Flask(__name__)
+app.json = TracedJSONProvider(app)
 CORS(app)  # Enable CORS for frontend
 
 # Configuración desde config.py
 app.config.from_object(Config)
 UPLOAD_FOLDER = Config.UPLOAD_FOLDER
 DOWNLOAD_FOLDER = Config.DOWNLOAD_FOLDER
-PLAYLIST_FILE = 'playlist.pkl'
+PLAYLIST_FILE = 'playlist.pkl'  # formato antiguo, solo para migrar
+PLAYLIST_SNAPSHOT_FILE = 'playlist.snapshot'
+PLAYLIST_JOURNAL_FILE = 'playlist.journal'
+
+# Con gunicorn gthread cada petición corre en un hilo: las lecturas de la
+# playlist corren en paralelo y las mutaciones son exclusivas (RWLock); los
+# streams, subidas y llamadas a yt-dlp no toman el lock (las que tocan la
+# playlist lo toman solo alrededor de ese acceso). Entre workers, las que
+# pueden mutarla toman además el flock del journal.
+request_lock = RWLock()
+CONCURRENT_ENDPOINTS = {
+    'events', 'uploaded_file', 'downloaded_file', 'proxy_deezer', 'upload_file',
+    'create_upload_session', 'get_upload_session', 'append_upload_session', 'cancel_upload_session',
+    'youtube_info', 'youtube_download', 'add_youtube_url',
+    'static', 'metrics_endpoint', 'profiler_status', 'profiler_configure',
+    'profiler_folded', 'profiler_slow_requests',
+}
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Latencia por ruta (incluye la espera del lock); en streams mide hasta los headers
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'playerpro_http_request_seconds', 'Latencia de las peticiones HTTP', ('endpoint', 'method', 'status'),
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge('playerpro_http_requests_in_flight', 'Peticiones en curso', ('endpoint',))
+
+@app.before_request
+def start_request_timer():
+    # Registrado antes que el lock: la espera cuenta en la latencia
+    g.metrics_endpoint = request.endpoint or 'unmatched'
+    g.request_started = time.perf_counter()
+    HTTP_IN_FLIGHT.inc(g.metrics_endpoint)
+    PROFILER.begin(g.metrics_endpoint, request.method)
+
+@app.after_request
+def observe_request(response):
+    started = g.get('request_started')
+    if started is not None:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, g.metrics_endpoint,
+                                     request.method, response.status_code)
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_timer(exc):
+    endpoint = g.pop('metrics_endpoint', None)
+    if endpoint is not None:
+        HTTP_IN_FLIGHT.dec(endpoint)
+    PROFILER.end(g.pop('response_status', 500))
+
+@app.before_request
+def acquire_request_lock():
+    # Antes de tomar la lectura: agregar una descarga terminada es una escritura
+    apply_finished_downloads()
+    if request.endpoint in CONCURRENT_ENDPOINTS:
+        return
+    with PROFILER.span('lock_wait'):
+        if request.method in READ_METHODS:
+            # Solo lee el journal si otro worker cambió la playlist
+            journal.refresh()
+            request_lock.acquire_read()
+            g.release_request_lock = request_lock.release_read
+        else:
+            journal.acquire()
+            g.release_request_lock = journal.release
+
+@app.teardown_request
+def release_request_lock(exc):
+    release = g.pop('release_request_lock', None)
+    if release is not None:
+        release()
+
+# Perfilado: se activa con las variables de entorno o en caliente con /admin/profiler
+PROFILER.resize_slow_log(Config.SLOW_REQUEST_LOG_SIZE)
+PROFILER.configure(
+    sampling=Config.PROFILER_SAMPLING,
+    tracing=Config.SLOW_REQUEST_TRACING,
+    interval=Config.PROFILER_INTERVAL,
+    slow_threshold=Config.SLOW_REQUEST_THRESHOLD,
+)
 
 # Crear directorios necesarios
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
 
+# Subidas por contenido (SHA-256) escritas en streaming, con sesiones reanudables
+upload_store = UploadStore(UPLOAD_FOLDER, Config.MAX_UPLOAD_SIZE)
+
 # Validar configuración de YouTube
 Config.validate_youtube_api()
 
+# Cliente HTTP compartido por la API de YouTube y el proxy de Deezer
+http_client = HTTPClient(
+    pool_maxsize=Config.HTTP_POOL_MAXSIZE,
+    host_pool_sizes=parse_pool_sizes(Config.HTTP_HOST_POOLS),
+    connect_timeout=Config.HTTP_CONNECT_TIMEOUT,
+    read_timeout=Config.HTTP_READ_TIMEOUT,
+    retries=Config.HTTP_RETRIES,
+    backoff_factor=Config.HTTP_RETRY_BACKOFF,
+    max_retry_after=Config.HTTP_MAX_RETRY_AFTER,
+)
+
+# Previews de Deezer en disco: una descarga por URL, repeticiones y saltos sin red
+preview_cache = PreviewCache(
+    Config.PREVIEW_CACHE_FOLDER,
+    http_client,
+    max_bytes=Config.PREVIEW_CACHE_MAX_BYTES,
+)
+
+def is_pinned_download(filename):
+    # Se llama desde los hilos de descarga, fuera de las peticiones
+    with request_lock.read_locked():
+        return playlist.contains_path(f'/downloads/{filename}')
+
 # Inicializar integración de YouTube
-youtube = YouTubeIntegration(DOWNLOAD_FOLDER)
+# Los audios que siguen en la playlist no se expulsan de la caché de descargas
+youtube = YouTubeIntegration(
+    DOWNLOAD_FOLDER,
+    is_pinned=is_pinned_download,
+    http=http_client,
+)
 
-def save_playlist():
-    try:
-        with open(PLAYLIST_FILE, 'wb') as f:
-            pickle.dump(playlist.get_all_tracks(), f)
-    except Exception as e:
-        print(f"Error saving playlist: {e}")
+# Eventos para /events (SSE): mutaciones de la playlist, reproducción y descargas
+event_broker = EventBroker(
+    buffer_size=Config.EVENTS_BUFFER_SIZE,
+    heartbeat=Config.EVENTS_HEARTBEAT,
+)
 
-def load_playlist():
-    try:
-        with open(PLAYLIST_FILE, 'rb') as f:
-            tracks = pickle.load(f)
-            for track in tracks:
-                playlist.append(track)
-    except FileNotFoundError:
-        pass
-    except Exception as e:
-        print(f"Error loading playlist: {e}")
-
-# Data structures
-@dataclass
-class Track:
-    path: str
-    title: str
-
-class Node:
-    def __init__(self, track: Track):
-        self.track: Track = track
-        self.prev: Optional['Node'] = None
-        self.next: Optional['Node'] = None
-
-class DoublyLinkedPlaylist:
-    def __init__(self):
-        self.head: Optional[Node] = None
-        self.tail: Optional[Node] = None
-        self.current: Optional[Node] = None
-        self.length = 0
-        self.is_playing = False
-
-    def append(self, track: Track):
-        node = Node(track)
-        if not self.head:
-            self.head = self.tail = node
-            self.current = node
-        else:
-            self.tail.next = node
-            node.prev = self.tail
-            self.tail = node
-            self.current = node
-        self.length += 1
-
-    def prepend(self, track: Track):
-        node = Node(track)
-        if not self.head:
-            self.head = self.tail = node
-            self.current = node
-        else:
-            node.next = self.head
-            self.head.prev = node
-            self.head = node
-            self.current = node
-        self.length += 1
-
-    def insert_at_index(self, index: int, track: Track):
-        if index <= 0:
-            self.prepend(track)
-            return
-        if index >= self.length:
-            self.append(track)
-            return
-        node_at = self._node_at_index(index)
-        if node_at is None:
-            self.append(track)
-            return
-        node = Node(track)
-        prev_node = node_at.prev
-        prev_node.next = node
-        node.prev = prev_node
-        node.next = node_at
-        node_at.prev = node
-        self.current = node
-        self.length += 1
-
-    def remove_node(self, node: Node):
-        if node is None:
-            return
-        if node.prev:
-            node.prev.next = node.next
-        else:
-            self.head = node.next
-        if node.next:
-            node.next.prev = node.prev
-        else:
-            self.tail = node.prev
-        if self.current is node:
-            self.current = node.next or node.prev or None
-        node.prev = node.next = None
-        self.length -= 1
-
-    def remove_by_index(self, index: int) -> bool:
-        node = self._node_at_index(index)
-        if node:
-            self.remove_node(node)
-            return True
-        return False
-
-    def remove_by_title(self, title: str) -> bool:
-        node = self.head
-        while node:
-            if node.track.title.lower() == title.lower():
-                self.remove_node(node)
-                return True
-            node = node.next
-        return False
-
-    def next_track(self):
-        if self.current and self.current.next:
-            self.current = self.current.next
-            return self.current
-        return None
-
-    def prev_track(self):
-        if self.current and self.current.prev:
-            self.current = self.current.prev
-            return self.current
-        return None
-
-    def set_current_to_index(self, index: int):
-        node = self._node_at_index(index)
-        if node:
-            self.current = node
-
-    def iterate(self):
-        node = self.head
-        while node:
-            yield node
-            node = node.next
-
-    def get_all_tracks(self) -> List[Track]:
-        return [node.track for node in self.iterate()]
-
-    def search(self, query: str) -> List[Track]:
-        query = query.lower()
-        return [node.track for node in self.iterate() if query in node.track.title.lower()]
-
-    def shuffle(self):
-        import random
-        if self.length < 2:
-            return
-        tracks = self.get_all_tracks()
-        random.shuffle(tracks)
-        self.clear()
-        for track in tracks:
-            self.append(track)
-        self.current = self.head
-
-    def move(self, from_index: int, to_index: int):
-        if from_index == to_index or from_index < 0 or to_index < 0 or from_index >= self.length or to_index > self.length:
-            return
-        node = self._node_at_index(from_index)
-        if not node:
-            return
-        # remove the node
-        self.remove_node(node)
-        # insert at new position
-        if to_index > from_index:
-            to_index -= 1
-        self.insert_at_index(to_index, node.track)
-
-    def clear(self):
-        self.head = self.tail = self.current = None
-        self.length = 0
-
-    def _node_at_index(self, index: int) -> Optional[Node]:
-        if index < 0 or index >= self.length:
-            return None
-        if index < self.length // 2:
-            node = self.head
-            i = 0
-            while i < index:
-                node = node.next
-                i += 1
-            return node
-        else:
-            node = self.tail
-            i = self.length - 1
-            while i > index:
-                node = node.prev
-                i -= 1
-            return node
+def publish_job_event(job):
+    data = job.to_dict()
+    data.pop('result', None)
+    event_broker.publish('download', data)
+
+# Descargas en segundo plano: no bloquean el worker de gunicorn
+download_queue = DownloadJobQueue(
+    youtube,
+    Config.DOWNLOAD_JOBS_FILE,
+    max_workers=Config.YOUTUBE_DOWNLOAD_WORKERS,
+    max_queued=Config.YOUTUBE_MAX_QUEUED_DOWNLOADS,
+    on_update=publish_job_event,
+)
 
 # Global playlist instance
-playlist = DoublyLinkedPlaylist()
-load_playlist()
+playlist = IndexedPlaylist()
+# Índice de /search: se construye en la primera búsqueda y luego es incremental
+playlist.add_index(SearchIndex())
+# Multimapas título/path para /remove y la detección de duplicados
+playlist.add_index(LookupIndex())
+
+# Cada mutación queda registrada en el journal; no hace falta guardar a mano
+journal = PlaylistJournal(
+    PLAYLIST_SNAPSHOT_FILE,
+    PLAYLIST_JOURNAL_FILE,
+    fsync_batch=Config.PLAYLIST_FSYNC_BATCH,
+    fsync_interval=Config.PLAYLIST_FSYNC_INTERVAL,
+    compact_every=Config.PLAYLIST_COMPACT_EVERY,
+    playlist_lock=request_lock,
+)
+journal.load(playlist, legacy_path=PLAYLIST_FILE)
+# Con varios workers, aplica en segundo plano lo que cambian los demás
+journal.follow(Config.PLAYLIST_FOLLOW_INTERVAL)
+
+# Solo la playlist se comparte entre workers. La cola de descargas
+# (/youtube/jobs/<id>), las cachés de descargas y previews y los índices de
+# metadatos y versiones son de cada proceso y reescriben sus archivos desde
+# su propia copia: por eso el valor por defecto es un solo worker (con hilos)
+if int(os.getenv('WEB_CONCURRENCY', '1') or 1) > 1:
+    print("Warning: WEB_CONCURRENCY > 1 shares only the playlist; download jobs and caches are per worker")
+
+def local_changes(listener):
+    """
+    Efectos secundarios (ffprobe, transcodificación) solo para los cambios de
+    este worker: al reproducir el journal de otro, ese worker ya los lanzó
+    """
+    def on_change(op, args):
+        if not journal.replaying:
+            listener(op, args)
+    return on_change
+
+def resolve_media_path(track_path):
+    """Archivo local de una pista ('/uploads/x.mp3'), o None si es remota"""
+    for prefix, folder in (('/uploads/', UPLOAD_FOLDER), ('/downloads/', DOWNLOAD_FOLDER)):
+        if track_path.startswith(prefix):
+            return safe_join(folder, track_path[len(prefix):])
+    return None
+
+# Duración/códec/bitrate/tags con ffprobe en segundo plano, para cada pista agregada
+media_metadata = MetadataIndex(
+    Config.MEDIA_METADATA_FILE,
+    resolve_media_path,
+    max_workers=Config.METADATA_WORKERS,
+)
+playlist.subscribe(local_changes(media_metadata.on_playlist_change))
+
+def read_playlist_chunk(offset, limit):
+    # Desde el hilo de metadatos: solo decodifica ese bloque del snapshot
+    with request_lock.read_locked():
+        return playlist.tracks_range(offset, limit)
+
+media_metadata.backfill(read_playlist_chunk)
+
+# Versiones Opus/MP3 normalizadas (EBU R128) de cada pista local, generadas al agregarla
+transcoder = Transcoder(
+    Config.RENDITIONS_FOLDER,
+    Config.RENDITIONS_MAX_BYTES,
+    max_workers=Config.TRANSCODE_WORKERS,
+)
+
+def transcode_added_tracks(op, args):
+    tracks = args[0] if op == 'extend' else [args[-1]] if op in ('append', 'insert') else []
+    for track in tracks:
+        source = resolve_media_path(track.path)
+        if source is not None:
+            transcoder.submit(source)
+
+playlist.subscribe(local_changes(transcode_added_tracks))
+
+# Lotes grandes se notifican como 'reset': el cliente recarga /playlist
+MAX_EVENT_TRACKS = 100
+
+def publish_playlist_event(op, args):
+    payload = {'version': playlist.version}
+    if op in ('append', 'insert', 'extend'):
+        tracks = args[0] if op == 'extend' else [args[-1]]
+        if len(tracks) > MAX_EVENT_TRACKS:
+            event_type = 'reset'
+        else:
+            event_type = 'added'
+            payload['index'] = args[0] if op == 'insert' else playlist.length - len(tracks)
+            payload['tracks'] = [{'path': t.path, 'title': t.title} for t in tracks]
+    elif op == 'remove':
+        event_type = 'removed'
+        payload['index'] = args[0]
+    elif op == 'move':
+        event_type = 'moved'
+        payload['from'], payload['to'] = args
+    elif op in ('next', 'prev', 'set_current'):
+        event_type = 'current'
+    elif op == 'shuffle_play':
+        event_type = 'shuffle'
+        payload['seed'] = args[0]
+    else:  # shuffle, clear
+        event_type = 'reset'
+    payload['current'] = playlist.current_index()
+    event_broker.publish(event_type, payload)
+
+playlist.subscribe(publish_playlist_event)
+
+# Identifica este arranque en los ETag: la versión sola podría repetirse tras una caída.
+# La época la elige el primer worker, así que todos generan los mismos ETag
+BOOT_ID = f'{journal.epoch:08x}'
+
+# Cuerpo JSON de /playlist serializado una sola vez por versión (con y sin metadatos)
+_playlist_cache = {}
+_duration_cache = {}
+
+def track_to_dict(track, with_metadata=False):
+    data = {'path': track.path, 'title': track.title}
+    if with_metadata:
+        data['metadata'] = media_metadata.get(track.path)
+    return data
+
+def playlist_etag(with_metadata=False):
+    if with_metadata:
+        return f'{BOOT_ID}-{playlist.version}-m{media_metadata.version}'
+    return f'{BOOT_ID}-{playlist.version}'
+
+def playlist_total_duration():
+    """Suma de las duraciones conocidas; se recalcula solo si cambia la playlist o el índice"""
+    key = (playlist.version, media_metadata.version)
+    # (clave, valor) en una sola asignación: puede haber varios lectores a la vez
+    cached = _duration_cache.get('total')
+    if cached is None or cached[0] != key:
+        total = 0.0
+        for track in playlist.get_all_tracks():
+            metadata = media_metadata.get(track.path)
+            if metadata and metadata['duration']:
+                total += metadata['duration']
+        cached = _duration_cache['total'] = (key, round(total, 3))
+    return cached[1]
 
 # API Routes
 @app.route('/playlist', methods=['GET'])
 def get_playlist():
-    tracks = playlist.get_all_tracks()
-    return jsonify([{'path': t.path, 'title': t.title} for t in tracks])
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', type=int)
+    if offset < 0 or (limit is not None and limit < 0):
+        return jsonify({'error': 'Invalid offset or limit'}), 400
+    # ?metadata=1 agrega lo que ya se conoce de cada pista (null si aún no se analizó)
+    with_metadata = request.args.get('metadata', 'false').lower() in ('1', 'true', 'yes')
+    if offset or limit is not None:
+        body = app.json.dumps([track_to_dict(t, with_metadata) for t in playlist.tracks_range(offset, limit)])
+    else:
+        etag = playlist_etag(with_metadata)
+        cached = _playlist_cache.get(with_metadata)
+        if cached is None or cached[0] != etag:
+            cached = _playlist_cache[with_metadata] = (
+                etag, app.json.dumps([track_to_dict(t, with_metadata) for t in playlist.get_all_tracks()])
+            )
+        body = cached[1]
+    response = Response(body, mimetype='application/json')
+    response.set_etag(playlist_etag(with_metadata))
+    response.headers['X-Playlist-Version'] = str(playlist.version)
+    response.headers['X-Total-Count'] = str(playlist.length)
+    if with_metadata:
+        response.headers['X-Total-Duration'] = str(playlist_total_duration())
+    return response.make_conditional(request)
+
+@app.route('/playlist/changes', methods=['GET'])
+def get_playlist_changes():
+    """Delta sync: operaciones aplicadas después de ?since=<version>"""
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({'error': 'since parameter required'}), 400
+    changes = playlist.changes_since(since)
+    # shuffle depende del generador aleatorio de Python: el cliente no puede reproducirlo
+    if changes is None or any(op == 'shuffle' for _, op, _ in changes):
+        return jsonify({'reset': True, 'version': playlist.version, 'etag': f'"{playlist_etag()}"'})
+    ops = []
+    for version, op, args in changes:
+        if op in ('append', 'insert'):
+            args = (*args[:-1], track_to_dict(args[-1]))
+        elif op == 'extend':
+            args = ([track_to_dict(t) for t in args[0]],)
+        ops.append([version, op, *args])
+    return jsonify({'reset': False, 'version': playlist.version, 'etag': f'"{playlist_etag()}"', 'ops': ops})
+
+# Conexiones a /events rechazadas por EVENTS_MAX_SUBSCRIBERS
+EVENTS_REJECTED = REGISTRY.counter('playerpro_events_rejected_total', 'Conexiones a /events rechazadas (503)')
+
+@app.route('/events', methods=['GET'])
+def events():
+    """
+    Stream SSE de cambios; EventSource reenvía Last-Event-ID al reconectar.
+    Sin lugar (cada suscriptor ocupa un hilo) responde 503: EventSource no
+    reintenta y el cliente pasa a consultar la playlist periódicamente.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    opened = event_broker.open(last_event_id, Config.EVENTS_MAX_SUBSCRIBERS)
+    if opened is None:
+        EVENTS_REJECTED.inc()
+        response = jsonify({'error': 'Too many event subscribers, poll /playlist instead'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '60'
+        return response
+    response = Response(
+        event_broker.stream(*opened),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    response.call_on_close(event_broker.close)
+    return response
 
 @app.route('/current', methods=['GET'])
 def get_current():
-    if playlist.current:
-        return jsonify({'path': playlist.current.track.path, 'title': playlist.current.track.title})
+    track = playlist.current_track()
+    if track:
+        return jsonify({'path': track.path, 'title': track.title})
     return jsonify({'error': 'No current track'}), 404
 
 @app.route('/add', methods=['POST'])
@@ -239,8 +404,11 @@ def add_track():
     path = request.form.get('path')
     title = request.form.get('title')
     position = request.form.get('position', 'end')
+    allow_duplicates = request.form.get('allow_duplicates', 'false').lower() in ('1', 'true', 'yes')
     if not path or not title:
         return jsonify({'error': 'Invalid data'}), 400
+    if not allow_duplicates and playlist.contains_path(path):
+        return jsonify({'error': 'Track already in playlist', 'error_type': 'duplicate'}), 409
     track = Track(path=path, title=title)
     if position == 'start':
         playlist.prepend(track)
@@ -250,7 +418,6 @@ def add_track():
         playlist.insert_at_index(int(position), track)
     else:
         return jsonify({'error': 'Invalid position'}), 400
-    save_playlist()
     return jsonify({'message': 'Track added'})
 
 @app.route('/remove', methods=['DELETE'])
@@ -262,8 +429,10 @@ def remove_track():
         success = playlist.remove_by_index(data['index'])
     elif 'title' in data:
         success = playlist.remove_by_title(data['title'])
+    elif 'path' in data:
+        success = playlist.remove_by_path(data['path'])
     else:
-        return jsonify({'error': 'Specify index or title'}), 400
+        return jsonify({'error': 'Specify index, title or path'}), 400
     if success:
         return jsonify({'message': 'Track removed'})
     return jsonify({'error': 'Track not found'}), 404
@@ -282,26 +451,74 @@ def prev_track():
 
 @app.route('/play', methods=['POST'])
 def play():
-    if playlist.current:
+    if playlist.current_track():
         playlist.is_playing = True
+        event_broker.publish('playback', {'playing': True, 'current': playlist.current_index()})
         return jsonify({'message': 'Playing'})
     return jsonify({'error': 'No track to play'}), 404
 
 @app.route('/pause', methods=['POST'])
 def pause():
     playlist.is_playing = False
+    event_broker.publish('playback', {'playing': False, 'current': playlist.current_index()})
     return jsonify({'message': 'Paused'})
 
 @app.route('/search', methods=['GET'])
 def search():
     query = request.args.get('q', '')
-    tracks = playlist.search(query)
+    prefix = request.args.get('prefix', 'false').lower() in ('1', 'true', 'yes')
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit < 0:
+        return jsonify({'error': 'Invalid limit'}), 400
+    tracks = playlist.search(query, prefix=prefix, limit=limit)
     return jsonify([{'path': t.path, 'title': t.title} for t in tracks])
 
+# Semillas de /shuffle: enteros no negativos que caben en la cabecera del snapshot
+MAX_SHUFFLE_SEED = 2 ** 63 - 1
+SHUFFLE_MODES = ('reorder', 'play', 'off')
+
 @app.route('/shuffle', methods=['POST'])
 def shuffle_playlist():
-    playlist.shuffle()
-    return jsonify({'message': 'Playlist shuffled'})
+    """
+    mode=reorder (por defecto) reordena la lista conservando la pista actual
+    (keep_current la pone primera); mode=play solo cambia el orden de
+    reproducción (next/prev) y mode=off vuelve al orden de la lista.
+    seed opcional para repetir el mismo orden.
+    """
+    data = request.get_json(silent=True) or {}
+    mode = data.get('mode', 'reorder')
+    seed = data.get('seed')
+    if mode not in SHUFFLE_MODES:
+        return jsonify({'error': f"mode must be one of {', '.join(SHUFFLE_MODES)}"}), 400
+    if seed is None:
+        seed = random.getrandbits(32)
+    elif not isinstance(seed, int) or isinstance(seed, bool) or not 0 <= seed <= MAX_SHUFFLE_SEED:
+        return jsonify({'error': 'seed must be a non-negative 64-bit integer'}), 400
+    if mode == 'reorder':
+        playlist.shuffle(seed, keep_current=bool(data.get('keep_current', False)))
+    else:
+        playlist.set_shuffle_play(seed if mode == 'play' else None)
+    return jsonify({
+        'message': 'Playlist shuffled',
+        'mode': mode,
+        'seed': seed if mode != 'off' else None,
+        'shuffle_play': playlist.shuffle_seed is not None,
+        'current': playlist.current_index(),
+        'version': playlist.version,
+    })
+
+@app.route('/shuffle', methods=['GET'])
+def shuffle_state():
+    """Modo de reproducción y las próximas ?limit= pistas en ese orden"""
+    limit = request.args.get('limit', 10, type=int)
+    if not 0 <= limit <= 100:
+        return jsonify({'error': 'limit must be between 0 and 100'}), 400
+    return jsonify({
+        'shuffle_play': playlist.shuffle_seed is not None,
+        'seed': playlist.shuffle_seed,
+        'current': playlist.current_index(),
+        'upcoming': [track_to_dict(track) for track in playlist.upcoming(limit)],
+    })
 
 @app.route('/clear', methods=['POST'])
 def clear_playlist():
@@ -317,6 +534,106 @@ def move_track(from_index, to_index):
     playlist.move(from_index, to_index)
     return jsonify({'message': 'Track moved'})
 
+BATCH_OPS = ('append', 'insert', 'remove', 'move', 'set_current')
+
+def is_index(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+def batch_op_error(op):
+    """Mensaje de error si la operación de /batch está mal formada"""
+    if not isinstance(op, dict) or op.get('op') not in BATCH_OPS:
+        return f"op must be one of {', '.join(BATCH_OPS)}"
+    name = op['op']
+    if name in ('append', 'insert'):
+        if not (isinstance(op.get('path'), str) and op['path'] and isinstance(op.get('title'), str) and op['title']):
+            return 'path and title required'
+    if name in ('insert', 'set_current') and not is_index(op.get('index')):
+        return 'index must be a non-negative integer'
+    if name == 'remove':
+        if 'index' in op:
+            if not is_index(op['index']):
+                return 'index must be a non-negative integer'
+        elif not any(isinstance(op.get(key), str) for key in ('title', 'path')):
+            return 'Specify index, title or path'
+    if name == 'move' and not (is_index(op.get('from')) and is_index(op.get('to'))):
+        return 'from and to must be non-negative integers'
+    return None
+
+def apply_batch_op(op, allow_duplicates):
+    """Aplica una operación de /batch (salvo append, ver batch_operations) y devuelve su resultado"""
+    name = op['op']
+    if name == 'insert':
+        if not allow_duplicates and playlist.contains_path(op['path']):
+            return {'ok': False, 'error': 'Track already in playlist', 'error_type': 'duplicate'}
+        index = min(op['index'], playlist.length)
+        playlist.insert_at_index(index, Track(path=op['path'], title=op['title']))
+        return {'ok': True, 'index': index}
+    if name == 'remove':
+        if 'index' in op:
+            success = playlist.remove_by_index(op['index'])
+        elif isinstance(op.get('title'), str):
+            success = playlist.remove_by_title(op['title'])
+        else:
+            success = playlist.remove_by_path(op['path'])
+        return {'ok': True} if success else {'ok': False, 'error': 'Track not found'}
+    if name == 'move':
+        if op['from'] >= playlist.length or op['to'] > playlist.length:
+            return {'ok': False, 'error': 'Invalid index'}
+        playlist.move(op['from'], op['to'])
+        return {'ok': True}
+    if op['index'] >= playlist.length:
+        return {'ok': False, 'error': 'Invalid index'}
+    playlist.set_current_to_index(op['index'])
+    return {'ok': True}
+
+@app.route('/batch', methods=['POST'])
+def batch_operations():
+    """
+    Aplica en orden {"ops": [{"op": "append", "path": ..., "title": ...}, ...]}
+    (append, insert, remove, move, set_current) con el lock tomado una vez y
+    una sola escritura + fsync del journal. Los appends seguidos se agregan
+    con un solo extend (un solo evento y una entrada del journal). Si una
+    operación está mal formada no se aplica ninguna; las que no encuentran
+    su pista o índice fallan en su resultado sin detener las demás.
+    """
+    data = request.get_json(silent=True)
+    ops = data.get('ops') if isinstance(data, dict) else None
+    if not isinstance(ops, list) or not ops:
+        return jsonify({'error': 'ops must be a non-empty list'}), 400
+    if len(ops) > Config.BATCH_MAX_OPS:
+        return jsonify({'error': f'Too many operations (max {Config.BATCH_MAX_OPS})'}), 400
+    for position, op in enumerate(ops):
+        error = batch_op_error(op)
+        if error:
+            return jsonify({'error': error, 'op_index': position}), 400
+    allow_duplicates = bool(data.get('allow_duplicates', False))
+
+    results = []
+    pending, pending_paths = [], set()
+    with journal.batch():
+        for op in ops:
+            if op['op'] == 'append':
+                if not allow_duplicates and (op['path'] in pending_paths or playlist.contains_path(op['path'])):
+                    results.append({'ok': False, 'error': 'Track already in playlist', 'error_type': 'duplicate'})
+                    continue
+                results.append({'ok': True, 'index': playlist.length + len(pending)})
+                pending.append(Track(path=op['path'], title=op['title']))
+                pending_paths.add(op['path'])
+                continue
+            if pending:
+                playlist.extend(pending)
+                pending, pending_paths = [], set()
+            results.append(apply_batch_op(op, allow_duplicates))
+        if pending:
+            playlist.extend(pending)
+    return jsonify({
+        'version': playlist.version,
+        'applied': sum(result['ok'] for result in results),
+        'results': results,
+        'length': playlist.length,
+        'current': playlist.current_index(),
+    })
+
 @app.route('/')
 def index():
     return send_file('index.html')
@@ -330,34 +647,183 @@ def health_check():
         'version': '1.0.0'
     }), 200
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Métricas de este worker en el formato de texto de Prometheus"""
+    return Response(REGISTRY.render(), mimetype=metrics.CONTENT_TYPE)
+
+def collect_app_metrics():
+    """Valores que ya llevan la playlist, el broker de eventos y las cachés"""
+    caches = youtube.cache_stats()
+    cache_names = sorted(caches)
+    return [
+        ('playerpro_playlist_length', 'gauge', 'Pistas en la playlist', (), [((), playlist.length)]),
+        ('playerpro_playlist_version', 'gauge', 'Mutaciones aplicadas a la playlist', (), [((), playlist.version)]),
+        ('playerpro_events_subscribers', 'gauge', 'Conexiones abiertas a /events', (),
+         [((), event_broker.subscribers)]),
+        ('playerpro_cache_hits_total', 'counter', 'Aciertos de las cachés de YouTube', ('cache',),
+         [((name,), caches[name]['hits']) for name in cache_names]),
+        ('playerpro_cache_misses_total', 'counter', 'Fallos de las cachés de YouTube', ('cache',),
+         [((name,), caches[name]['misses']) for name in cache_names]),
+        ('playerpro_cache_hit_ratio', 'gauge', 'Aciertos / búsquedas de las cachés de YouTube', ('cache',),
+         [((name,), caches[name]['hit_ratio']) for name in cache_names]),
+    ]
+
+REGISTRY.add_collector(collect_app_metrics)
+
+def admin_denied():
+    """Respuesta de error si falta X-Admin-Token (o no hay ADMIN_TOKEN configurado)"""
+    if not Config.ADMIN_TOKEN:
+        return jsonify({'error': 'Admin endpoints are disabled (set ADMIN_TOKEN)'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), Config.ADMIN_TOKEN):
+        return jsonify({'error': 'Invalid admin token'}), 401
+    return None
+
+@app.route('/admin/profiler', methods=['GET'])
+def profiler_status():
+    """Estado del perfilador de este worker"""
+    return admin_denied() or jsonify(PROFILER.status())
+
+@app.route('/admin/profiler', methods=['POST'])
+def profiler_configure():
+    """
+    Activa o desactiva en caliente: {"sampling": true, "tracing": true,
+    "interval": 0.01, "slow_threshold": 0.5, "reset": true}. Solo afecta
+    al worker que recibe la petición.
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    try:
+        if data.get('reset'):
+            PROFILER.reset()
+        PROFILER.configure(
+            sampling=data.get('sampling'),
+            tracing=data.get('tracing'),
+            interval=float(data['interval']) if data.get('interval') is not None else None,
+            slow_threshold=float(data['slow_threshold']) if data.get('slow_threshold') is not None else None,
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(PROFILER.status())
+
+@app.route('/admin/profiler/folded', methods=['GET'])
+def profiler_folded():
+    """Pilas muestreadas en formato folded (flamegraph.pl, speedscope)"""
+    return admin_denied() or Response(PROFILER.folded(), mimetype='text/plain')
+
+@app.route('/admin/profiler/slow', methods=['GET'])
+def profiler_slow_requests():
+    """Peticiones que superaron el umbral, con tiempo por tramo y pilas"""
+    return admin_denied() or jsonify({'threshold': PROFILER.slow_threshold,
+                                      'requests': PROFILER.slow_requests()})
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file part'}), 400
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
-    if file:
-        filename = str(uuid.uuid4()) + os.path.splitext(file.filename)[1]
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        url = f'/uploads/{filename}'
-        title = os.path.splitext(file.filename)[0]
-        return jsonify({'url': url, 'title': title})
+    """
+    Sube un archivo leyendo el cuerpo por bloques: multipart/form-data (campo
+    ``file``) o el cuerpo crudo con el nombre en el header X-Filename.
+    """
+    try:
+        if request.mimetype == 'multipart/form-data':
+            boundary = request.mimetype_params.get('boundary')
+            if not boundary:
+                return jsonify({'error': 'No file part'}), 400
+            saved = upload_store.save_multipart(request.stream, boundary)
+            if saved is None:
+                return jsonify({'error': 'No file part'}), 400
+            original_filename, filename, existed = saved
+        else:
+            original_filename = request.headers.get('X-Filename', '')
+            if not original_filename:
+                return jsonify({'error': 'No selected file'}), 400
+            filename, existed = upload_store.save_stream(request.stream, original_filename)
+    except UploadError as e:
+        return jsonify({'error': str(e), **e.details}), e.status_code
+    except ValueError:
+        return jsonify({'error': 'Malformed multipart body'}), 400
+    return jsonify(upload_response(original_filename, filename, existed))
+
+def upload_response(original_filename, filename, existed):
+    # Se analiza ya al subir, antes de que el cliente la agregue con /add
+    media_metadata.submit(f'/uploads/{filename}')
+    return {
+        'url': f'/uploads/{filename}',
+        'title': os.path.splitext(original_filename)[0],
+        'sha256': os.path.splitext(filename)[0],
+        'duplicate': existed,
+    }
+
+# Subidas reanudables: POST crea la sesión, PATCH envía bloques con Upload-Offset
+@app.route('/upload/sessions', methods=['POST'])
+def create_upload_session():
+    data = request.json or {}
+    try:
+        session = upload_store.create_session(data.get('filename', ''), data.get('size'))
+    except UploadError as e:
+        return jsonify({'error': str(e), **e.details}), e.status_code
+    session['chunk_size'] = Config.UPLOAD_CHUNK_SIZE
+    return jsonify(session), 201
+
+@app.route('/upload/sessions/<upload_id>', methods=['GET'])
+def get_upload_session(upload_id):
+    session = upload_store.get_session(upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload session not found'}), 404
+    return jsonify(session)
+
+@app.route('/upload/sessions/<upload_id>', methods=['PATCH'])
+def append_upload_session(upload_id):
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'Upload-Offset header required'}), 400
+    try:
+        session = upload_store.append(upload_id, offset, request.stream)
+    except UploadError as e:
+        return jsonify({'error': str(e), **e.details}), e.status_code
+    if session['complete']:
+        session.update(upload_response(session['filename'], session.pop('stored_filename'), session['duplicate']))
+    return jsonify(session)
+
+@app.route('/upload/sessions/<upload_id>', methods=['DELETE'])
+def cancel_upload_session(upload_id):
+    if not upload_store.cancel(upload_id):
+        return jsonify({'error': 'Upload session not found'}), 404
+    return jsonify({'message': 'Upload cancelled'})
+
+def requested_rendition():
+    """Versión pedida con ?rendition=opus|mp3|original o con un tipo explícito en Accept"""
+    hint = request.args.get('rendition')
+    if hint:
+        return hint if hint in RENDITIONS else None
+    return rendition_for_mimetypes(request.accept_mimetypes)
+
+def serve_track_file(folder, filename):
+    rendition = requested_rendition()
+    cache_control = IMMUTABLE_CACHE_CONTROL
+    if rendition is not None and not filename.startswith('.'):
+        source = safe_join(folder, filename)
+        rendition_file = transcoder.lookup(source, rendition) if source else None
+        if rendition_file is not None:
+            response = make_response(serve_media(transcoder.cache_dir, rendition_file,
+                                                 mode=Config.MEDIA_SERVE_MODE, accel_prefix=Config.MEDIA_ACCEL_PREFIX))
+            response.vary.add('Accept')
+            return response
+        # Versión aún en cola: se sirve el original sin fijarlo en caché para esta URL
+        cache_control = 'public, max-age=60'
+    response = make_response(serve_media(folder, filename, mode=Config.MEDIA_SERVE_MODE,
+                                         accel_prefix=Config.MEDIA_ACCEL_PREFIX, cache_control=cache_control))
+    response.vary.add('Accept')
+    return response
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    if not os.path.exists(file_path):
-        return jsonify({'error': 'File not found'}), 404
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return serve_track_file(app.config['UPLOAD_FOLDER'], filename)
 
 @app.route('/downloads/<filename>')
 def downloaded_file(filename):
-    file_path = os.path.join(app.config['DOWNLOAD_FOLDER'], filename)
-    if not os.path.exists(file_path):
-        return jsonify({'error': 'File not found'}), 404
-    return send_from_directory(app.config['DOWNLOAD_FOLDER'], filename)
+    return serve_track_file(app.config['DOWNLOAD_FOLDER'], filename)
 
 # YouTube Integration Routes
 @app.route('/youtube/search', methods=['GET'])
@@ -382,76 +848,95 @@ def youtube_info():
     info = youtube.get_video_info(video_url)
     return jsonify(info)
 
-@app.route('/youtube/download', methods=['POST'])
-def youtube_download():
-    try:
-        data = request.json
-        if not data:
-            return jsonify({'error': 'No JSON data received'}), 400
-            
-        video_url = data.get('url', '')
-        print(f"🎵 Download request for URL: {video_url}")
-        
-        if not video_url:
-            return jsonify({'error': 'URL required'}), 400
-        
-        result = youtube.download_audio(video_url)
-        print(f"📥 Download result: {result}")
-        
-        if result.get('success'):
-            # Agregar automáticamente a la playlist
-            track = Track(
-                path=f'/downloads/{result["filename"]}',
-                title=f'{result["title"]} - {result["artist"]}'
-            )
-            playlist.append(track)
-            save_playlist()
-            
-            return jsonify({
-                'success': True,
-                'message': 'Downloaded and added to playlist',
-                'track': {
-                    'path': track.path,
-                    'title': track.title
-                }
+@app.route('/youtube/cache/stats', methods=['GET'])
+def youtube_cache_stats():
+    """Contadores de aciertos/fallos de las cachés de búsqueda e información"""
+    return jsonify(youtube.cache_stats())
+
+def job_response(job):
+    """Estado de un trabajo de descarga, con los mensajes de error de bot detection"""
+    data = job.to_dict()
+    data.pop('result', None)
+    if job.status == JOB_FAILED:
+        error_msg = job.error or 'Unknown download error'
+        # Detectar errores de bot detection y proporcionar mensajes más útiles
+        if any(keyword in error_msg.lower() for keyword in ['bot detection', 'sign in', 'authentication', 'cookies']):
+            data.update({
+                'error': 'YouTube está bloqueando las descargas temporalmente debido a detección de bots. Esto es normal en servidores de producción.',
+                'error_type': 'bot_detection',
+                'suggestion': 'Intenta de nuevo en unos minutos o usa la función de búsqueda para encontrar contenido alternativo.',
             })
         else:
-            error_msg = result.get('error', 'Unknown download error')
-            
-            # Detectar errores de bot detection y proporcionar mensajes más útiles
-            if any(keyword in error_msg.lower() for keyword in ['bot detection', 'sign in', 'authentication', 'cookies']):
-                return jsonify({
-                    'success': False,
-                    'error': 'YouTube está bloqueando las descargas temporalmente debido a detección de bots. Esto es normal en servidores de producción.',
-                    'error_type': 'bot_detection',
-                    'suggestion': 'Intenta de nuevo en unos minutos o usa la función de búsqueda para encontrar contenido alternativo.',
-                    'info': result.get('info', {})
-                }), 429  # Too Many Requests
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': error_msg,
-                    'error_type': 'download_error'
-                }), 400
-            
-    except Exception as e:
-        error_msg = str(e)
-        print(f"❌ Error in youtube_download: {e}")
-        
-        # Detectar errores de bot detection en excepciones
-        if any(keyword in error_msg.lower() for keyword in ['bot', 'sign in', 'authentication', 'cookies']):
-            return jsonify({
-                'success': False,
-                'error': 'YouTube requiere autenticación debido a detección de bots. Esto es una restricción temporal.',
-                'error_type': 'bot_detection',
-                'suggestion': 'Intenta de nuevo más tarde.'
-            }), 429
-        
+            data['error_type'] = 'download_error'
+    return data
+
+def add_downloaded_track(result):
+    track = Track(
+        path=f'/downloads/{result["filename"]}',
+        title=f'{result["title"]} - {result["artist"]}'
+    )
+    # Un audio servido desde la caché puede estar ya en la playlist
+    with journal.mutation():
+        if not playlist.contains_path(track.path):
+            playlist.append(track)
+    return track_to_dict(track)
+
+def apply_finished_downloads():
+    # Las descargas terminadas se agregan a la playlist desde el hilo de la petición
+    download_queue.drain_completed(add_downloaded_track)
+
+@app.route('/youtube/download', methods=['POST'])
+def youtube_download():
+    """Encola la descarga y responde al instante con el id del trabajo"""
+    data = request.json
+    if not data:
+        return jsonify({'error': 'No JSON data received'}), 400
+
+    video_url = data.get('url', '')
+    print(f"🎵 Download request for URL: {video_url}")
+
+    if not video_url:
+        return jsonify({'error': 'URL required'}), 400
+
+    job = download_queue.submit(video_url)
+    if job is None:
         return jsonify({
             'success': False,
-            'error': f'Server error: {error_msg}',
-            'error_type': 'server_error'
-        }), 500
+            'error': 'Hay demasiadas descargas en cola. Intenta de nuevo en unos minutos.',
+            'error_type': 'queue_full'
+        }), 429
+
+    return jsonify({
+        'success': True,
+        'message': 'Download queued',
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': f'/youtube/jobs/{job.id}'
+    }), 202
+
+@app.route('/youtube/jobs', methods=['GET'])
+def list_download_jobs():
+    return jsonify([job_response(job) for job in download_queue.list()])
+
+@app.route('/youtube/jobs/<job_id>', methods=['GET'])
+def get_download_job(job_id):
+    job = download_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_response(job))
+
+@app.route('/youtube/jobs/<job_id>', methods=['DELETE'])
+def cancel_download_job(job_id):
+    if download_queue.cancel(job_id):
+        return jsonify({'message': 'Job cancelled'})
+    return jsonify({'error': 'Job not found or already finished'}), 404
+
+def duplicate_url_response():
+    return jsonify({
+        'success': False,
+        'error': 'Este video ya está en la playlist',
+        'error_type': 'duplicate'
+    }), 409
 
 @app.route('/youtube/add_url', methods=['POST'])
 def add_youtube_url():
@@ -466,6 +951,13 @@ def add_youtube_url():
         
         if not video_url:
             return jsonify({'error': 'URL required'}), 400
+
+        # Evitar duplicados (y la extracción con yt-dlp) si la URL ya está en la playlist
+        journal.refresh()
+        with request_lock.read_locked():
+            duplicate = playlist.contains_path(video_url)
+        if duplicate:
+            return duplicate_url_response()
         
         # Obtener información del video
         try:
@@ -511,10 +1003,15 @@ def add_youtube_url():
             path=video_url,  # Guardar la URL directamente
             title=f'{title} - {uploader}'
         )
-        
-        playlist.append(track)
-        save_playlist()
-        
+
+        # yt-dlp corre sin el lock: otra petición pudo agregar la misma URL mientras tanto
+        with journal.mutation():
+            duplicate = playlist.contains_path(track.path)
+            if not duplicate:
+                playlist.append(track)
+        if duplicate:
+            return duplicate_url_response()
+
         response_data = {
             'success': True,
             'message': 'YouTube video added to playlist',
@@ -572,8 +1069,9 @@ def proxy_deezer():
         if not deezer_url:
             return jsonify({'error': 'URL parameter is required'}), 400
         
-        # Verificar que sea una URL de Deezer válida
-        if 'dzcdn.net' not in deezer_url:
+        # Verificar que sea una URL de Deezer válida (se guarda en disco)
+        parsed = urlparse(deezer_url)
+        if parsed.scheme not in ('http', 'https') or not (parsed.hostname or '').endswith('.dzcdn.net'):
             return jsonify({'error': 'Invalid Deezer URL'}), 400
         
         # Hacer la petición a Deezer
@@ -583,27 +1081,37 @@ def proxy_deezer():
             'Accept': 'audio/mpeg,audio/*,*/*'
         }
         
-        response = requests.get(deezer_url, headers=headers, stream=True)
-        
-        if response.status_code == 200:
-            # Crear una respuesta streaming
-            def generate():
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        yield chunk
-            
-            return Response(
-                generate(),
-                content_type=response.headers.get('content-type', 'audio/mpeg'),
-                headers={
-                    'Accept-Ranges': 'bytes',
-                    'Content-Length': response.headers.get('content-length'),
-                    'Cache-Control': 'public, max-age=3600'
-                }
-            )
-        else:
-            return jsonify({'error': f'Failed to fetch audio: {response.status_code}'}), response.status_code
+        preview = preview_cache.open(deezer_url, headers)
+
+        response_headers = {
+            'Accept-Ranges': 'bytes',
+            'Cache-Control': 'public, max-age=3600'
+        }
+        byte_range = request.range
+        if byte_range is not None and preview.size is None:
+            # Sin Content-Length del upstream: esperar a conocer el tamaño
+            preview.wait_complete()
+        content_range = byte_range.range_for_length(preview.size) if byte_range is not None else None
+        if byte_range is not None and content_range is None:
+            return Response(status=416, headers={'Content-Range': f'bytes */{preview.size}'})
+
+        if content_range is None:
+            if preview.size is not None:
+                response_headers['Content-Length'] = str(preview.size)
+            return Response(preview.iter_range(), content_type=preview.content_type, headers=response_headers)
+
+        start, stop = content_range
+        response_headers['Content-Length'] = str(stop - start)
+        response_headers['Content-Range'] = f'bytes {start}-{stop - 1}/{preview.size}'
+        return Response(
+            preview.iter_range(start, stop),
+            status=206,
+            content_type=preview.content_type,
+            headers=response_headers
+        )
             
+    except PreviewFetchError as e:
+        return jsonify({'error': str(e)}), e.status_code
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
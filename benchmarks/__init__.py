@@ -0,0 +1,4 @@
+"""
+Benchmarks del Reproductor Musical Pro
+Ejecutar cada módulo con ``python -m benchmarks.<modulo>`` desde la raíz del proyecto
+"""
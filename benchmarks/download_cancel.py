@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Prueba de cancelación de descargas coalescidas: varios trabajos de la cola
+piden el mismo video, uno descarga y los demás lo esperan. Con yt-dlp
+reemplazado por una descarga falsa por pasos (llama a los progress hooks):
+
+- Cancelar al que descarga: ese trabajo queda 'cancelled' y los que esperaban
+  terminan bien (uno toma la descarga), con un mismo archivo en la caché.
+- Cancelar a uno que espera: solo ese queda 'cancelled'.
+
+Uso:
+    python -m benchmarks.download_cancel [--waiters 2] [--steps 20]
+"""
+
+import argparse
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from download_jobs import CANCELLED, COMPLETED, DOWNLOADED, FINAL_STATES, DownloadJobQueue
+from youtube_integration import YouTubeIntegration
+
+VIDEO_URL = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+STEP_SECONDS = 0.02
+
+
+class FakeDownloads:
+    """Reemplazo de YouTubeIntegration._extract_and_download: descarga por pasos"""
+
+    def __init__(self, youtube, steps):
+        self.youtube = youtube
+        self.steps = steps
+        self.started = []
+        self._lock = threading.Lock()
+
+    def __call__(self, opts, video_url, video_id):
+        hooks = opts.get('progress_hooks') or []
+        with self._lock:
+            self.started.append(time.monotonic())
+        for step in range(1, self.steps + 1):
+            time.sleep(STEP_SECONDS)
+            for hook in hooks:  # el hook de la cola lanza DownloadCancelled
+                hook({'status': 'downloading', 'downloaded_bytes': step, 'total_bytes': self.steps})
+        filename = f'{video_id}.m4a'
+        with open(os.path.join(self.youtube.download_path, filename), 'wb') as f:
+            f.write(b'\0' * 1024)
+        result = {'success': True, 'filename': filename, 'title': 'Video', 'artist': 'Benchmark',
+                  'path': os.path.join(self.youtube.download_path, filename),
+                  'cache_key': f'{video_id}:{opts["format"]}'}
+        self.youtube.download_cache.put(result['cache_key'], filename, 'Video', 'Benchmark')
+        return result
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def scenario(directory, waiters, steps, cancel_owner):
+    youtube = YouTubeIntegration(os.path.join(directory, 'downloads'))
+    fake = youtube._extract_and_download = FakeDownloads(youtube, steps)
+    queue = DownloadJobQueue(youtube, os.path.join(directory, 'jobs.json'), max_workers=waiters + 1)
+    errors = []
+    try:
+        jobs = [queue.submit(VIDEO_URL)]
+        # El primero descarga; los demás llegan después y esperan su resultado
+        if not wait_until(lambda: fake.started):
+            return ['la descarga no empezó']
+        jobs += [queue.submit(VIDEO_URL) for _ in range(waiters)]
+        time.sleep(STEP_SECONDS * 3)
+        cancelled = jobs[0] if cancel_owner else jobs[-1]
+        queue.cancel(cancelled.id)
+
+        if not wait_until(lambda: all(job.status in FINAL_STATES or job.status == DOWNLOADED for job in jobs)):
+            return [f'trabajos sin terminar: {[job.status for job in jobs]}']
+        queue.drain_completed(lambda result: {'path': f'/downloads/{result["filename"]}'})
+
+        for job in jobs:
+            expected = CANCELLED if job is cancelled else COMPLETED
+            if job.status != expected:
+                errors.append(f'trabajo {job.id}: {job.status} (error {job.error!r}), se esperaba {expected}')
+        expected_downloads = 2 if cancel_owner else 1
+        if len(fake.started) != expected_downloads:
+            errors.append(f'{len(fake.started)} descargas, se esperaban {expected_downloads}')
+        files = [name for name in os.listdir(youtube.download_path) if not name.startswith('.')]
+        if len(files) != 1:
+            errors.append(f'archivos en la caché: {files}')
+        return errors
+    finally:
+        queue.shutdown()
+        # Ya apagada: al salir no guardaría en un directorio borrado
+        atexit.unregister(queue.shutdown)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--waiters', type=int, default=2)
+    parser.add_argument('--steps', type=int, default=20)
+    args = parser.parse_args()
+
+    failed = 0
+    for name, cancel_owner in (('cancelar al que descarga', True), ('cancelar a uno que espera', False)):
+        directory = tempfile.mkdtemp(prefix='playerpro-download-cancel-')
+        try:
+            errors = scenario(directory, args.waiters, args.steps, cancel_owner)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        print(f"{name}: {'OK' if not errors else 'FALLÓ'}")
+        for message in errors:
+            print(f'  {message}')
+        failed += bool(errors)
+    if failed:
+        print(f'FALLÓ: {failed} escenarios')
+        sys.exit(1)
+    print('OK: los trabajos que esperaban terminan aunque se cancele otro')
+
+
+if __name__ == '__main__':
+    main()
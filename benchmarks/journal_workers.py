@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Prueba de varios workers: procesos independientes (como los workers de
+gunicorn) mutan la misma playlist a través del journal compartido, con
+compactaciones frecuentes. Al final cada uno se pone al día y todos deben
+tener la misma playlist (versión, pistas en orden, pista actual); una carga
+nueva desde disco también, sin descartar entradas del journal.
+
+Uso:
+    python -m benchmarks.journal_workers [--workers 3] [--operations 400] [--compact-every 50]
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+from benchmarks.playlist_stress import mutate
+from playlist_engine import IndexedPlaylist
+from playlist_journal import PlaylistJournal
+
+
+def open_journal(directory, compact_every):
+    return PlaylistJournal(os.path.join(directory, 'playlist.snapshot'), os.path.join(directory, 'playlist.journal'),
+                           compact_every=compact_every)
+
+
+def digest(playlist):
+    tracks = hashlib.sha256()
+    for track in playlist.get_all_tracks():
+        tracks.update(f'{track.path}\0{track.title}\0'.encode('utf-8'))
+    return {
+        'version': playlist.version,
+        'length': playlist.length,
+        'tracks': tracks.hexdigest()[:16],
+        'current': playlist.current_index(),
+        'shuffle_seed': playlist.shuffle_seed,
+    }
+
+
+def worker(directory, compact_every, operations, seed, barrier, results):
+    playlist = IndexedPlaylist()
+    journal = open_journal(directory, compact_every)
+    journal.load(playlist)
+    rng = random.Random(seed)
+    for _ in range(operations):
+        with journal.mutation():
+            mutate(playlist, rng)
+    barrier.wait()  # nadie escribe después de esto
+    with journal.mutation():
+        results.put((os.getpid(), journal.generation, digest(playlist)))
+    barrier.wait()  # close compacta: después de que todos tomaron su resumen
+    journal.close()
+
+
+def run(workers, operations, compact_every, seed):
+    directory = tempfile.mkdtemp(prefix='playerpro-journal-')
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    try:
+        processes = [context.Process(target=worker, args=(directory, compact_every, operations,
+                                                          seed * 1_000 + i, barrier, results))
+                     for i in range(workers)]
+        for process in processes:
+            process.start()
+        replicas = [results.get(timeout=300) for _ in processes]
+        for process in processes:
+            process.join()
+
+        errors = [f'worker {i} terminó con código {process.exitcode}'
+                  for i, process in enumerate(processes) if process.exitcode]
+        expected = replicas[0][2]
+        for pid, _, state in replicas[1:]:
+            if state != expected:
+                errors.append(f'worker {pid}: {state} != {expected}')
+
+        # Arranque nuevo desde disco: snapshot + journal, sin entradas descartadas
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            playlist = IndexedPlaylist()
+            journal = open_journal(directory, compact_every)
+            journal.load(playlist)
+            reloaded = digest(playlist)
+            journal.close()
+        if output.getvalue():
+            errors.append(f'al recargar: {output.getvalue().strip()}')
+        if reloaded != expected:
+            errors.append(f'recargada: {reloaded} != {expected}')
+        compactions = max(generation for _, generation, _ in replicas)
+        return expected, compactions, errors
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--operations', type=int, default=400)
+    parser.add_argument('--compact-every', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    state, compactions, errors = run(args.workers, args.operations, args.compact_every, args.seed)
+    print(f"{args.workers} workers x {args.operations} operaciones, {compactions} compactaciones; "
+          f"versión {state['version']}, longitud {state['length']}")
+    for message in errors:
+        print(f'  {message}')
+    if errors:
+        print(f'FALLÓ: {len(errors)} diferencias entre réplicas')
+        sys.exit(1)
+    print('OK: todas las réplicas coinciden')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga: despliegue sync (gunicorn --worker-class sync) vs gthread vs
+ASGI (uvicorn asgi:app), un solo proceso en cada caso.
+
+Durante ``--duration`` segundos, contra cada servidor:
+- ``--streams`` clientes lentos descargan un audio a ``--stream-kbps`` KB/s
+  (como un <audio> en una red móvil),
+- ``--subscribers`` conexiones a /events quedan abiertas,
+- ``--pollers`` clientes piden /playlist en bucle; se mide su latencia
+  (p50/p95/p99), el throughput y los errores o timeouts.
+
+Uso:
+    python -m benchmarks.load_test --compare [--servers sync,gthread,asgi] [--duration 20] [--json resultados.json]
+    python -m benchmarks.load_test --url http://localhost:5000 [--media /uploads/x.mp3]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+from urllib.parse import urlparse
+
+HOST = '127.0.0.1'
+PORT = 8799
+SERVERS = {
+    'sync': [sys.executable, '-m', 'gunicorn', '--bind', f'{HOST}:{PORT}', '--workers', '1',
+             '--worker-class', 'sync', '--timeout', '30', '--graceful-timeout', '2', 'backend:app'],
+    'gthread': [sys.executable, '-m', 'gunicorn', '--bind', f'{HOST}:{PORT}', '--workers', '1',
+                '--worker-class', 'gthread', '--threads', '32', '--timeout', '30', '--graceful-timeout', '2', 'backend:app'],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', HOST, '--port', str(PORT),
+             '--timeout-graceful-shutdown', '2', '--log-level', 'warning'],
+}
+MEDIA_SIZE = 8 * 1024 * 1024
+READ_SIZE = 16 * 1024
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def open_request(host, port, path, timeout):
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode())
+    await writer.drain()
+    status_line = await asyncio.wait_for(reader.readline(), timeout)
+    status = int(status_line.split()[1])
+    while (await asyncio.wait_for(reader.readline(), timeout)) not in (b'\r\n', b''):
+        pass
+    return reader, writer, status
+
+
+async def poller(host, port, deadline, timeout, stats):
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        writer = None
+        try:
+            reader, writer, status = await open_request(host, port, '/playlist', timeout)
+            await asyncio.wait_for(reader.read(), timeout)
+            if status == 200:
+                stats['latencies'].append(time.perf_counter() - start)
+            else:
+                stats['errors'] += 1
+        except asyncio.TimeoutError:
+            stats['timeouts'] += 1
+        except (OSError, ValueError, IndexError):
+            stats['errors'] += 1
+            await asyncio.sleep(0.1)
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+async def slow_stream(host, port, path, deadline, kbps, stats):
+    interval = READ_SIZE / (kbps * 1024)
+    while time.monotonic() < deadline:
+        writer = None
+        try:
+            reader, writer, _ = await open_request(host, port, path, deadline - time.monotonic())
+            while time.monotonic() < deadline:
+                chunk = await asyncio.wait_for(reader.read(READ_SIZE), max(0.1, deadline - time.monotonic()))
+                if not chunk:
+                    break
+                stats['stream_bytes'] += len(chunk)
+                await asyncio.sleep(interval)
+        except (asyncio.TimeoutError, OSError, ValueError, IndexError):
+            await asyncio.sleep(0.1)
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+async def subscriber(host, port, deadline, stats):
+    writer = None
+    try:
+        reader, writer, status = await open_request(host, port, '/events', deadline - time.monotonic())
+        if status == 200:
+            stats['subscribers'] += 1
+        while time.monotonic() < deadline:
+            if not await asyncio.wait_for(reader.read(READ_SIZE), max(0.1, deadline - time.monotonic())):
+                break
+    except (asyncio.TimeoutError, OSError, ValueError, IndexError):
+        pass
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def run_load(url, media_path, duration, pollers, streams, subscribers, stream_kbps, timeout):
+    parsed = urlparse(url)
+    host, port = parsed.hostname, parsed.port or 80
+    stats = {'latencies': [], 'errors': 0, 'timeouts': 0, 'stream_bytes': 0, 'subscribers': 0}
+    deadline = time.monotonic() + duration
+    tasks = [subscriber(host, port, deadline, stats) for _ in range(subscribers)]
+    if media_path:
+        tasks += [slow_stream(host, port, media_path, deadline, stream_kbps, stats) for _ in range(streams)]
+    tasks += [poller(host, port, deadline, timeout, stats) for _ in range(pollers)]
+    await asyncio.gather(*tasks)
+
+    latencies = stats['latencies']
+    ms = lambda value: round(value * 1000, 1) if value is not None else None
+    return {
+        'requests': len(latencies),
+        'errors': stats['errors'],
+        'timeouts': stats['timeouts'],
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'stream_kbps': round(stats['stream_bytes'] / 1024 / duration, 1),
+        'subscribers_connected': stats['subscribers'],
+    }
+
+
+def wait_ready(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(f'{url}/health', timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def compare(names, args):
+    """Levanta cada servidor desde la raíz del proyecto y corre el mismo escenario"""
+    url = f'http://{HOST}:{PORT}'
+    media_name = f'loadtest-{uuid.uuid4().hex[:8]}.mp3'
+    media_file = os.path.join('uploads', media_name)
+    os.makedirs('uploads', exist_ok=True)
+    with open(media_file, 'wb') as f:
+        f.write(os.urandom(MEDIA_SIZE))
+
+    results = {}
+    try:
+        for name in names:
+            # Grupo de procesos propio: al terminar no quedan workers ocupando el puerto
+            process = subprocess.Popen(SERVERS[name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                       start_new_session=True)
+            try:
+                if not wait_ready(url, process):
+                    print(f'{name}: el servidor no arrancó (¿está instalado?)')
+                    continue
+                print(f'{name}: {args.duration}s de carga...')
+                results[name] = asyncio.run(run_load(
+                    url, f'/uploads/{media_name}', args.duration, args.pollers,
+                    args.streams, args.subscribers, args.stream_kbps, args.timeout,
+                ))
+            finally:
+                os.killpg(process.pid, signal.SIGTERM)
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    os.killpg(process.pid, signal.SIGKILL)
+                    process.wait()
+    finally:
+        os.remove(media_file)
+    return results
+
+
+def print_table(results):
+    columns = ['requests', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'timeouts', 'errors',
+               'stream_kbps', 'subscribers_connected']
+    print(f"{'servidor':>10} " + ' '.join(f'{c:>12}' for c in columns))
+    for name, row in results.items():
+        print(f'{name:>10} ' + ' '.join(f'{str(row[c]):>12}' for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--compare', action='store_true', help='levantar y comparar los servidores')
+    parser.add_argument('--servers', default='sync,gthread,asgi')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--media', help='path de un audio servido por --url (p. ej. /uploads/x.mp3)')
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--pollers', type=int, default=50)
+    parser.add_argument('--streams', type=int, default=50)
+    parser.add_argument('--subscribers', type=int, default=200)
+    parser.add_argument('--stream-kbps', type=float, default=32)
+    parser.add_argument('--timeout', type=float, default=5)
+    parser.add_argument('--json', help='guardar los resultados en este archivo')
+    args = parser.parse_args()
+
+    if args.compare:
+        results = compare([name.strip() for name in args.servers.split(',')], args)
+    else:
+        results = {args.url: asyncio.run(run_load(
+            args.url, args.media, args.duration, args.pollers, args.streams,
+            args.subscribers, args.stream_kbps, args.timeout,
+        ))}
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
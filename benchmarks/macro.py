@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Macro-benchmarks de las rutas HTTP con el test client de Flask: mezclas de
+peticiones realistas (escuchar, editar, descubrir y todo junto) contra una
+playlist de ``--size`` pistas. YouTube Data API, la CDN de Deezer y yt-dlp se
+reemplazan por fakes locales (sin red), con una latencia fija opcional.
+
+backend.py se importa dentro de un directorio temporal (Config toma las
+rutas de os.getcwd()), así que no toca la playlist ni las cachés del
+proyecto. Cada mezcla arranca de la misma playlist y usa su propia semilla.
+
+Resultados: 'macro.<mezcla>' (throughput y latencia total) y
+'macro.<mezcla>.<ruta>' (latencia por ruta). Las rutas con dos costos muy
+distintos se separan: '<ruta>_miss' (preview que aún no está en la caché) y
+'playlist_full_rebuild' (cuerpo de /playlist que hay que volver a serializar).
+Cada mezcla se corre ``--rounds`` veces (desde cero) y se guarda la ronda de
+menor valor; cada medición lleva el umbral de regresión que usa suite.py.
+
+Uso:
+    python -m benchmarks.macro [--size 10000] [--requests 2000] [--rounds 3] [--upstream-latency 0]
+    (normalmente se corre desde ``python -m benchmarks.suite``)
+"""
+
+import argparse
+import atexit
+import collections
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZE = 10_000
+DEFAULT_REQUESTS = 2_000
+DEFAULT_ROUNDS = 3
+WARMUP_REQUESTS = 50
+PREVIEW_SIZE = 256 * 1024
+PREVIEW_URLS = 40
+QUERIES = ('lofi beats', 'salsa clásica', 'rock en español', 'jazz piano', 'reggaeton 2024', 'bachata',
+           'cumbia', 'synthwave', 'bossa nova', 'boleros', 'metal', 'vallenato', 'k-pop', 'tango', 'house')
+
+# Peso de cada ruta en cada mezcla
+WORKLOADS = {
+    'listening': {'playlist_full': 10, 'playlist_page': 10, 'changes': 20, 'current': 20, 'next': 10,
+                  'deezer_preview': 20, 'search': 10},
+    'editing': {'add': 25, 'remove': 20, 'move': 20, 'set_current': 10, 'playlist_page': 15, 'changes': 10},
+    'discovery': {'youtube_search': 40, 'deezer_preview': 20, 'youtube_download': 10, 'add': 15, 'search': 15},
+}
+WORKLOADS['mixed'] = {route: sum(weights.get(route, 0) for weights in WORKLOADS.values())
+                      for route in {route for weights in WORKLOADS.values() for route in weights}}
+
+# Umbral de regresión de cada medición (ver suite.compare): las rutas HTTP varían
+# más que las operaciones micro, y los caminos fríos dependen de E/S y de hilos
+# en segundo plano (descarga del preview, yt-dlp falso, serializar 10k pistas)
+THRESHOLD = 0.5
+COLD_THRESHOLD = 1.0
+COLD_ROUTES = ('deezer_preview_miss', 'playlist_full_rebuild', 'youtube_download')
+
+
+class FakeUpstream(BaseAdapter):
+    """Responde como la YouTube Data API (search, videos) y la CDN de previews de Deezer"""
+
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+        self.requests = 0
+
+    def send(self, request, **kwargs):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlparse(request.url)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        headers = {}
+        if url.hostname == 'www.googleapis.com' and url.path.endswith('/search'):
+            count = int(params.get('maxResults', 10))
+            seed = sum(map(ord, params.get('q', '')))
+            items = [{
+                'id': {'kind': 'youtube#video', 'videoId': f'{seed:05d}{i:06d}'},
+                'snippet': {
+                    'title': f"{params.get('q', '')} #{i}",
+                    'channelTitle': f'Canal {i}',
+                    'description': 'Video de prueba del benchmark',
+                    'publishedAt': '2024-01-01T00:00:00Z',
+                    'thumbnails': {'medium': {'url': f'https://i.ytimg.com/vi/{seed}{i}/mqdefault.jpg'}},
+                },
+            } for i in range(count)]
+            status, body = 200, json.dumps({'items': items}).encode()
+            headers['Content-Type'] = 'application/json'
+        elif url.hostname == 'www.googleapis.com' and url.path.endswith('/videos'):
+            items = [{'id': video_id, 'contentDetails': {'duration': 'PT3M30S'}, 'statistics': {'viewCount': '1000'}}
+                     for video_id in params.get('id', '').split(',') if video_id]
+            status, body = 200, json.dumps({'items': items}).encode()
+            headers['Content-Type'] = 'application/json'
+        elif (url.hostname or '').endswith('.dzcdn.net'):
+            status, body = 200, (url.path.encode() * (PREVIEW_SIZE // len(url.path) + 1))[:PREVIEW_SIZE]
+            headers['Content-Type'] = 'audio/mpeg'
+        else:
+            status, body = 404, b''
+        headers['Content-Length'] = str(len(body))
+
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response.raw = io.BytesIO(body)
+        response.url = request.url
+        response.request = request
+        response.encoding = 'utf-8'
+        return response
+
+    def close(self):
+        pass
+
+
+def fake_download_audio(download_folder, latency):
+    """Reemplazo de YouTubeIntegration.download_audio: escribe un archivo pequeño"""
+    def download_audio(video_url, progress_hook=None, cancelled=None):
+        if latency:
+            time.sleep(latency)
+        video_id = parse_qs(urlparse(video_url).query).get('v', ['unknown'])[0]
+        filename = f'{video_id}.mp3'
+        with open(os.path.join(download_folder, filename), 'wb') as f:
+            f.write(b'\0' * 4096)
+        if progress_hook:
+            progress_hook({'status': 'finished', 'downloaded_bytes': 4096, 'total_bytes': 4096})
+        return {'success': True, 'filename': filename, 'title': f'Video {video_id}', 'artist': 'Benchmark',
+                'path': os.path.join(download_folder, filename)}
+    return download_audio
+
+
+def load_backend(workdir, upstream_latency):
+    """Importa backend.py dentro de ``workdir`` con la red reemplazada por los fakes"""
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    os.chdir(workdir)
+    os.environ.update({
+        'YOUTUBE_API_KEY': 'benchmark',
+        'YOUTUBE_CACHE_DB': '',  # solo memoria
+        'DEBUG': 'False',
+    })
+    with contextlib.redirect_stdout(io.StringIO()):
+        import backend
+    upstream = FakeUpstream(upstream_latency)
+    backend.http_client.session.adapters.clear()
+    backend.http_client.session.mount('http://', upstream)
+    backend.http_client.session.mount('https://', upstream)
+    backend.youtube.download_audio = fake_download_audio(backend.DOWNLOAD_FOLDER, upstream_latency)
+    return backend, upstream
+
+
+def reset_playlist(backend, size, seed):
+    rng = random.Random(seed)
+    words = QUERIES + ('love', 'noche', 'corazón', 'fire', 'luna', 'summer')
+    tracks = [backend.Track(path=f'/uploads/seed-{i}.mp3',
+                            title=f'Artist {i % 499} - {rng.choice(words)} {rng.choice(words)} {i}')
+              for i in range(size)]
+    with backend.journal.mutation():
+        backend.playlist.clear()
+        backend.playlist.extend(tracks)
+        backend.playlist.set_current_to_index(0)
+    backend.youtube.search_cache.clear()
+    backend.youtube.info_cache.clear()
+
+
+class Session:
+    """Estado del cliente simulado: la ETag que ya tiene, la versión que vio, etc."""
+
+    def __init__(self, backend, rng, namespace):
+        self.backend = backend
+        self.client = backend.app.test_client()
+        self.rng = rng
+        self.namespace = namespace
+        self.etag = None
+        self.version = 0
+        self.added = 0
+        self.length = 0
+        self.previews = set()
+        # Variante de la última petición ('miss', 'rebuild') o None: se mide aparte
+        self.variant = None
+
+    def playlist_full(self):
+        # El cuerpo completo se serializa una vez por versión (ver backend.get_playlist)
+        cached = self.backend._playlist_cache.get(False)
+        self.variant = None if cached and cached[0] == self.backend.playlist_etag() else 'rebuild'
+        headers = {'If-None-Match': self.etag} if self.etag and self.rng.random() < 0.5 else {}
+        response = self.client.get('/playlist', headers=headers)
+        self.etag = response.headers.get('ETag', self.etag)
+        self._track_version(response)
+        return response
+
+    def playlist_page(self):
+        response = self.client.get(f'/playlist?offset={self.rng.randrange(max(1, self.length))}&limit=50')
+        self._track_version(response)
+        return response
+
+    def changes(self):
+        response = self.client.get(f'/playlist/changes?since={max(0, self.version - self.rng.randrange(10))}')
+        data = response.get_json(silent=True) or {}
+        self.version = data.get('version', self.version)
+        return response
+
+    def current(self):
+        return self.client.get('/current')
+
+    def next(self):
+        return self.client.post('/next')
+
+    def search(self):
+        word = self.rng.choice(QUERIES).split()[0]
+        return self.client.get(f'/search?q={word[:self.rng.randint(2, len(word))]}&prefix=1&limit=50')
+
+    def add(self):
+        self.added += 1
+        return self.client.post('/add', data={
+            'path': f'/uploads/{self.namespace}-{self.added}.mp3',
+            'title': f'{self.namespace} nuevo {self.added}',
+            'position': self.rng.choice(('end', 'end', 'start', str(self.rng.randrange(max(1, self.length))))),
+        })
+
+    def remove(self):
+        return self.client.delete('/remove', json={'index': self.rng.randrange(max(1, self.length))})
+
+    def move(self):
+        return self.client.post(f'/move/{self.rng.randrange(max(1, self.length))}/{self.rng.randrange(max(1, self.length))}')
+
+    def set_current(self):
+        return self.client.post(f'/set_current/{self.rng.randrange(max(1, self.length))}')
+
+    def youtube_search(self):
+        return self.client.get(f'/youtube/search?q={self.namespace} {self.rng.choice(QUERIES)}')
+
+    def deezer_preview(self):
+        url = f'https://cdnt-preview.dzcdn.net/api/1/{self.namespace}/{self.rng.randrange(PREVIEW_URLS)}.mp3'
+        self.variant = None if url in self.previews else 'miss'
+        self.previews.add(url)
+        headers = {}
+        if self.rng.random() < 0.5:
+            start = self.rng.randrange(PREVIEW_SIZE)
+            headers['Range'] = f'bytes={start}-{min(PREVIEW_SIZE - 1, start + 64 * 1024)}'
+        return self.client.get('/proxy/deezer', query_string={'url': url}, headers=headers)
+
+    def youtube_download(self):
+        video_id = f'{self.namespace[:3]}{self.rng.randrange(10 ** 8):08d}'
+        return self.client.post('/youtube/download', json={'url': f'https://www.youtube.com/watch?v={video_id}'})
+
+    def _track_version(self, response):
+        self.version = int(response.headers.get('X-Playlist-Version', self.version))
+        self.length = int(response.headers.get('X-Total-Count', self.length))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run_workload(backend, name, weights, total, size, seed, namespace=None):
+    reset_playlist(backend, size, seed)
+    rng = random.Random(seed)
+    session = Session(backend, rng, namespace or name)
+    session.length = size
+    routes = sorted(weights)
+    route_weights = [weights[route] for route in routes]
+    latencies = collections.defaultdict(list)
+    errors = 0
+
+    for i in range(WARMUP_REQUESTS + total):
+        route = rng.choices(routes, route_weights)[0]
+        session.variant = None
+        start = time.perf_counter()
+        response = getattr(session, route)()
+        response.get_data()  # consume los cuerpos en streaming (previews)
+        elapsed = time.perf_counter() - start
+        response.close()
+        if response.status_code >= 500:
+            errors += 1
+        if route in ('add', 'remove'):
+            session.length = backend.playlist.length
+        if i >= WARMUP_REQUESTS:
+            latencies[f'{route}_{session.variant}' if session.variant else route].append(elapsed)
+
+    every = [value for values in latencies.values() for value in values]
+    elapsed = sum(every)
+    ms = lambda value: round(value * 1000, 3)
+    results = {f'macro.{name}': {
+        'value': elapsed / len(every),
+        'requests': len(every),
+        'rps': round(len(every) / elapsed, 1),
+        'p50_ms': ms(percentile(every, 50)),
+        'p95_ms': ms(percentile(every, 95)),
+        'p99_ms': ms(percentile(every, 99)),
+        'errors': errors,
+        'threshold': THRESHOLD,
+    }}
+    for route, values in sorted(latencies.items()):
+        results[f'macro.{name}.{route}'] = {
+            'value': statistics.median(values),
+            'requests': len(values),
+            'p50_ms': ms(statistics.median(values)),
+            'p95_ms': ms(percentile(values, 95)),
+            'threshold': COLD_THRESHOLD if route in COLD_ROUTES else THRESHOLD,
+        }
+    return results
+
+
+def run(size=DEFAULT_SIZE, total=DEFAULT_REQUESTS, upstream_latency=0.0, seed=1, rounds=DEFAULT_ROUNDS, log=print):
+    """
+    Como en benchmarks.micro, por medición se queda con la ronda de menor
+    valor. Cada ronda usa su propio espacio de nombres (previews, búsquedas,
+    pistas agregadas), así que todas empiezan con las cachés frías.
+    """
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='playerpro-macro-')
+    # Registrado antes de importar backend: atexit corre en orden inverso y
+    # backend todavía guarda sus archivos (trabajos, índice de previews) al salir
+    atexit.register(shutil.rmtree, workdir, True)
+    try:
+        backend, upstream = load_backend(workdir, upstream_latency)
+        results = {}
+        for round_number in range(1, rounds + 1):
+            for index, (name, weights) in enumerate(WORKLOADS.items()):
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    # Otra semilla por ronda: los ids de video de youtube_download no se repiten
+                    measured = run_workload(backend, name, weights, total, size,
+                                            seed * 1_000_003 + index * 1_009 + round_number, f'{name}-r{round_number}')
+                for key, row in measured.items():
+                    if key not in results or row['value'] < results[key]['value']:
+                        results[key] = row
+                row = measured[f'macro.{name}']
+                log(f"  macro {name:>10} ronda {round_number}/{rounds}: {row['rps']} req/s, "
+                    f"p95 {row['p95_ms']} ms ({time.perf_counter() - started:.1f}s)")
+        log(f'  macro: {upstream.requests} peticiones a los fakes de YouTube/Deezer')
+        backend.journal.close()
+        backend.download_queue.shutdown()
+        return results
+    finally:
+        os.chdir(cwd)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE)
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS)
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS)
+    parser.add_argument('--upstream-latency', type=float, default=0.0, help='segundos por petición a los fakes')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    results = run(args.size, args.requests, args.upstream_latency, args.seed, args.rounds)
+    print(f"{'benchmark':<40} {'p50 ms':>10} {'p95 ms':>10} {'req/s':>10}")
+    for name, row in results.items():
+        print(f"{name:<40} {row['p50_ms']:>10} {row['p95_ms']:>10} {str(row.get('rps', '')):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks de la playlist: cada operación por separado, para cada motor
+(DoublyLinkedPlaylist, IndexedPlaylist) y tamaño, con los mismos índices que
+usa backend.py. Cada operación se cronometra sola y se deshace fuera del
+cronómetro, así el tamaño no cambia entre mediciones; el orden y las
+posiciones salen de una semilla fija.
+
+Resultados: 'micro.<motor>.<operación>.<tamaño>' -> mediana/p95 en µs.
+
+Uso:
+    python -m benchmarks.micro [--sizes 10,1000,10000,100000] [--full] [--ops 100] [--rounds 3] [--engines indexed,linear]
+    (normalmente se corre desde ``python -m benchmarks.suite``)
+"""
+
+import argparse
+import gc
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from playlist_engine import DoublyLinkedPlaylist, IndexedPlaylist, Track
+from playlist_journal import ColumnarSnapshot, PlaylistJournal, write_snapshot
+from search_index import LookupIndex, SearchIndex
+
+DEFAULT_SIZES = [10, 1_000, 10_000, 100_000]
+FULL_SIZES = [10, 1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_OPS = 100
+DEFAULT_ROUNDS = 3
+# Operaciones O(n) (shuffle, iterate, snapshot): hasta 5 repeticiones o ~2 s
+FULL_PASS_REPEATS = 5
+FULL_PASS_BUDGET = 2.0
+ENGINES = {'linear': DoublyLinkedPlaylist, 'indexed': IndexedPlaylist}
+# Las búsquedas por posición del motor lineal son O(n) (search ordena con
+# index_of): por encima de este tamaño tarda minutos y no aporta
+ENGINE_MAX_SIZE = {'linear': 10_000}
+WORDS = ('love', 'night', 'dance', 'blue', 'heart', 'fire', 'rain', 'city', 'dream', 'summer',
+         'corazón', 'noche', 'canción', 'sol', 'vida', 'amor', 'luna', 'mar', 'tiempo', 'baile')
+
+
+def make_track(rng, n):
+    title = ' '.join(rng.choice(WORDS) for _ in range(3))
+    return Track(path=f'/uploads/{n}.mp3', title=f'Artist {n % 997} - {title} {n}')
+
+
+def build(cls, size, seed):
+    rng = random.Random(seed)
+    playlist = cls()
+    playlist.add_index(SearchIndex())
+    playlist.add_index(LookupIndex())
+    playlist.extend(make_track(rng, i) for i in range(size))
+    return playlist
+
+
+class Timer:
+    """Duración de cada bloque ``with``; el resumen usa la mediana"""
+
+    def __init__(self):
+        self.samples = []
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.samples.append(time.perf_counter() - self._start)
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'value': statistics.median(samples),
+        'median_us': round(statistics.median(samples) * 1e6, 3),
+        'p95_us': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1e6, 3),
+        'mean_us': round(statistics.fmean(samples) * 1e6, 3),
+        'samples': len(samples),
+    }
+
+
+def bench_playlist(playlist, ops, rng):
+    """Operaciones de tamaño constante (cada una se deshace sin cronometrar)"""
+    timers = {name: Timer() for name in (
+        'append', 'prepend', 'insert_at_index', 'move', 'remove_by_index', 'remove_by_title',
+        'search', 'set_current_to_index', 'contains_path',
+    )}
+    counter = 10 ** 9
+    playlist.search('warmup', prefix=True, limit=1)  # construye el índice fuera del cronómetro
+    for _ in range(ops):
+        counter += 1
+        track = make_track(rng, counter)
+        with timers['append']:
+            playlist.append(track)
+        playlist.remove_node(playlist.tail)
+
+        with timers['prepend']:
+            playlist.prepend(track)
+        playlist.remove_node(playlist.head)
+
+        index = rng.randrange(playlist.length + 1)
+        with timers['insert_at_index']:
+            playlist.insert_at_index(index, track)
+        playlist.remove_by_index(index)
+
+        if not playlist.length:
+            continue
+        from_index, to_index = rng.randrange(playlist.length), rng.randrange(playlist.length)
+        with timers['move']:
+            playlist.move(from_index, to_index)
+
+        index = rng.randrange(playlist.length)
+        removed = playlist.tracks_range(index, 1)[0]
+        with timers['remove_by_index']:
+            playlist.remove_by_index(index)
+        playlist.insert_at_index(index, removed)
+
+        index = rng.randrange(playlist.length)
+        removed = playlist.tracks_range(index, 1)[0]
+        with timers['remove_by_title']:
+            playlist.remove_by_title(removed.title)
+        playlist.insert_at_index(index, removed)
+
+        query = ' '.join(rng.sample(WORDS, 2))[:-1]
+        with timers['search']:
+            playlist.search(query, prefix=True, limit=50)
+
+        index = rng.randrange(playlist.length)
+        with timers['set_current_to_index']:
+            playlist.set_current_to_index(index)
+
+        with timers['contains_path']:
+            playlist.contains_path(f'/uploads/{rng.randrange(playlist.length * 2)}.mp3')
+    return timers
+
+
+def bench_full_passes(playlist, rng, workdir):
+    """Operaciones O(n): shuffle, recorrido completo, snapshot a disco y carga"""
+    snapshot_path = os.path.join(workdir, 'bench.snapshot')
+
+    def iterate():
+        for _ in playlist.iterate():
+            pass
+
+    def snapshot_save():
+        write_snapshot(snapshot_path, playlist.get_all_tracks(), playlist.version, playlist.current_index())
+
+    def snapshot_load():
+        loaded = type(playlist)()
+        snapshot = ColumnarSnapshot(snapshot_path)
+        loaded.load_lazy(snapshot, snapshot.current)
+        loaded.tracks_range(0, 1)  # materializa los nodos
+
+    operations = {
+        'shuffle': lambda: playlist.shuffle(rng.getrandbits(32)),
+        'iterate': iterate,
+        'snapshot_save': snapshot_save,
+        'snapshot_load': snapshot_load,
+    }
+    timers = {}
+    for name, operation in operations.items():
+        timer = timers[name] = Timer()
+        while len(timer.samples) < FULL_PASS_REPEATS and sum(timer.samples) < FULL_PASS_BUDGET:
+            with timer:
+                operation()
+    return timers
+
+
+def bench_journaled_append(cls, size, ops, seed, workdir):
+    """append con el journal suscrito: el coste de persistencia de cada /add"""
+    playlist = build(cls, size, seed)
+    workdir = tempfile.mkdtemp(dir=workdir)
+    journal = PlaylistJournal(os.path.join(workdir, 'playlist.snapshot'), os.path.join(workdir, 'playlist.journal'),
+                              compact_every=max(10_000, size))
+    journal.load(playlist)
+    rng = random.Random(seed)
+    timer = Timer()
+    try:
+        for i in range(ops):
+            track = make_track(rng, 10 ** 9 + i)
+            with timer:
+                with journal.mutation():
+                    playlist.append(track)
+    finally:
+        journal.close()
+    return timer
+
+
+def bench_engine(cls, size, ops, seed, workdir):
+    rng = random.Random(seed * 1_000_003 + size)
+    build_timer = Timer()
+    while True:
+        with build_timer:
+            playlist = build(cls, size, seed)
+        if len(build_timer.samples) >= FULL_PASS_REPEATS or sum(build_timer.samples) >= FULL_PASS_BUDGET:
+            break
+        del playlist
+    timers = {'build': build_timer}
+    gc.collect()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        timers.update(bench_playlist(playlist, ops, rng))
+        timers.update(bench_full_passes(playlist, rng, workdir))
+        del playlist
+        gc.collect()
+        timers['append_journaled'] = bench_journaled_append(cls, size, min(ops, 100), seed, workdir)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    gc.collect()
+    return timers
+
+
+def run(sizes=DEFAULT_SIZES, ops=DEFAULT_OPS, engines=tuple(ENGINES), seed=1, rounds=DEFAULT_ROUNDS, log=print):
+    """
+    Corre todo ``rounds`` veces con las mismas semillas y se queda, por
+    medición, con la ronda de menor mediana: una ráfaga de ruido de la
+    máquina afecta a un bloque entero de una ronda, no a todas.
+    """
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='playerpro-bench-')
+    # Calentamiento descartado: la primera medición no paga cachés ni el arranque del allocator
+    bench_playlist(build(IndexedPlaylist, 1_000, seed), ops, random.Random(seed))
+    try:
+        for round_number in range(1, rounds + 1):
+            for size in sizes:
+                for engine in engines:
+                    if size > ENGINE_MAX_SIZE.get(engine, size):
+                        if round_number == 1:
+                            log(f'  micro {engine:>8} {size:>9}: omitido (máximo {ENGINE_MAX_SIZE[engine]})')
+                        continue
+                    started = time.perf_counter()
+                    timers = bench_engine(ENGINES[engine], size, ops, seed, workdir)
+                    for name, timer in timers.items():
+                        key = f'micro.{engine}.{name}.{size}'
+                        summary = summarize(timer.samples)
+                        if key not in results or summary['value'] < results[key]['value']:
+                            results[key] = summary
+                    log(f'  micro {engine:>8} {size:>9} ronda {round_number}/{rounds}: '
+                        f'{time.perf_counter() - started:.1f}s')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES))
+    parser.add_argument('--full', action='store_true', help='incluir 1M pistas')
+    parser.add_argument('--ops', type=int, default=DEFAULT_OPS)
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS)
+    parser.add_argument('--engines', default=','.join(ENGINES))
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    sizes = FULL_SIZES if args.full else [int(size) for size in args.sizes.split(',')]
+    results = run(sizes, args.ops,
+                  [engine.strip() for engine in args.engines.split(',')], args.seed, args.rounds)
+    print(f"{'benchmark':<50} {'mediana µs':>12} {'p95 µs':>12}")
+    for name, row in results.items():
+        print(f"{name:<50} {row['median_us']:>12} {row['p95_us']:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark: DoublyLinkedPlaylist (lineal) vs IndexedPlaylist (treap implícito)
+
+Mide búsqueda por índice, inserción, borrado y move en posiciones aleatorias.
+
+Uso:
+    python -m benchmarks.playlist_index [tamaño ...] [--ops N]
+"""
+
+import random
+import sys
+import time
+
+from playlist_engine import DoublyLinkedPlaylist, IndexedPlaylist, Track
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+DEFAULT_OPS = 100
+
+
+def build(cls, size):
+    playlist = cls()
+    playlist.extend(Track(path=f'/uploads/{i}.mp3', title=f'Track {i}') for i in range(size))
+    return playlist
+
+
+def run_ops(playlist, ops, seed):
+    """Ejecuta `ops` operaciones de cada tipo y devuelve microsegundos por operación"""
+    rng = random.Random(seed)
+    results = {}
+
+    start = time.perf_counter()
+    for _ in range(ops):
+        playlist.set_current_to_index(rng.randrange(playlist.length))
+    results['lookup'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(ops):
+        playlist.insert_at_index(rng.randrange(1, playlist.length), Track(path=f'/new/{i}', title='new'))
+    results['insert'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(ops):
+        playlist.remove_by_index(rng.randrange(playlist.length))
+    results['remove'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(ops):
+        playlist.move(rng.randrange(playlist.length), rng.randrange(playlist.length))
+    results['move'] = time.perf_counter() - start
+
+    return {name: elapsed / ops * 1e6 for name, elapsed in results.items()}
+
+
+def main(argv):
+    ops = DEFAULT_OPS
+    if '--ops' in argv:
+        i = argv.index('--ops')
+        ops = int(argv[i + 1])
+        argv = argv[:i] + argv[i + 2:]
+    sizes = [int(arg) for arg in argv] or DEFAULT_SIZES
+
+    print(f"{'size':>10} {'engine':>22} {'lookup':>10} {'insert':>10} {'remove':>10} {'move':>10}  (µs/op)")
+    for size in sizes:
+        for cls in (DoublyLinkedPlaylist, IndexedPlaylist):
+            playlist = build(cls, size)
+            timings = run_ops(playlist, ops, seed=size)
+            print(f"{size:>10} {cls.__name__:>22} "
+                  f"{timings['lookup']:>10.1f} {timings['insert']:>10.1f} "
+                  f"{timings['remove']:>10.1f} {timings['move']:>10.1f}")
+            del playlist
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
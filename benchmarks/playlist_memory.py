@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memoria: bytes por pista con Track/Node basados en __dict__
+(representación anterior) frente a las clases con __slots__ actuales.
+
+Uso:
+    python -m benchmarks.playlist_memory [tamaño ...]
+"""
+
+import gc
+import random
+import sys
+import tracemalloc
+from dataclasses import dataclass
+
+from playlist_engine import DoublyLinkedPlaylist, IndexedPlaylist, Track
+
+DEFAULT_SIZES = [10_000, 100_000]
+
+
+# Réplica de la representación anterior, solo para comparar
+@dataclass
+class DictTrack:
+    path: str
+    title: str
+
+
+class DictNode:
+    def __init__(self, track):
+        self.track = track
+        self.prev = None
+        self.next = None
+
+
+class DictIndexedNode(DictNode):
+    def __init__(self, track):
+        super().__init__(track)
+        self.parent = None
+        self.left = None
+        self.right = None
+        self.size = 1
+        self.priority = random.random()
+
+
+class DictLinkedPlaylist(DoublyLinkedPlaylist):
+    def _new_node(self, track):
+        return DictNode(track)
+
+
+class DictIndexedPlaylist(IndexedPlaylist):
+    def _new_node(self, track):
+        return DictIndexedNode(track)
+
+
+def bytes_per_track(playlist_cls, track_cls, size):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    playlist = playlist_cls()
+    playlist.extend(track_cls(f'/uploads/{i:08d}.mp3', f'Track {i}') for i in range(size))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del playlist
+    return (after - before) / size
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or DEFAULT_SIZES
+    cases = [
+        ('linked, __dict__', DictLinkedPlaylist, DictTrack),
+        ('linked, __slots__', DoublyLinkedPlaylist, Track),
+        ('indexed, __dict__', DictIndexedPlaylist, DictTrack),
+        ('indexed, __slots__', IndexedPlaylist, Track),
+    ]
+    print(f"{'size':>10} {'representation':>20} {'bytes/track':>12}")
+    for size in sizes:
+        for name, playlist_cls, track_cls in cases:
+            print(f"{size:>10} {name:>20} {bytes_per_track(playlist_cls, track_cls, size):>12.1f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Prueba de estrés: varios hilos mutan la playlist y otros la leen a la vez,
+con el mismo RWLock que usa backend.py. Arranca en modo diferido (snapshot
+mapeado) para que los primeros lectores compitan también por materializar
+los nodos y construir los índices. Al final verifica los invariantes:
+longitud, head/tail, simetría prev/next, tamaños y padres del treap, orden
+por índice, pista actual, índices de búsqueda y versión. También verifica
+que los escritores no se queden sin turno: una fase de lectura admite a lo
+sumo una lectura por lector, así que debe haber al menos una escritura cada
+``readers * MIN_WRITE_SHARE`` lecturas.
+
+Con --no-lock se omite el lock, para ver qué se rompe sin él.
+
+Uso:
+    python -m benchmarks.playlist_stress [--writers 8] [--readers 8] [--seconds 5] [--size 10000] [--no-lock]
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from playlist_engine import IndexedPlaylist, Track
+from playlist_journal import ColumnarSnapshot, write_snapshot
+from rwlock import RWLock
+from search_index import LookupIndex, SearchIndex
+
+# Margen sobre una escritura cada ``readers`` lecturas (fases alternadas)
+MIN_WRITE_SHARE = 4
+
+
+class NoLock:
+    def read_locked(self):
+        return contextlib.nullcontext()
+
+    def write_locked(self):
+        return contextlib.nullcontext()
+
+
+def new_track(rng):
+    n = rng.randrange(1_000_000)
+    return Track(path=f'/uploads/{n}.mp3', title=f'Track {n}')
+
+
+def mutate(playlist, rng):
+    op = rng.choices(
+        ('append', 'insert', 'remove', 'move', 'set_current', 'next', 'prev', 'extend', 'shuffle', 'shuffle_play'),
+        weights=(20, 20, 25, 20, 5, 4, 4, 1, 0.05, 0.5),
+    )[0]
+    length = playlist.length
+    if op == 'append':
+        playlist.append(new_track(rng))
+    elif op == 'insert':
+        playlist.insert_at_index(rng.randrange(length + 1), new_track(rng))
+    elif op == 'remove' and length:
+        playlist.remove_by_index(rng.randrange(length))
+    elif op == 'move' and length:
+        playlist.move(rng.randrange(length), rng.randrange(length + 1))
+    elif op == 'set_current' and length:
+        playlist.set_current_to_index(rng.randrange(length))
+    elif op == 'next':
+        playlist.next_track()
+    elif op == 'prev':
+        playlist.prev_track()
+    elif op == 'extend':
+        playlist.extend(new_track(rng) for _ in range(rng.randrange(1, 20)))
+    elif op == 'shuffle':
+        playlist.shuffle(rng.getrandbits(32), keep_current=rng.random() < 0.5)
+    elif op == 'shuffle_play':
+        playlist.set_shuffle_play(rng.choice((None, rng.getrandbits(32))))
+
+
+def read(playlist, rng):
+    """Lecturas que usa la API; devuelve un error si la vista no es consistente"""
+    op = rng.randrange(5)
+    if op == 0:
+        tracks = playlist.get_all_tracks()
+        if len(tracks) != playlist.length:
+            return f'get_all_tracks: {len(tracks)} tracks, length {playlist.length}'
+    elif op == 1:
+        offset = rng.randrange(playlist.length + 1)
+        tracks = playlist.tracks_range(offset, 50)
+        if len(tracks) != min(50, playlist.length - offset):
+            return f'tracks_range({offset}, 50): {len(tracks)} tracks, length {playlist.length}'
+    elif op == 2:
+        playlist.search(f'track {rng.randrange(100)}', prefix=True, limit=20)
+    elif op == 3:
+        playlist.contains_path(f'/uploads/{rng.randrange(1_000_000)}.mp3')
+    else:
+        index = playlist.current_index()
+        if not -1 <= index < playlist.length:
+            return f'current_index {index} out of range (length {playlist.length})'
+    return None
+
+
+def check_invariants(playlist):
+    errors = []
+    nodes = []
+    node, prev = playlist.head, None
+    if node is not None and node.prev is not None:
+        errors.append('head.prev is not None')
+    while node is not None and len(nodes) <= playlist.length:
+        if node.prev is not prev:
+            errors.append(f'prev/next asymmetry at position {len(nodes)}')
+            break
+        nodes.append(node)
+        prev, node = node, node.next
+    if playlist.tail is not prev:
+        errors.append('tail is not the last node')
+    if len(nodes) != playlist.length:
+        errors.append(f'length {playlist.length}, forward walk {len(nodes)}')
+
+    backward = 0
+    node = playlist.tail
+    while node is not None and backward <= playlist.length:
+        backward += 1
+        node = node.prev
+    if backward != playlist.length:
+        errors.append(f'length {playlist.length}, backward walk {backward}')
+
+    if isinstance(playlist, IndexedPlaylist):
+        if (playlist.root.size if playlist.root else 0) != playlist.length:
+            errors.append('root size does not match length')
+        for i, node in enumerate(nodes):
+            size = 1 + (node.left.size if node.left else 0) + (node.right.size if node.right else 0)
+            if node.size != size:
+                errors.append(f'treap size mismatch at position {i}')
+                break
+            for child in (node.left, node.right):
+                if child is not None and child.parent is not node:
+                    errors.append(f'treap parent mismatch at position {i}')
+                    break
+            if playlist.index_of(node) != i:
+                errors.append(f'index_of mismatch at position {i}')
+                break
+
+    if playlist.current is not None and playlist.current not in set(nodes):
+        errors.append('current is not in the list')
+
+    lookup = playlist.lookup_index
+    if lookup is not None and lookup.ready:
+        for node in random.sample(nodes, min(200, len(nodes))):
+            if node not in lookup.find_path(node.track.path):
+                errors.append(f'lookup index is missing {node.track.path}')
+                break
+    return errors
+
+
+def run(writers, readers, seconds, size, use_lock, seed):
+    rng = random.Random(seed)
+    fd, snapshot_path = tempfile.mkstemp(suffix='.snapshot')
+    os.close(fd)
+    write_snapshot(snapshot_path, [new_track(rng) for _ in range(size)], 0, 0)
+    try:
+        playlist = IndexedPlaylist()
+        playlist.add_index(SearchIndex())
+        playlist.add_index(LookupIndex())
+        playlist.load_lazy(ColumnarSnapshot(snapshot_path), 0)
+        emitted = [0]
+        playlist.subscribe(lambda op, args: emitted.__setitem__(0, emitted[0] + 1))
+
+        lock = RWLock() if use_lock else NoLock()
+        deadline = time.monotonic() + seconds
+        counts = {'writes': 0, 'reads': 0}
+        failures = []
+        counts_lock = threading.Lock()
+
+        def worker(is_writer, worker_seed):
+            local = random.Random(worker_seed)
+            done = 0
+            try:
+                while time.monotonic() < deadline:
+                    if is_writer:
+                        with lock.write_locked():
+                            mutate(playlist, local)
+                    else:
+                        with lock.read_locked():
+                            error = read(playlist, local)
+                        if error:
+                            failures.append(error)
+                    done += 1
+            except Exception as e:
+                failures.append(f'{type(e).__name__}: {e}')
+            with counts_lock:
+                counts['writes' if is_writer else 'reads'] += done
+
+        threads = [threading.Thread(target=worker, args=(True, rng.random())) for _ in range(writers)]
+        threads += [threading.Thread(target=worker, args=(False, rng.random())) for _ in range(readers)]
+        # Cambios de hilo frecuentes para provocar intercalados
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+
+        errors = check_invariants(playlist)
+        if playlist.version != emitted[0]:
+            errors.append(f'version {playlist.version}, emitted {emitted[0]} operations')
+        return counts, failures, errors, playlist.length
+    finally:
+        os.remove(snapshot_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--size', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-lock', action='store_true')
+    args = parser.parse_args()
+
+    counts, failures, errors, length = run(args.writers, args.readers, args.seconds, args.size,
+                                           not args.no_lock, args.seed)
+    print(f"{counts['writes']} escrituras, {counts['reads']} lecturas en {args.seconds}s; "
+          f"longitud final {length}")
+    if not args.no_lock and args.writers and args.readers:
+        minimum = counts['reads'] // (args.readers * MIN_WRITE_SHARE)
+        if counts['writes'] < minimum:
+            errors.append(f"escritores sin turno: {counts['writes']} escrituras, mínimo {minimum}")
+    for message in failures[:10]:
+        print(f'  lectura/escritura fallida: {message}')
+    for message in errors:
+        print(f'  invariante roto: {message}')
+    if failures or errors:
+        print(f'FALLÓ: {len(failures)} operaciones inconsistentes, {len(errors)} invariantes rotos')
+        sys.exit(1)
+    print('OK: invariantes intactos')
+
+
+if __name__ == '__main__':
+    main()
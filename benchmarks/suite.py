@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Suite de benchmarks: micro (operaciones de la playlist, benchmarks.micro) y
+macro (rutas HTTP con el test client, benchmarks.macro). Guarda los
+resultados en JSON y los compara con una línea base: una medición es una
+regresión si su ``value`` (segundos; menos es mejor) supera al de la línea
+base en más de su umbral y en más de ``MIN_DELTA`` (ruido de las
+operaciones de microsegundos). Con regresiones termina con código 1.
+
+El umbral es el ``threshold`` de la medición en la línea base (las macro lo
+traen: más holgado para rutas HTTP y caminos fríos), si no ``DEFAULT_THRESHOLD``;
+``--threshold`` usa un mismo umbral para todas.
+
+La línea base (benchmarks/baseline.json) depende de la máquina: se regenera
+con --save-baseline en la máquina donde se comparan los cambios.
+
+Uso:
+    python -m benchmarks.suite [--micro] [--macro] [--full] [--json resultados.json]
+    python -m benchmarks.suite --save-baseline
+    python -m benchmarks.suite --compare resultados.json [--baseline benchmarks/baseline.json]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+
+from benchmarks import macro, micro
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_THRESHOLD = 0.35
+MIN_DELTA = 5e-6
+
+
+def metadata(args):
+    return {
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'seed': args.seed,
+        'micro_sizes': args.sizes if args.micro else None,
+        'micro_ops': args.ops if args.micro else None,
+        'micro_rounds': args.rounds if args.micro else None,
+        'macro_size': args.macro_size if args.macro else None,
+        'macro_requests': args.requests if args.macro else None,
+        'macro_rounds': args.macro_rounds if args.macro else None,
+    }
+
+
+def compare(results, baseline, threshold=None):
+    """[(nombre, base, actual, cambio relativo)] de regresiones y mejoras"""
+    regressions, improvements = [], []
+    for name, row in results.items():
+        base = baseline.get(name)
+        if base is None or not base.get('value'):
+            continue
+        limit = threshold if threshold is not None else base.get('threshold', DEFAULT_THRESHOLD)
+        change = row['value'] / base['value'] - 1
+        delta = abs(row['value'] - base['value'])
+        if change > limit and delta > MIN_DELTA:
+            regressions.append((name, base['value'], row['value'], change))
+        elif change < -limit and delta > MIN_DELTA:
+            improvements.append((name, base['value'], row['value'], change))
+    return regressions, improvements
+
+
+def print_comparison(regressions, improvements, missing):
+    def show(title, rows):
+        if not rows:
+            return
+        print(f'\n{title}:')
+        print(f"  {'benchmark':<50} {'base':>12} {'actual':>12} {'cambio':>8}")
+        for name, base, value, change in sorted(rows, key=lambda row: -abs(row[3])):
+            print(f'  {name:<50} {base * 1e6:>10.1f}µs {value * 1e6:>10.1f}µs {change:>+8.0%}')
+
+    show('Regresiones', regressions)
+    show('Mejoras', improvements)
+    if missing:
+        print(f'\n{len(missing)} mediciones de la línea base no se corrieron (otros tamaños o rutas)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--micro', action='store_true', help='solo micro (por defecto: ambos)')
+    parser.add_argument('--macro', action='store_true', help='solo macro (por defecto: ambos)')
+    parser.add_argument('--full', action='store_true', help='micro hasta 1M pistas')
+    parser.add_argument('--sizes', help='tamaños del micro, p. ej. 10,1000,100000')
+    parser.add_argument('--ops', type=int, default=micro.DEFAULT_OPS)
+    parser.add_argument('--rounds', type=int, default=micro.DEFAULT_ROUNDS)
+    parser.add_argument('--macro-size', type=int, default=macro.DEFAULT_SIZE)
+    parser.add_argument('--requests', type=int, default=macro.DEFAULT_REQUESTS)
+    parser.add_argument('--macro-rounds', type=int, default=macro.DEFAULT_ROUNDS)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='guardar los resultados en este archivo')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help='guardar los resultados como línea base')
+    parser.add_argument('--compare', metavar='RESULTADOS', help='comparar un JSON ya guardado sin correr nada')
+    parser.add_argument('--threshold', type=float,
+                        help='cambio relativo que cuenta como regresión en todas las mediciones '
+                             '(0.35 = 35%% más lento; por defecto el de cada medición)')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+    else:
+        if not args.micro and not args.macro:
+            args.micro = args.macro = True
+        if args.sizes:
+            args.sizes = [int(size) for size in args.sizes.split(',')]
+        else:
+            args.sizes = micro.FULL_SIZES if args.full else micro.DEFAULT_SIZES
+        results = {}
+        if args.micro:
+            print(f'micro: tamaños {args.sizes}, {args.ops} operaciones, {args.rounds} rondas')
+            results.update(micro.run(args.sizes, args.ops, seed=args.seed, rounds=args.rounds))
+        if args.macro:
+            print(f'macro: {args.macro_size} pistas, {args.requests} peticiones por mezcla, {args.macro_rounds} rondas')
+            results.update(macro.run(args.macro_size, args.requests, seed=args.seed, rounds=args.macro_rounds))
+        report = {'meta': metadata(args), 'results': results}
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+        if args.save_baseline:
+            with open(args.baseline, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            print(f'Línea base guardada en {args.baseline}')
+            return
+
+    try:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f'Sin línea base ({args.baseline}); guardar una con --save-baseline')
+        return
+    if baseline['meta'].get('python') != report['meta'].get('python'):
+        print(f"Aviso: línea base con Python {baseline['meta'].get('python')}, "
+              f"ahora {report['meta'].get('python')}")
+    regressions, improvements = compare(report['results'], baseline['results'], args.threshold)
+    missing = set(baseline['results']) - set(report['results'])
+    print_comparison(regressions, improvements, missing)
+    compared = len(set(baseline['results']) & set(report['results']))
+    if regressions:
+        print(f'\nFALLÓ: {len(regressions)} de {compared} mediciones más lentas que su umbral')
+        sys.exit(1)
+    print(f'\nOK: {compared} mediciones dentro del umbral de la línea base')
+
+
+if __name__ == '__main__':
+    main()
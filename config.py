@@ -20,11 +20,84 @@ class Config:
     # Configuración de archivos - usar rutas absolutas para mayor robustez
     UPLOAD_FOLDER = os.path.join(os.getcwd(), 'uploads')
     DOWNLOAD_FOLDER = os.path.join(os.getcwd(), 'downloads')
-    MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB max file size
+    MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB max por petición
+    # Tamaño máximo de un archivo subido por sesiones reanudables y tamaño de bloque sugerido
+    MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', str(200 * 1024 * 1024)))
+    UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+    # Servido de audios: 'sendfile', o detrás de un proxy 'x-accel-redirect' (nginx) / 'x-sendfile'
+    MEDIA_SERVE_MODE = os.getenv('MEDIA_SERVE_MODE', 'sendfile').lower()
+    MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected')
     
+    # Persistencia de la playlist (snapshot + journal)
+    PLAYLIST_FSYNC_BATCH = int(os.getenv('PLAYLIST_FSYNC_BATCH', '64'))
+    PLAYLIST_FSYNC_INTERVAL = float(os.getenv('PLAYLIST_FSYNC_INTERVAL', '1.0'))
+    PLAYLIST_COMPACT_EVERY = int(os.getenv('PLAYLIST_COMPACT_EVERY', '10000'))
+    # Operaciones por petición en /batch
+    BATCH_MAX_OPS = int(os.getenv('BATCH_MAX_OPS', '10000'))
+    # Cada cuánto un worker revisa si otro cambió la playlist (memoria compartida, sin I/O)
+    PLAYLIST_FOLLOW_INTERVAL = float(os.getenv('PLAYLIST_FOLLOW_INTERVAL', '0.25'))
+
+    # Cliente HTTP compartido (pools keep-alive por host, timeouts y reintentos)
+    HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '10'))
+    HTTP_HOST_POOLS = os.getenv('HTTP_HOST_POOLS', 'https://www.googleapis.com=8,https://cdnt-preview.dzcdn.net=16')
+    HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3.05'))
+    HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+    HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '3'))
+    HTTP_RETRY_BACKOFF = float(os.getenv('HTTP_RETRY_BACKOFF', '0.5'))
+    # Espera máxima por un Retry-After de 429/503 antes de reintentar
+    HTTP_MAX_RETRY_AFTER = float(os.getenv('HTTP_MAX_RETRY_AFTER', '5'))
+
+    # Caché en disco de los previews de Deezer
+    PREVIEW_CACHE_FOLDER = os.path.join(os.getcwd(), 'preview_cache')
+    PREVIEW_CACHE_MAX_BYTES = int(os.getenv('PREVIEW_CACHE_MAX_BYTES', str(100 * 1024 * 1024)))
+
+    # Metadatos de audio (ffprobe en segundo plano)
+    MEDIA_METADATA_FILE = os.path.join(os.getcwd(), 'media_metadata.jsonl')
+    METADATA_WORKERS = int(os.getenv('METADATA_WORKERS', '2'))
+
+    # Versiones transcodificadas (Opus 96k / MP3 128k normalizadas)
+    RENDITIONS_FOLDER = os.path.join(os.getcwd(), 'renditions')
+    RENDITIONS_MAX_BYTES = int(os.getenv('RENDITIONS_MAX_BYTES', str(300 * 1024 * 1024)))
+    TRANSCODE_WORKERS = int(os.getenv('TRANSCODE_WORKERS', '1'))
+
+    # Eventos en vivo (/events)
+    EVENTS_BUFFER_SIZE = int(os.getenv('EVENTS_BUFFER_SIZE', '1000'))
+    EVENTS_HEARTBEAT = float(os.getenv('EVENTS_HEARTBEAT', '15'))
+    # Con gunicorn cada suscriptor de /events ocupa un hilo del worker: se admiten
+    # hasta una cuarta parte de los hilos y el resto recibe 503 y consulta la
+    # playlist periódicamente. Con SERVER=asgi los suscriptores no ocupan hilos
+    GUNICORN_THREADS = int(os.getenv('GUNICORN_THREADS', '32'))
+    EVENTS_MAX_SUBSCRIBERS = int(os.getenv('EVENTS_MAX_SUBSCRIBERS', str(GUNICORN_THREADS // 4)))
+
+    # Perfilado (/admin/profiler): apagado salvo que se pida; se cambia en caliente.
+    # Los endpoints /admin/* exigen el header X-Admin-Token; sin ADMIN_TOKEN quedan cerrados
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+    PROFILER_SAMPLING = os.getenv('PROFILER_SAMPLING', 'False').lower() == 'true'
+    PROFILER_INTERVAL = float(os.getenv('PROFILER_INTERVAL', '0.01'))
+    SLOW_REQUEST_TRACING = os.getenv('SLOW_REQUEST_TRACING', 'False').lower() == 'true'
+    SLOW_REQUEST_THRESHOLD = float(os.getenv('SLOW_REQUEST_THRESHOLD', '1.0'))
+    SLOW_REQUEST_LOG_SIZE = int(os.getenv('SLOW_REQUEST_LOG_SIZE', '100'))
+
+    # Punto de entrada ASGI (asgi.py): hilos para las rutas Flask
+    ASGI_THREADS = int(os.getenv('ASGI_THREADS', '64'))
+
     # Configuración de YouTube
     YOUTUBE_MAX_RESULTS = 20
     YOUTUBE_SEARCH_TIMEOUT = 30
+
+    # Cola de descargas en segundo plano
+    YOUTUBE_DOWNLOAD_WORKERS = int(os.getenv('YOUTUBE_DOWNLOAD_WORKERS', '2'))
+    YOUTUBE_MAX_QUEUED_DOWNLOADS = int(os.getenv('YOUTUBE_MAX_QUEUED_DOWNLOADS', '20'))
+    DOWNLOAD_JOBS_FILE = os.path.join(os.getcwd(), 'download_jobs.json')
+    # Presupuesto de la caché de descargas (el disco de Render es de 1 GB)
+    DOWNLOAD_CACHE_MAX_BYTES = int(os.getenv('DOWNLOAD_CACHE_MAX_BYTES', str(800 * 1024 * 1024)))
+
+    # Caché de búsquedas e información de videos (YOUTUBE_CACHE_DB vacío = solo memoria)
+    YOUTUBE_SEARCH_CACHE_SIZE = int(os.getenv('YOUTUBE_SEARCH_CACHE_SIZE', '256'))
+    YOUTUBE_SEARCH_CACHE_TTL = int(os.getenv('YOUTUBE_SEARCH_CACHE_TTL', str(6 * 3600)))
+    YOUTUBE_INFO_CACHE_SIZE = int(os.getenv('YOUTUBE_INFO_CACHE_SIZE', '1024'))
+    YOUTUBE_INFO_CACHE_TTL = int(os.getenv('YOUTUBE_INFO_CACHE_TTL', str(24 * 3600)))
+    YOUTUBE_CACHE_DB = os.getenv('YOUTUBE_CACHE_DB', os.path.join(os.getcwd(), 'youtube_cache.sqlite3'))
     
     @staticmethod
     def validate_youtube_api():
@@ -0,0 +1,146 @@
+"""
+Download Cache Module
+Caché persistente de audios descargados, direccionada por id de video y formato,
+con índice en disco, descargas concurrentes coalescidas y expulsión LRU por tamaño
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class DownloadCache:
+    """
+    El índice (``.cache_index.json`` dentro de la carpeta de descargas) guarda por
+    clave el archivo, título, artista, tamaño y último acceso, así que encontrar
+    un audio no requiere listar el directorio. ``is_pinned(filename)`` permite
+    proteger de la expulsión los archivos que siguen en la playlist.
+    """
+
+    INDEX_NAME = '.cache_index.json'
+
+    def __init__(self, download_path, max_bytes, is_pinned=None):
+        self.download_path = download_path
+        self.index_path = os.path.join(download_path, self.INDEX_NAME)
+        self.max_bytes = max_bytes
+        self.is_pinned = is_pinned
+        self.entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def get(self, key):
+        """Resultado de descarga en caché para ``key`` (o None) y lo marca como usado"""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            path = os.path.join(self.download_path, entry['filename'])
+            if not os.path.exists(path):
+                del self.entries[key]
+                self._save()
+                return None
+            entry['last_access'] = time.time()
+            self._save()
+            return self._result(entry)
+
+    def put(self, key, filename, title, artist):
+        path = os.path.join(self.download_path, filename)
+        with self._lock:
+            self.entries[key] = {
+                'filename': filename,
+                'title': title,
+                'artist': artist,
+                'size': os.path.getsize(path),
+                'last_access': time.time(),
+            }
+            self._evict(protect=key)
+            self._save()
+
+    def coalesce(self, key, download, cancelled=None):
+        """
+        Ejecuta ``download()`` una sola vez por clave: las peticiones concurrentes
+        para el mismo video esperan y reciben el mismo resultado. Si la descarga
+        falla porque la canceló quien la hacía (``cancelled()``), su resultado no
+        se comparte: uno de los que esperaban pasa a descargar y el resto lo espera.
+        """
+        while True:
+            with self._lock:
+                inflight = self._inflight.get(key)
+                owner = inflight is None
+                if owner:
+                    inflight = self._inflight[key] = {'event': threading.Event(), 'result': None,
+                                                      'cancelled': False}
+            if owner:
+                break
+            inflight['event'].wait()
+            if not inflight['cancelled']:
+                # Copia marcada: el archivo es del que descargó, no de quien esperó
+                return {**inflight['result'], 'coalesced': True}
+            if cancelled and cancelled():
+                return {'success': False, 'error': 'Download cancelled by user'}
+        try:
+            inflight['result'] = download()
+        except Exception as e:
+            inflight['result'] = {'success': False, 'error': str(e)}
+        finally:
+            inflight['cancelled'] = bool(not (inflight['result'] or {}).get('success')
+                                         and cancelled and cancelled())
+            with self._lock:
+                del self._inflight[key]
+            inflight['event'].set()
+        return inflight['result']
+
+    def _result(self, entry):
+        return {
+            'success': True,
+            'filename': entry['filename'],
+            'title': entry['title'],
+            'artist': entry['artist'],
+            'path': os.path.join(self.download_path, entry['filename']),
+            'cached': True,
+        }
+
+    def _evict(self, protect=None):
+        total = sum(entry['size'] for entry in self.entries.values())
+        if total <= self.max_bytes:
+            return
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            if key == protect or (self.is_pinned and self.is_pinned(entry['filename'])):
+                continue
+            try:
+                os.remove(os.path.join(self.download_path, entry['filename']))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Error evicting cached download {entry['filename']}: {e}")
+                continue
+            total -= entry['size']
+            del self.entries[key]
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Error loading download cache index: {e}")
+            return
+        # Descartar entradas cuyo archivo ya no existe
+        self.entries = {
+            key: entry for key, entry in entries.items()
+            if os.path.exists(os.path.join(self.download_path, entry['filename']))
+        }
+
+    def _save(self):
+        tmp_path = self.index_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"Error saving download cache index: {e}")
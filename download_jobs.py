@@ -0,0 +1,255 @@
+"""
+Download Jobs Module
+Cola de descargas de YouTube en segundo plano con un pool de hilos acotado,
+progreso desde los hooks de yt-dlp, cancelación y tabla de trabajos persistente
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from yt_dlp.utils import DownloadCancelled
+
+# Estados de un trabajo
+QUEUED = 'queued'
+RUNNING = 'running'
+DOWNLOADED = 'downloaded'  # descargado, pendiente de agregarse a la playlist
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+ACTIVE_STATES = (QUEUED, RUNNING)
+FINAL_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class DownloadJob:
+    def __init__(self, url, job_id=None):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.url = url
+        self.status = QUEUED
+        self.progress = 0.0
+        self.downloaded_bytes = 0
+        self.total_bytes = None
+        self.speed = None
+        self.eta = None
+        self.error = None
+        self.info = None
+        self.result = None
+        self.track = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.cancel_requested = False
+        self.future = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'url': self.url,
+            'status': self.status,
+            'progress': round(self.progress, 1),
+            'downloaded_bytes': self.downloaded_bytes,
+            'total_bytes': self.total_bytes,
+            'speed': self.speed,
+            'eta': self.eta,
+            'error': self.error,
+            'info': self.info,
+            'result': self.result,
+            'track': self.track,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        job = cls(data['url'], job_id=data['id'])
+        for key in ('status', 'progress', 'downloaded_bytes', 'total_bytes', 'error', 'info',
+                    'result', 'track', 'created_at', 'updated_at'):
+            if key in data:
+                setattr(job, key, data[key])
+        return job
+
+
+PROGRESS_INTERVAL = 0.5
+
+
+class DownloadJobQueue:
+    """
+    ``submit`` devuelve el trabajo al instante; un ThreadPoolExecutor con
+    ``max_workers`` hilos ejecuta ``youtube.download_audio``. Las pistas
+    descargadas se entregan con ``drain_completed`` desde los hilos de las
+    peticiones, que las agregan con el lock de escritura de la playlist.
+    """
+
+    def __init__(self, youtube, jobs_file, max_workers=2, max_queued=20, history=200, on_update=None):
+        self.youtube = youtube
+        # on_update(job) tras cada cambio de estado y, como mucho cada PROGRESS_INTERVAL s, de progreso
+        self.on_update = on_update
+        self.jobs_file = jobs_file
+        self.max_queued = max_queued
+        self.history = history
+        self.jobs = {}
+        self._completed = deque()
+        self._lock = threading.RLock()
+        self._stopping = False
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='yt-download')
+        self._load()
+        atexit.register(self.shutdown)
+
+    def submit(self, url):
+        """Encola una descarga; devuelve None si la cola está llena"""
+        with self._lock:
+            active = sum(1 for job in self.jobs.values() if job.status in ACTIVE_STATES)
+            if active >= self.max_queued:
+                return None
+            job = DownloadJob(url)
+            self.jobs[job.id] = job
+            self._prune()
+            self._save()
+        job.future = self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def list(self):
+        return sorted(self.jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status not in ACTIVE_STATES:
+                return False
+            job.cancel_requested = True
+            if job.future is not None and job.future.cancel():
+                self._finish(job, CANCELLED)
+            return True
+
+    def drain_completed(self, add_track):
+        """Entrega las descargas terminadas: ``add_track(result)`` devuelve la pista agregada"""
+        while True:
+            try:
+                job = self._completed.popleft()
+            except IndexError:  # vacía (u otro hilo tomó la última)
+                return
+            try:
+                job.track = add_track(job.result)
+                self._finish(job, COMPLETED)
+            except Exception as e:
+                job.error = f'Error adding track to playlist: {e}'
+                self._finish(job, FAILED)
+
+    def _run(self, job):
+        with self._lock:
+            if job.cancel_requested:
+                self._finish(job, CANCELLED)
+                return
+            self._finish(job, RUNNING)
+
+        last_notified = [0.0]
+
+        def progress_hook(status):
+            if job.cancel_requested:
+                raise DownloadCancelled('Download cancelled by user')
+            job.downloaded_bytes = status.get('downloaded_bytes') or 0
+            job.total_bytes = status.get('total_bytes') or status.get('total_bytes_estimate')
+            job.speed = status.get('speed')
+            job.eta = status.get('eta')
+            if job.total_bytes:
+                job.progress = min(100.0, job.downloaded_bytes * 100.0 / job.total_bytes)
+            if status.get('status') == 'finished':
+                job.progress = 100.0
+            job.updated_at = time.time()
+            if self.on_update and job.updated_at - last_notified[0] >= PROGRESS_INTERVAL:
+                last_notified[0] = job.updated_at
+                self.on_update(job)
+
+        try:
+            # Si este trabajo descargaba para otros y se cancela, otro de ellos toma la descarga
+            result = self.youtube.download_audio(job.url, progress_hook=progress_hook,
+                                                 cancelled=lambda: job.cancel_requested)
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+
+        if self._stopping:
+            # Cortado por el apagado del worker: se reanuda en el próximo arranque
+            self._finish(job, QUEUED)
+        elif job.cancel_requested:
+            # Solo se borra lo que descargó este trabajo para sí: los archivos de
+            # la caché (aciertos, esperas compartidas o recién registrados) pueden
+            # estar en la playlist o en otros trabajos, y los libera su desalojo
+            owned = not (result.get('cached') or result.get('coalesced') or result.get('cache_key'))
+            if owned and result.get('success') and result.get('path'):
+                try:
+                    os.remove(result['path'])
+                except OSError:
+                    pass
+            self._finish(job, CANCELLED)
+        elif result.get('success'):
+            job.result = result
+            job.progress = 100.0
+            self._finish(job, DOWNLOADED)
+            self._completed.append(job)
+        else:
+            job.error = result.get('error', 'Unknown download error')
+            job.info = result.get('info')
+            self._finish(job, FAILED)
+
+    def _finish(self, job, status):
+        with self._lock:
+            job.status = status
+            job.updated_at = time.time()
+            self._save()
+        if self.on_update:
+            self.on_update(job)
+
+    def _prune(self):
+        finished = [job for job in self.jobs.values() if job.status in FINAL_STATES]
+        excess = len(finished) - self.history
+        if excess > 0:
+            finished.sort(key=lambda job: job.updated_at)
+            for job in finished[:excess]:
+                del self.jobs[job.id]
+
+    def _save(self):
+        data = [job.to_dict() for job in self.jobs.values()]
+        tmp_path = self.jobs_file + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.jobs_file)
+        except OSError as e:
+            print(f"Error saving download jobs: {e}")
+
+    def _load(self):
+        try:
+            with open(self.jobs_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Error loading download jobs: {e}")
+            return
+        for entry in data:
+            job = DownloadJob.from_dict(entry)
+            self.jobs[job.id] = job
+            if job.status in ACTIVE_STATES:
+                # Interrumpido por un reinicio: volver a encolar desde cero
+                job.status = QUEUED
+                job.progress = 0.0
+                job.future = self._executor.submit(self._run, job)
+            elif job.status == DOWNLOADED:
+                self._completed.append(job)
+
+    def shutdown(self):
+        self._stopping = True
+        with self._lock:
+            for job in self.jobs.values():
+                if job.status == RUNNING:
+                    job.cancel_requested = True
+            self._save()
+        self._executor.shutdown(wait=False, cancel_futures=True)
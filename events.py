@@ -0,0 +1,125 @@
+"""
+Events Module
+Bus de eventos para /events (Server-Sent Events): buffer circular de eventos
+recientes compartido por todos los suscriptores, heartbeat y reanudación con
+Last-Event-ID
+"""
+
+import json
+import threading
+import uuid
+from collections import deque
+
+
+def format_event(event_id, event_type, data):
+    return f'id: {event_id}\nevent: {event_type}\ndata: {data}\n\n'
+
+
+class EventBroker:
+    """
+    ``publish`` agrega el evento (ya serializado) al buffer circular y despierta
+    a los suscriptores; cada suscriptor es solo un cursor sobre ese buffer, así
+    que publicar no depende de cuántos hay conectados. Los ids llevan el id
+    del arranque (``<boot>-<n>``): un Last-Event-ID de otro arranque o que ya
+    salió del buffer recibe un evento ``reset`` para recargar el estado completo.
+    """
+
+    def __init__(self, buffer_size=1000, heartbeat=15, retry_ms=3000):
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.heartbeat = heartbeat
+        self.retry_ms = retry_ms
+        self.last_id = 0
+        self.subscribers = 0
+        self._events = deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+        self._listeners = []
+
+    def publish(self, event_type, payload):
+        data = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+        with self._cond:
+            self.last_id += 1
+            self._events.append((self.last_id, event_type, data))
+            self._cond.notify_all()
+        for callback in self._listeners:
+            callback()
+
+    def add_listener(self, callback):
+        """``callback()`` tras cada publicación, desde el hilo que publica (p. ej. para despertar un event loop)"""
+        self._listeners.append(callback)
+
+    def event_id(self, n):
+        return f'{self.boot_id}-{n}'
+
+    def resume_position(self, last_event_id):
+        """Número del último evento visto, o None si hay que recargar (otro arranque o hueco)"""
+        if not last_event_id:
+            return self.last_id
+        boot_id, _, n = last_event_id.rpartition('-')
+        if boot_id != self.boot_id or not n.isdigit():
+            return None
+        n = int(n)
+        oldest = self._events[0][0] if self._events else self.last_id + 1
+        if n > self.last_id or n < oldest - 1:
+            return None
+        return n
+
+    def events_after(self, position):
+        """Eventos con número > ``position`` que siguen en el buffer"""
+        events = self._events
+        if not events or position >= self.last_id:
+            return []
+        start = max(0, position - events[0][0] + 1)
+        return [events[i] for i in range(start, len(events))]
+
+    def reset_event(self):
+        return format_event(self.event_id(self.last_id), 'reset', json.dumps({'reason': 'resync'}))
+
+    def open(self, last_event_id=None, max_subscribers=None):
+        """
+        Registra un suscriptor; devuelve (posición, hay que enviar reset), o
+        None si ya hay ``max_subscribers`` conectados
+        """
+        with self._cond:
+            if max_subscribers is not None and self.subscribers >= max_subscribers:
+                return None
+            position = self.resume_position(last_event_id)
+            reset = position is None
+            if reset:
+                position = self.last_id
+            self.subscribers += 1
+        return position, reset
+
+    def close(self):
+        with self._cond:
+            self.subscribers -= 1
+
+    def read(self, position):
+        """(texto SSE con los eventos posteriores a ``position``, nueva posición); '' si no hay"""
+        with self._cond:
+            if self._events and position < self._events[0][0] - 1:
+                pending = None  # el suscriptor quedó atrás del buffer
+            else:
+                pending = self.events_after(position)
+            position = self.last_id
+        if pending is None:
+            return self.reset_event(), position
+        return ''.join(format_event(self.event_id(n), event_type, data) for n, event_type, data in pending), position
+
+    def wait(self, position, timeout):
+        with self._cond:
+            self._cond.wait_for(lambda: self.last_id != position, timeout)
+
+    def stream(self, position, reset):
+        """
+        Generador SSE para un suscriptor ya registrado con ``open``: eventos
+        pendientes, nuevos eventos y heartbeat cada ``heartbeat`` s. Quien lo
+        sirve llama a ``close`` al terminar (un generador que nunca arrancó no
+        ejecuta su ``finally``).
+        """
+        yield f'retry: {self.retry_ms}\n\n'
+        if reset:
+            yield self.reset_event()
+        while True:
+            self.wait(position, self.heartbeat)
+            text, position = self.read(position)
+            yield text or ': heartbeat\n\n'
@@ -0,0 +1,88 @@
+"""
+HTTP Client Module
+Cliente HTTP compartido: sesión de requests con pools keep-alive por host,
+timeouts por defecto y reintentos con backoff ante 429/5xx
+"""
+
+import atexit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from profiler import PROFILER
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CappedRetry(Retry):
+    """
+    Retry que no espera más de ``max_retry_after`` s por un Retry-After del
+    servidor: un 429/503 con un Retry-After de minutos bloquearía el hilo de
+    la petición mucho más allá del timeout de lectura.
+    """
+
+    def __init__(self, *args, max_retry_after=5.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_retry_after = max_retry_after
+
+    def new(self, **kw):
+        # Retry.new solo copia sus propios parámetros
+        retry = super().new(**kw)
+        retry.max_retry_after = self.max_retry_after
+        return retry
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.max_retry_after)
+
+
+class HTTPClient:
+    """
+    Una sola ``requests.Session`` para toda la app, así las peticiones
+    reutilizan conexiones TCP/TLS ya abiertas. ``pool_maxsize`` es el número de
+    conexiones por host; ``host_pool_sizes`` ({prefijo de URL: tamaño}) lo
+    ajusta para hosts concretos. Solo se reintentan GET/HEAD; la espera por
+    Retry-After se limita a ``max_retry_after`` s.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, host_pool_sizes=None,
+                 connect_timeout=3.05, read_timeout=10, retries=3, backoff_factor=0.5, max_retry_after=5.0):
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        retry = CappedRetry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({'GET', 'HEAD'}),
+            respect_retry_after_header=True,
+            max_retry_after=max_retry_after,
+            # Al agotar los reintentos se devuelve la última respuesta
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        for prefix, size in (host_pool_sizes or {}).items():
+            self.session.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=size, max_retries=retry))
+        atexit.register(self.close)
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        with PROFILER.span('outbound_http'):
+            return self.session.get(url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def parse_pool_sizes(value):
+    """'https://a.com=8,https://b.com=4' -> {'https://a.com': 8, 'https://b.com': 4}"""
+    sizes = {}
+    for item in value.split(','):
+        prefix, sep, size = item.strip().rpartition('=')
+        if sep and prefix and size.isdigit():
+            sizes[prefix] = int(size)
+    return sizes
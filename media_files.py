@@ -0,0 +1,124 @@
+"""
+Media Files Module
+Servido de audios estáticos (uploads/downloads) sin copiar bytes en Python:
+wsgi.file_wrapper (sendfile en gunicorn) o delegación al proxy inverso con
+X-Accel-Redirect / X-Sendfile, con rangos, ETag fuerte y respuestas 304
+"""
+
+import mimetypes
+import os
+
+from flask import Response, jsonify, request
+from werkzeug.http import http_date
+from werkzeug.security import safe_join
+
+SENDFILE = 'sendfile'
+X_ACCEL_REDIRECT = 'x-accel-redirect'
+X_SENDFILE = 'x-sendfile'
+
+# Los nombres llevan uuid o id de video: el contenido de una URL no cambia
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CHUNK_SIZE = 64 * 1024
+
+
+class _FileRange:
+    """
+    Lectura acotada para servidores sin file_wrapper que respete Content-Length.
+    Con direct_passthrough el servidor recibe este iterable tal cual: ``close``
+    cierra el archivo aunque el cuerpo no llegue a recorrerse.
+    """
+
+    def __init__(self, f, length):
+        self.f = f
+        self.length = length
+
+    def __iter__(self):
+        while self.length > 0:
+            chunk = self.f.read(min(CHUNK_SIZE, self.length))
+            if not chunk:
+                break
+            self.length -= len(chunk)
+            yield chunk
+
+    def close(self):
+        self.f.close()
+
+
+def _file_body(f, start, length, size):
+    f.seek(start)
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    # gunicorn (y el puente ASGI de asgi.py) envían exactamente Content-Length bytes
+    # desde la posición actual; otros servidores recorren el archivo hasta el final
+    if file_wrapper is not None and (start + length == size or
+                                     getattr(file_wrapper, 'respects_content_length', False) or
+                                     request.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn')):
+        return file_wrapper(f, CHUNK_SIZE)
+    return _FileRange(f, length)
+
+
+def serve_media(directory, filename, mode=SENDFILE, accel_prefix='/protected',
+                cache_control=IMMUTABLE_CACHE_CONTROL):
+    """
+    Respuesta para ``directory/filename``. ``mode`` elige quién copia los bytes:
+    ``sendfile`` (este proceso, vía wsgi.file_wrapper), ``x-accel-redirect``
+    (nginx, en ``accel_prefix/<carpeta>/<archivo>``) o ``x-sendfile`` (Apache/lighttpd).
+    """
+    # Archivos internos (índices de caché) no se sirven
+    path = safe_join(directory, filename) if not filename.startswith('.') else None
+    try:
+        stat = os.stat(path) if path else None
+    except OSError:
+        stat = None
+    if stat is None or not os.path.isfile(path):
+        return jsonify({'error': 'File not found'}), 404
+
+    size = stat.st_size
+    etag = f'{size:x}-{stat.st_mtime_ns:x}'
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    headers = {
+        'ETag': f'"{etag}"',
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': cache_control,
+        'Accept-Ranges': 'bytes',
+    }
+
+    # If-None-Match tiene prioridad sobre If-Modified-Since
+    if request.if_none_match:
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+    elif request.if_modified_since and int(stat.st_mtime) <= request.if_modified_since.timestamp():
+        return Response(status=304, headers=headers)
+
+    if mode == X_ACCEL_REDIRECT:
+        folder = os.path.basename(os.path.normpath(directory))
+        headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{folder}/{filename}"
+        return Response(status=200, content_type=content_type, headers=headers)
+    if mode == X_SENDFILE:
+        headers['X-Sendfile'] = os.path.abspath(path)
+        return Response(status=200, content_type=content_type, headers=headers)
+
+    byte_range = request.range
+    if_range = request.if_range
+    if byte_range is not None and (if_range.etag or if_range.date):
+        # If-Range que no coincide: se envía el archivo completo
+        if if_range.etag != etag and (if_range.date is None or
+                                      int(stat.st_mtime) > if_range.date.timestamp()):
+            byte_range = None
+
+    start, stop, status = 0, size, 200
+    if byte_range is not None:
+        content_range = byte_range.range_for_length(size)
+        if content_range is None:
+            headers['Content-Range'] = f'bytes */{size}'
+            return Response(status=416, headers=headers)
+        start, stop = content_range
+        status = 206
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+
+    headers['Content-Length'] = str(stop - start)
+    f = open(path, 'rb')
+    response = Response(_file_body(f, start, stop - start, size), status=status,
+                        content_type=content_type, headers=headers, direct_passthrough=True)
+    # También en HEAD o si el cliente corta, cuando el cuerpo no llega a recorrerse
+    response.call_on_close(f.close)
+    return response
@@ -0,0 +1,183 @@
+"""
+Media Metadata Module
+Índice persistente de metadatos de audio (duración, códec, bitrate, tags)
+obtenidos con ffprobe en segundo plano para las pistas locales de la playlist
+"""
+
+import atexit
+import json
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Tags que se exponen (ffprobe los devuelve con mayúsculas variables según el contenedor)
+TAG_NAMES = ('title', 'artist', 'album', 'album_artist', 'genre', 'date', 'track')
+
+
+def _number(value, cast=float):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_ffprobe(output):
+    """Convierte la salida JSON de ffprobe (-show_format -show_streams) en el registro del índice"""
+    data = json.loads(output)
+    fmt = data.get('format', {})
+    audio = next((s for s in data.get('streams', []) if s.get('codec_type') == 'audio'), {})
+    tags = {}
+    for source in (audio.get('tags', {}), fmt.get('tags', {})):
+        for key, value in source.items():
+            key = key.lower()
+            if key in TAG_NAMES and value:
+                tags[key] = value
+    return {
+        'duration': _number(fmt.get('duration') or audio.get('duration')),
+        'format': fmt.get('format_name'),
+        'codec': audio.get('codec_name'),
+        'bitrate': _number(audio.get('bit_rate') or fmt.get('bit_rate'), int),
+        'sample_rate': _number(audio.get('sample_rate'), int),
+        'channels': audio.get('channels'),
+        'tags': tags,
+    }
+
+
+class MetadataIndex:
+    """
+    ``submit(track_path)`` encola el análisis de una pista local en un pool de
+    hilos (cada hilo espera a un proceso ffprobe). Los resultados se agregan a
+    un archivo JSON lines (la última línea de cada path manda), que se compacta
+    al arrancar. ``resolve_path`` traduce el path de la pista ('/uploads/x.mp3')
+    al archivo en disco, o None para pistas remotas. ``version`` crece con
+    cada registro nuevo para invalidar las respuestas que los incluyen.
+    """
+
+    def __init__(self, index_file, resolve_path, max_workers=2, ffprobe='ffprobe', timeout=30):
+        self.index_file = index_file
+        self.resolve_path = resolve_path
+        self.ffprobe = ffprobe
+        self.timeout = timeout
+        self.entries = {}
+        self.version = 0
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='metadata')
+        self._load()
+        self._file = open(self.index_file, 'a', encoding='utf-8')
+        atexit.register(self.shutdown)
+
+    def get(self, track_path):
+        entry = self.entries.get(track_path)
+        if entry is None or 'error' in entry:
+            return None
+        return {key: entry[key] for key in ('duration', 'format', 'codec', 'bitrate',
+                                            'sample_rate', 'channels', 'tags')}
+
+    def submit(self, track_path):
+        file_path = self.resolve_path(track_path)
+        if file_path is None or not os.path.isfile(file_path):
+            return
+        with self._lock:
+            if track_path in self._pending or self._is_fresh(track_path, file_path):
+                return
+            self._pending.add(track_path)
+        self._executor.submit(self._probe, track_path, file_path)
+
+    def submit_tracks(self, tracks):
+        for track in tracks:
+            self.submit(track.path)
+
+    def on_playlist_change(self, op, args):
+        """Listener de la playlist: analiza las pistas que se agregan"""
+        if op in ('append', 'insert'):
+            self.submit(args[-1].path)
+        elif op == 'extend':
+            self.submit_tracks(args[0])
+
+    def backfill(self, read_tracks, chunk_size=1000):
+        """
+        Encola en segundo plano las pistas existentes que aún no tienen
+        metadatos. ``read_tracks(offset, limit)`` las entrega por bloques: al
+        arrancar la playlist sigue en el snapshot sin decodificar.
+        """
+        self._executor.submit(self._backfill, read_tracks, chunk_size)
+
+    def _backfill(self, read_tracks, chunk_size):
+        offset = 0
+        while True:
+            tracks = read_tracks(offset, chunk_size)
+            if not tracks:
+                return
+            self.submit_tracks(tracks)
+            offset += len(tracks)
+
+    def _is_fresh(self, track_path, file_path):
+        entry = self.entries.get(track_path)
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return True  # sin archivo no hay nada que analizar
+        return entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns
+
+    def _probe(self, track_path, file_path):
+        try:
+            stat = os.stat(file_path)
+            entry = {'path': track_path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            try:
+                result = subprocess.run(
+                    [self.ffprobe, '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', file_path],
+                    capture_output=True, timeout=self.timeout, check=True
+                )
+                entry.update(parse_ffprobe(result.stdout))
+            except (subprocess.SubprocessError, OSError, ValueError) as e:
+                # Se guarda el error: no se reintenta hasta que cambie el archivo
+                entry['error'] = str(e)[:200]
+            with self._lock:
+                self.entries[track_path] = entry
+                self.version += 1
+                if not self._file.closed:
+                    self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                    self._file.flush()
+        except OSError as e:
+            print(f"Error probing {track_path}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(track_path)
+
+    def _load(self):
+        lines = 0
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # línea cortada por una caída
+                    self.entries[entry['path']] = entry
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            print(f"Error loading media metadata: {e}")
+            return
+        if lines > len(self.entries):
+            self._compact()
+
+    def _compact(self):
+        tmp_path = self.index_file + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in self.entries.values():
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            os.replace(tmp_path, self.index_file)
+        except OSError as e:
+            print(f"Error compacting media metadata: {e}")
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            self._file.close()
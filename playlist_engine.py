@@ -0,0 +1,719 @@
+"""
+Playlist Engine Module
+Estructuras de datos de la playlist: la lista doblemente enlazada original y
+una variante indexada (treap implícito) con acceso por posición en O(log n)
+"""
+
+import random
+import threading
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Sequence
+
+from search_index import LookupIndex, SearchIndex, fold, matches
+from shuffle_order import ShuffleOrder
+
+
+# Data structures
+# Clases con __slots__: sin __dict__ por instancia, que a cientos de miles de
+# pistas es la mayor parte de la memoria del worker
+@dataclass(slots=True)
+class Track:
+    path: str
+    title: str
+
+    def __getstate__(self):
+        return (self.path, self.title)
+
+    def __setstate__(self, state):
+        # Los pickles antiguos guardaban el __dict__ de la instancia
+        if isinstance(state, dict):
+            state = (state['path'], state['title'])
+        self.path, self.title = state
+
+
+class Node:
+    __slots__ = ('track', 'prev', 'next')
+
+    def __init__(self, track: Track):
+        self.track: Track = track
+        self.prev: Optional['Node'] = None
+        self.next: Optional['Node'] = None
+
+
+class _ShuffledSource:
+    """``source`` en otro orden sin copiar pistas: la posición i es ``source[order[i]]``"""
+
+    __slots__ = ('source', 'order')
+
+    def __init__(self, source: Sequence[Track], order: array):
+        self.source = source
+        self.order = order
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, index: int) -> Track:
+        return self.source[self.order[index]]
+
+
+class DoublyLinkedPlaylist:
+    # Atributos que no existen mientras la playlist está en modo diferido (ver load_lazy)
+    _lazy_attributes = ('head', 'tail', 'current')
+
+    def __init__(self, changes_maxlen: int = 1000):
+        self.head: Optional[Node] = None
+        self.tail: Optional[Node] = None
+        self.current: Optional[Node] = None
+        self.length = 0
+        self.is_playing = False
+        # Semilla del orden aleatorio de reproducción (None: el orden de la lista)
+        self.shuffle_seed: Optional[int] = None
+        self._shuffle_order: Optional[ShuffleOrder] = None
+        # Versión que sube con cada mutación y últimas operaciones aplicadas (version, op, args)
+        self.version = 0
+        self.changes = deque(maxlen=changes_maxlen)
+        # Callbacks (op, args) notificados tras cada mutación (ver apply())
+        self.listeners: List[Callable] = []
+        # Índices por nodo (add/discard/clear) que se mantienen en cada inserción/borrado
+        self.indexes: list = []
+        self.search_index: Optional[SearchIndex] = None
+        self.lookup_index: Optional[LookupIndex] = None
+        self._source: Optional[Sequence[Track]] = None
+        self._cursor = -1
+        # Construcciones diferidas que pueden ocurrir en una lectura (nodos desde
+        # el snapshot, índices): varios lectores concurrentes las hacen una sola vez
+        self._build_lock = threading.RLock()
+
+    def load_lazy(self, source: Sequence[Track], current_index: int = -1):
+        """
+        Usa ``source`` (p. ej. un snapshot mapeado en memoria) como contenido sin
+        crear nodos. Lectura completa, pista actual y navegación se sirven desde
+        ``source``; los nodos se construyen con la primera operación que los necesite.
+        """
+        self._reset()
+        for name in self._lazy_attributes:
+            del self.__dict__[name]
+        self._source = source
+        self._cursor = current_index
+        self.length = len(source)
+
+    def __getattr__(self, name):
+        # Solo se llama si el atributo no existe: en modo diferido, materializar
+        if name in self._lazy_attributes and self.__dict__.get('_source') is not None:
+            self._materialize()
+            return self.__dict__[name]
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def _materialize(self):
+        with self._build_lock:
+            source, cursor = self.__dict__.get('_source'), self._cursor
+            if source is None:
+                return  # otro hilo ya lo hizo mientras se esperaba el lock
+            # Los nodos se construyen aparte y se publican completos: mientras tanto
+            # los lectores concurrentes siguen leyendo del snapshot
+            scratch = type(self)()
+            scratch._extend_nodes([scratch._new_node(source[i]) for i in range(len(source))])
+            for name in self._lazy_attributes:
+                self.__dict__[name] = getattr(scratch, name)
+            self.current = self._node_at_index(cursor) if cursor >= 0 else None
+            self._source = None
+            for index in self.indexes:
+                if index.ready:
+                    index.rebuild(self.iterate())
+
+    def subscribe(self, callback: Callable):
+        self.listeners.append(callback)
+
+    def add_index(self, index):
+        self.indexes.append(index)
+        if isinstance(index, SearchIndex):
+            self.search_index = index
+        elif isinstance(index, LookupIndex):
+            self.lookup_index = index
+
+    def _ensure_index(self, index):
+        # Con el lock también al consultar ready: rebuild lo marca listo antes de llenarlo
+        with self._build_lock:
+            if not index.ready:
+                if self.__dict__.get('_source') is not None:
+                    self._materialize()
+                index.rebuild(self.iterate())
+
+    def _lookup(self) -> Optional[LookupIndex]:
+        if self.lookup_index is not None:
+            self._ensure_index(self.lookup_index)
+        return self.lookup_index
+
+    def _emit(self, op: str, *args):
+        self.version += 1
+        self.changes.append((self.version, op, args))
+        for callback in self.listeners:
+            callback(op, args)
+
+    def changes_since(self, version: int) -> Optional[list]:
+        """Operaciones posteriores a ``version``, o None si ya no están en el historial"""
+        if version > self.version or version < 0:
+            return None
+        if version == self.version:
+            return []
+        if not self.changes or self.changes[0][0] > version + 1:
+            return None
+        # Las versiones del historial son consecutivas: se puede indexar directamente
+        start = version + 1 - self.changes[0][0]
+        return [self.changes[i] for i in range(start, len(self.changes))]
+
+    def apply(self, op: str, *args):
+        """Aplica una operación en el mismo formato que reciben los listeners"""
+        handlers = {
+            'append': self.append,
+            'insert': self.insert_at_index,
+            'extend': self.extend,
+            'remove': self.remove_by_index,
+            'move': self.move,
+            'set_current': self.set_current_to_index,
+            'next': self.next_track,
+            'prev': self.prev_track,
+            'shuffle': self.shuffle,
+            'shuffle_play': self.set_shuffle_play,
+            'clear': self.clear,
+        }
+        if op not in handlers:
+            raise ValueError(f'Unknown playlist operation: {op}')
+        return handlers[op](*args)
+
+    def _new_node(self, track: Track) -> Node:
+        return Node(track)
+
+    def _insert_node(self, node: Node, before: Optional[Node]):
+        """Enlaza ``node`` justo antes de ``before`` (al final si es None) y lo marca como actual"""
+        if before is None:
+            node.prev = self.tail
+            if self.tail:
+                self.tail.next = node
+            else:
+                self.head = node
+            self.tail = node
+        else:
+            node.prev = before.prev
+            node.next = before
+            if before.prev:
+                before.prev.next = node
+            else:
+                self.head = node
+            before.prev = node
+        self.current = node
+        self.length += 1
+        for index in self.indexes:
+            index.add(node)
+
+    def _extend_nodes(self, nodes: List[Node]):
+        for node in nodes:
+            self._insert_node(node, None)
+
+    def _relink(self, nodes: List[Node]):
+        """Enlaza los nodos existentes en el orden de ``nodes``; los índices por nodo no cambian"""
+        previous = None
+        for node in nodes:
+            node.prev = previous
+            if previous is not None:
+                previous.next = node
+            previous = node
+        previous.next = None
+        self.head, self.tail = nodes[0], previous
+
+    def _unlink(self, node: Node):
+        if node.prev:
+            node.prev.next = node.next
+        else:
+            self.head = node.next
+        if node.next:
+            node.next.prev = node.prev
+        else:
+            self.tail = node.prev
+        if self.current is node:
+            self.current = node.next or node.prev or None
+        node.prev = node.next = None
+        self.length -= 1
+        for index in self.indexes:
+            index.discard(node)
+
+    def _reset(self):
+        self.head = self.tail = self.current = None
+        self.length = 0
+        self._source = None
+        for index in self.indexes:
+            index.clear()
+
+    def append(self, track: Track):
+        self._insert_node(self._new_node(track), None)
+        self._emit('append', track)
+
+    def prepend(self, track: Track):
+        self._insert_node(self._new_node(track), self.head)
+        self._emit('insert', 0, track)
+
+    def extend(self, tracks: Iterable[Track]):
+        tracks = list(tracks)
+        if not tracks:
+            return
+        self._extend_nodes([self._new_node(track) for track in tracks])
+        self._emit('extend', tracks)
+
+    def insert_at_index(self, index: int, track: Track):
+        index = max(0, min(index, self.length))
+        before = self._node_at_index(index) if index < self.length else None
+        self._insert_node(self._new_node(track), before)
+        self._emit('insert', index, track)
+
+    def remove_node(self, node: Node):
+        if node is None:
+            return
+        self._remove(node, self.index_of(node) if self.listeners else -1)
+
+    def _remove(self, node: Node, index: int):
+        self._unlink(node)
+        self._emit('remove', index)
+
+    def remove_by_index(self, index: int) -> bool:
+        node = self._node_at_index(index)
+        if node:
+            self._remove(node, index)
+            return True
+        return False
+
+    def remove_by_title(self, title: str) -> bool:
+        return self._remove_first(self.find_by_title(title))
+
+    def remove_by_path(self, path: str) -> bool:
+        return self._remove_first(self.find_by_path(path))
+
+    def _remove_first(self, nodes: List[Node]) -> bool:
+        if not nodes:
+            return False
+        node = nodes[0]
+        self._remove(node, self.index_of(node) if self.listeners else -1)
+        return True
+
+    def find_by_title(self, title: str) -> List[Node]:
+        """Nodos cuyo título coincide sin distinguir mayúsculas, en el orden de la playlist"""
+        index = self._lookup()
+        if index is not None:
+            return sorted(index.find_title(title), key=self.index_of)
+        title = title.casefold()
+        return [node for node in self.iterate() if node.track.title.casefold() == title]
+
+    def find_by_path(self, path: str) -> List[Node]:
+        index = self._lookup()
+        if index is not None:
+            return sorted(index.find_path(path), key=self.index_of)
+        return [node for node in self.iterate() if node.track.path == path]
+
+    def contains_path(self, path: str) -> bool:
+        index = self._lookup()
+        if index is not None:
+            return bool(index.find_path(path))
+        return any(node.track.path == path for node in self.iterate())
+
+    def next_track(self):
+        if self.shuffle_seed is not None:
+            return self._step_shuffled(1, 'next')
+        if self._source is not None:
+            return self._move_cursor(self._cursor + 1, 'next')
+        if self.current and self.current.next:
+            self.current = self.current.next
+            self._emit('next')
+            return self.current
+        return None
+
+    def prev_track(self):
+        if self.shuffle_seed is not None:
+            return self._step_shuffled(-1, 'prev')
+        if self._source is not None:
+            return self._move_cursor(self._cursor - 1, 'prev')
+        if self.current and self.current.prev:
+            self.current = self.current.prev
+            self._emit('prev')
+            return self.current
+        return None
+
+    def _play_order(self) -> ShuffleOrder:
+        order = self._shuffle_order
+        if order is None or order.seed != self.shuffle_seed or order.n != self.length:
+            order = self._shuffle_order = ShuffleOrder(self.shuffle_seed, self.length)
+        return order
+
+    def _step_shuffled(self, offset: int, op: str):
+        # El orden aleatorio es un ciclo: después de la última pista vuelve a la primera
+        index = self.current_index()
+        if index < 0 or self.length < 2:
+            return None
+        target = self._play_order().step(index, offset)
+        if self._source is not None:
+            return self._move_cursor(target, op)
+        self.current = self._node_at_index(target)
+        self._emit(op)
+        return self.current
+
+    def _move_cursor(self, index: int, op: str) -> bool:
+        # Navegación en modo diferido: no hay nodos, solo la posición actual
+        if self._cursor < 0 or not 0 <= index < self.length:
+            return False
+        self._cursor = index
+        self._emit(op)
+        return True
+
+    def set_current_to_index(self, index: int):
+        if self._source is not None:
+            if 0 <= index < self.length:
+                self._cursor = index
+                self._emit('set_current', index)
+            return
+        node = self._node_at_index(index)
+        if node:
+            self.current = node
+            self._emit('set_current', index)
+
+    def iterate(self):
+        node = self.head
+        while node:
+            yield node
+            node = node.next
+
+    # En modo diferido los lectores toman _source una sola vez: otro lector
+    # puede estar materializando los nodos (ver _materialize)
+    def current_track(self) -> Optional[Track]:
+        source = self._source
+        if source is not None:
+            return source[self._cursor] if self._cursor >= 0 else None
+        current = self.current
+        return current.track if current else None
+
+    def current_index(self) -> int:
+        if self._source is not None:
+            return self._cursor
+        current = self.current
+        return self.index_of(current) if current else -1
+
+    def tracks_range(self, offset: int, limit: Optional[int] = None) -> List[Track]:
+        """Pistas desde ``offset`` (hasta ``limit``) sin recorrer la lista desde el principio"""
+        source = self._source
+        length = len(source) if source is not None else self.length
+        end = length if limit is None else min(length, offset + limit)
+        if offset >= end:
+            return []
+        if source is not None:
+            return [source[i] for i in range(offset, end)]
+        tracks = []
+        node = self._node_at_index(offset)
+        for _ in range(end - offset):
+            tracks.append(node.track)
+            node = node.next
+        return tracks
+
+    def get_all_tracks(self) -> List[Track]:
+        source = self._source
+        if source is not None:
+            return [source[i] for i in range(len(source))]
+        return [node.track for node in self.iterate()]
+
+    def upcoming(self, limit: int) -> List[Track]:
+        """Las ``limit`` pistas que siguen a la actual en el orden de reproducción"""
+        index = self.current_index()
+        if index < 0:
+            return []
+        if self.shuffle_seed is None:
+            return self.tracks_range(index + 1, limit)
+        order = self._play_order()
+        start = order.inverse(index)
+        return [self.tracks_range(order.forward((start + k) % self.length), 1)[0]
+                for k in range(1, min(limit, self.length - 1) + 1)]
+
+    def search(self, query: str, prefix: bool = False, limit: Optional[int] = None) -> List[Track]:
+        """
+        Busca sin distinguir mayúsculas ni acentos, en el orden de la playlist.
+        Con ``prefix`` cada palabra de la consulta debe empezar alguna palabra del título.
+        """
+        if self.search_index is not None:
+            self._ensure_index(self.search_index)
+            nodes = self.search_index.search(query, prefix, self.iterate(), limit, self.index_of)
+            return [node.track for node in nodes]
+        query = fold(query).strip()
+        tracks = [track for track in self.get_all_tracks() if matches(fold(track.title), query, prefix)]
+        return tracks[:limit]
+
+    def shuffle(self, seed: Optional[int] = None, keep_current: bool = False):
+        """
+        Reordena en el lugar: se permutan referencias a los nodos existentes y
+        se vuelven a enlazar, sin crear nodos ni tocar los índices de búsqueda.
+        La pista actual se conserva; con ``keep_current`` pasa a ser la primera.
+        En modo diferido se permuta un arreglo de posiciones sobre ``source``.
+        """
+        if self.length < 2:
+            return
+        # La semilla se emite para poder reproducir exactamente el mismo orden
+        if seed is None:
+            seed = random.getrandbits(32)
+        rng = random.Random(seed)
+        source = self._source
+        if source is not None:
+            # Mismas llamadas al generador que con los nodos: el orden no depende del modo
+            order = array('I', range(len(source)))
+            rng.shuffle(order)
+            cursor = order.index(self._cursor) if self._cursor >= 0 else -1
+            if keep_current and cursor > 0:
+                order[0], order[cursor] = order[cursor], order[0]
+                cursor = 0
+            if isinstance(source, _ShuffledSource):
+                order = array('I', (source.order[i] for i in order))
+                source = source.source
+            self._source = _ShuffledSource(source, order)
+            self._cursor = cursor
+        else:
+            nodes = list(self.iterate())
+            rng.shuffle(nodes)
+            current = self.current
+            if keep_current and current is not None:
+                position = nodes.index(current)
+                nodes[0], nodes[position] = nodes[position], nodes[0]
+            self._relink(nodes)
+        self._emit('shuffle', seed, keep_current)
+
+    def set_shuffle_play(self, seed: Optional[int]):
+        """
+        Orden aleatorio de reproducción con ``seed`` (None lo desactiva): la
+        lista no se reordena, next/prev siguen la permutación de las posiciones.
+        """
+        if seed == self.shuffle_seed:
+            return
+        self.shuffle_seed = seed
+        self._emit('shuffle_play', seed)
+
+    def move(self, from_index: int, to_index: int):
+        if from_index == to_index or from_index < 0 or to_index < 0 or from_index >= self.length or to_index > self.length:
+            return
+        node = self._node_at_index(from_index)
+        if not node:
+            return
+        # El nodo que hoy ocupa to_index es el que quedará justo después
+        before = self._node_at_index(to_index) if to_index < self.length else None
+        # remove the node and relink it without allocating a new one
+        self._unlink(node)
+        self._insert_node(node, before)
+        self._emit('move', from_index, to_index)
+
+    def clear(self):
+        self._reset()
+        self._emit('clear')
+
+    def index_of(self, node: Node) -> int:
+        i = 0
+        walker = self.head
+        while walker is not None and walker is not node:
+            walker = walker.next
+            i += 1
+        return i if walker is not None else -1
+
+    def _node_at_index(self, index: int) -> Optional[Node]:
+        if index < 0 or index >= self.length:
+            return None
+        if index < self.length // 2:
+            node = self.head
+            i = 0
+            while i < index:
+                node = node.next
+                i += 1
+            return node
+        else:
+            node = self.tail
+            i = self.length - 1
+            while i > index:
+                node = node.prev
+                i -= 1
+            return node
+
+
+class IndexedNode(Node):
+    __slots__ = ('parent', 'left', 'right', 'size', 'priority')
+
+    def __init__(self, track: Track):
+        super().__init__(track)
+        # Campos del treap implícito (la clave es la posición en la lista)
+        self.parent: Optional['IndexedNode'] = None
+        self.left: Optional['IndexedNode'] = None
+        self.right: Optional['IndexedNode'] = None
+        self.size = 1
+        self.priority = random.random()
+
+
+def _size(node: Optional[IndexedNode]) -> int:
+    return node.size if node else 0
+
+
+class IndexedPlaylist(DoublyLinkedPlaylist):
+    """
+    Playlist con la misma API que DoublyLinkedPlaylist, pero indexada por un
+    treap implícito (árbol de estadísticos de orden) sobre los mismos nodos.
+
+    Búsqueda por índice, inserción, borrado y move son O(log n) esperados;
+    next/prev siguen siendo O(1) porque se conservan los enlaces prev/next.
+    """
+
+    _lazy_attributes = DoublyLinkedPlaylist._lazy_attributes + ('root',)
+
+    def __init__(self, changes_maxlen: int = 1000):
+        super().__init__(changes_maxlen)
+        self.root: Optional[IndexedNode] = None
+
+    def _new_node(self, track: Track) -> IndexedNode:
+        return IndexedNode(track)
+
+    def _insert_node(self, node: IndexedNode, before: Optional[IndexedNode]):
+        self._tree_insert(node, before)
+        super()._insert_node(node, before)
+
+    def _unlink(self, node: IndexedNode):
+        self._tree_remove(node)
+        super()._unlink(node)
+
+    def _extend_nodes(self, nodes: List[IndexedNode]):
+        """Enlaza varios nodos al final construyendo el árbol en O(n) (útil al cargar la playlist)"""
+        if not nodes:
+            return
+        for node in nodes:
+            DoublyLinkedPlaylist._insert_node(self, node, None)
+        self._tree_append(nodes)
+
+    def _relink(self, nodes: List[IndexedNode]):
+        super()._relink(nodes)
+        # El árbol se rehace en O(n) con las prioridades que ya tenían los nodos
+        for node in nodes:
+            node.parent = node.left = node.right = None
+        self.root = None
+        self._tree_append(nodes)
+
+    def _tree_append(self, nodes: List[IndexedNode]):
+        # Pila con la espina derecha del árbol: algoritmo lineal de árbol cartesiano
+        stack = []
+        walker = self.root
+        while walker:
+            stack.append(walker)
+            walker = walker.right
+        for node in nodes:
+            last = None
+            while stack and stack[-1].priority < node.priority:
+                last = stack.pop()
+                last.size = 1 + _size(last.left) + _size(last.right)
+            node.left = last
+            if last:
+                last.parent = node
+            if stack:
+                stack[-1].right = node
+                node.parent = stack[-1]
+            else:
+                node.parent = None
+            stack.append(node)
+        while stack:
+            last = stack.pop()
+            last.size = 1 + _size(last.left) + _size(last.right)
+        self.root = last
+        self.root.parent = None
+
+    def _reset(self):
+        super()._reset()
+        self.root = None
+
+    def index_of(self, node: IndexedNode) -> int:
+        i = _size(node.left)
+        while node.parent:
+            if node is node.parent.right:
+                i += _size(node.parent.left) + 1
+            node = node.parent
+        return i
+
+    def _node_at_index(self, index: int) -> Optional[IndexedNode]:
+        if index < 0 or index >= self.length:
+            return None
+        node = self.root
+        while node:
+            left_size = _size(node.left)
+            if index < left_size:
+                node = node.left
+            elif index == left_size:
+                return node
+            else:
+                index -= left_size + 1
+                node = node.right
+        return None
+
+    def _tree_insert(self, node: IndexedNode, before: Optional[IndexedNode]):
+        if self.root is None:
+            self.root = node
+            return
+        # El nuevo nodo pasa a ser el predecesor en orden de `before`
+        if before is None:
+            parent = self.tail
+            parent.right = node
+        elif before.left is None:
+            parent = before
+            parent.left = node
+        else:
+            parent = before.left
+            while parent.right:
+                parent = parent.right
+            parent.right = node
+        node.parent = parent
+        while parent:
+            parent.size += 1
+            parent = parent.parent
+        while node.parent and node.parent.priority < node.priority:
+            self._rotate_up(node)
+
+    def _tree_remove(self, node: IndexedNode):
+        # Bajar el nodo rotando hasta que sea hoja y luego desprenderlo
+        while node.left or node.right:
+            if node.left is None:
+                child = node.right
+            elif node.right is None:
+                child = node.left
+            else:
+                child = node.left if node.left.priority > node.right.priority else node.right
+            self._rotate_up(child)
+        parent = node.parent
+        if parent is None:
+            self.root = None
+        else:
+            if parent.left is node:
+                parent.left = None
+            else:
+                parent.right = None
+            while parent:
+                parent.size -= 1
+                parent = parent.parent
+        node.parent = None
+        node.size = 1
+
+    def _rotate_up(self, node: IndexedNode):
+        parent = node.parent
+        grandparent = parent.parent
+        if parent.left is node:
+            moved = node.right
+            parent.left = moved
+            node.right = parent
+        else:
+            moved = node.left
+            parent.right = moved
+            node.left = parent
+        if moved:
+            moved.parent = parent
+        parent.parent = node
+        node.parent = grandparent
+        if grandparent is None:
+            self.root = node
+        elif grandparent.left is parent:
+            grandparent.left = node
+        else:
+            grandparent.right = node
+        node.size = parent.size
+        parent.size = 1 + _size(parent.left) + _size(parent.right)
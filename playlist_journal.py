@@ -0,0 +1,550 @@
+"""
+Playlist Journal Module
+Persistencia de la playlist con un journal de solo escritura al final
+(write-ahead log) más snapshots columnares atómicos que se cargan con mmap.
+El journal es también el estado compartido entre workers de gunicorn.
+"""
+
+import atexit
+import json
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from playlist_engine import Track
+from profiler import PROFILER
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos (un solo worker)
+    fcntl = None
+
+SNAPSHOT_MAGIC = b'PPLS'
+SNAPSHOT_VERSION = 3
+# magic, versión, número de pistas, seq, índice actual, semilla del orden aleatorio (-1: ninguna)
+_HEADER = struct.Struct('<4sIQQqq')
+# Versión 2: la misma cabecera sin la semilla
+_HEADER_V2 = struct.Struct('<4sIQQq')
+# Por pista: offset en el heap de strings, bytes del path, bytes del título
+_ENTRY = struct.Struct('<QII')
+
+STATE_MAGIC = b'PPST'
+# Estado compartido (mmap): magic, época, generación del journal, último seq
+_STATE = struct.Struct('<4sQQQ')
+
+
+def write_snapshot(path, tracks, seq, current, shuffle_seed=None):
+    """
+    Escribe el snapshot columnar: cabecera, tabla de offsets de ancho fijo y
+    heap de strings UTF-8. Se escribe en un temporal y se renombra de forma atómica.
+    """
+    table = bytearray(_ENTRY.size * len(tracks))
+    heap = []
+    offset = 0
+    for i, track in enumerate(tracks):
+        path_bytes = track.path.encode('utf-8')
+        title_bytes = track.title.encode('utf-8')
+        _ENTRY.pack_into(table, i * _ENTRY.size, offset, len(path_bytes), len(title_bytes))
+        heap.append(path_bytes)
+        heap.append(title_bytes)
+        offset += len(path_bytes) + len(title_bytes)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(tracks), seq, current,
+                             -1 if shuffle_seed is None else shuffle_seed))
+        f.write(table)
+        f.write(b''.join(heap))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class ColumnarSnapshot:
+    """
+    Vista de solo lectura sobre un snapshot mapeado en memoria. Los Track se
+    decodifican al acceder por índice, así que abrirlo es O(1) y la memoria
+    usada depende solo de las pistas que realmente se consultan.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = struct.unpack_from('<4sI', self._mmap, 0)
+        if magic != SNAPSHOT_MAGIC or version not in (2, SNAPSHOT_VERSION):
+            self._mmap.close()
+            raise ValueError('Not a columnar playlist snapshot')
+        if version == 2:
+            _, _, self.count, self.seq, self.current = _HEADER_V2.unpack_from(self._mmap, 0)
+            self.shuffle_seed = None
+            self._table_start = _HEADER_V2.size
+        else:
+            _, _, self.count, self.seq, self.current, shuffle_seed = _HEADER.unpack_from(self._mmap, 0)
+            self.shuffle_seed = None if shuffle_seed < 0 else shuffle_seed
+            self._table_start = _HEADER.size
+        self._heap_start = self._table_start + self.count * _ENTRY.size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        offset, path_len, title_len = _ENTRY.unpack_from(self._mmap, self._table_start + index * _ENTRY.size)
+        start = self._heap_start + offset
+        return Track(
+            path=self._mmap[start:start + path_len].decode('utf-8'),
+            title=self._mmap[start + path_len:start + path_len + title_len].decode('utf-8'),
+        )
+
+
+def _encode_args(op, args):
+    """Convierte los argumentos de una operación a valores serializables en JSON"""
+    if op in ('append', 'insert'):
+        *rest, track = args
+        return [*rest, [track.path, track.title]]
+    if op == 'extend':
+        return [[[track.path, track.title] for track in args[0]]]
+    return list(args)
+
+
+def _decode_args(op, args):
+    if op in ('append', 'insert'):
+        *rest, track = args
+        return [*rest, Track(path=track[0], title=track[1])]
+    if op == 'extend':
+        return [[Track(path=path, title=title) for path, title in args[0]]]
+    return args
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    """Lee el antiguo playlist.pkl aunque Track se haya guardado desde __main__ o backend"""
+
+    def find_class(self, module, name):
+        if name == 'Track' and module in ('__main__', 'backend', 'playlist_engine'):
+            return Track
+        raise pickle.UnpicklingError(f'Unexpected class in playlist file: {module}.{name}')
+
+
+class PlaylistJournal:
+    """
+    Cada mutación de la playlist se agrega como una línea JSON ``[seq, op, *args]``
+    al journal; el fsync se hace por lotes. Cuando el journal crece lo suficiente
+    se escribe un snapshot completo (archivo temporal + rename atómico) y el
+    journal se trunca. Al arrancar el snapshot se mapea en modo diferido (sin
+    crear nodos) y se reproducen las entradas con ``seq`` posterior al snapshot.
+    Al cerrar se compacta, para que el siguiente arranque no tenga nada que reproducir.
+
+    Varios workers comparten el journal: cada uno mantiene su copia en memoria
+    y las mutaciones se hacen dentro de ``mutation()`` (``acquire``/``release``),
+    que toma un flock exclusivo y aplica antes lo que agregaron los demás, así
+    que ``seq`` (la versión de la playlist) y la pista actual son los mismos en
+    todos. ``<journal>.state`` (mapeado en memoria) publica época, generación
+    (sube con cada compactación) y último ``seq``: ``refresh`` solo toca el
+    journal si cambiaron. El primer worker en arrancar elige la época, que
+    distingue las versiones de este arranque en los ETag.
+    """
+
+    def __init__(self, snapshot_path, journal_path, fsync_batch=64, fsync_interval=1.0, compact_every=10000,
+                 playlist_lock=None):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.state_path = journal_path + '.state'
+        self.lock_path = journal_path + '.lock'
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        # Lock que protege la playlist dentro del proceso (se toma antes del flock)
+        self.playlist_lock = playlist_lock or threading.RLock()
+        self.playlist = None
+        self.seq = 0
+        self.epoch = None
+        self.generation = 0
+        self.records_since_snapshot = 0
+        self.pending = 0
+        self.last_sync = time.monotonic()
+        self._file = None
+        self._lock = threading.Lock()
+        self._needs_snapshot = False
+        self._offset = 0  # bytes del journal ya aplicados
+        self._depth = 0  # anidamiento de acquire() en este proceso
+        self._replaying = False
+        self._batch = None  # entradas de batch() que aún no se escribieron
+        self._lock_fd = None
+        self._state_fd = None
+        self._state = None
+        self._stop = threading.Event()
+
+    def load(self, playlist, legacy_path=None):
+        """Restaura la playlist (snapshot + journal) y empieza a registrar sus mutaciones"""
+        self.playlist = playlist
+        first = self._open_shared()
+        self._flock(self._lock_fd, 'exclusive')
+        try:
+            snapshot_seq = self._load_snapshot()
+            if snapshot_seq is None:
+                snapshot_seq = 0
+                if legacy_path and not os.path.exists(self.journal_path):
+                    self._load_legacy(legacy_path)
+            self.seq = snapshot_seq
+            self._replay(snapshot_seq)
+            # La versión de la playlist continúa la numeración persistida del journal
+            playlist.version = self.seq
+            playlist.changes.clear()
+            magic, epoch, generation, _ = _STATE.unpack_from(self._state, 0)
+            if first or magic != STATE_MAGIC:
+                self.epoch = uuid.uuid4().int & 0xFFFFFFFF
+                self.generation = generation if magic == STATE_MAGIC else 0
+                self._publish_state()
+            else:
+                self.epoch, self.generation = epoch, generation
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+            playlist.subscribe(self.record)
+            if self._needs_snapshot:
+                # Migración desde un formato anterior: dejar un snapshot en el formato actual
+                self.compact()
+        finally:
+            self._flock(self._lock_fd, 'unlock')
+        if first:
+            # Desde aquí los demás workers pueden cargar (ver _open_shared)
+            self._flock(self._state_fd, 'shared')
+        atexit.register(self.close)
+
+    def _open_shared(self):
+        """
+        Abre el lock y el estado compartido. Cada worker vivo mantiene un flock
+        compartido sobre ``.state``: quien consigue uno exclusivo es el primero.
+        """
+        self._lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._state_fd = os.open(self.state_path, os.O_RDWR | os.O_CREAT, 0o644)
+        first = True
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._state_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                first = False
+                # Espera a que el primero termine de inicializar el estado
+                fcntl.flock(self._state_fd, fcntl.LOCK_SH)
+        if os.fstat(self._state_fd).st_size < _STATE.size:
+            os.ftruncate(self._state_fd, _STATE.size)
+        self._state = mmap.mmap(self._state_fd, _STATE.size)
+        return first
+
+    def _flock(self, fd, mode):
+        if fcntl is not None and fd is not None:
+            fcntl.flock(fd, {'exclusive': fcntl.LOCK_EX, 'shared': fcntl.LOCK_SH, 'unlock': fcntl.LOCK_UN}[mode])
+
+    def _shared(self):
+        _, _, generation, seq = _STATE.unpack_from(self._state, 0)
+        return generation, seq
+
+    def _publish_state(self):
+        _STATE.pack_into(self._state, 0, STATE_MAGIC, self.epoch, self.generation, self.seq)
+
+    def _load_snapshot(self):
+        try:
+            snapshot = ColumnarSnapshot(self.snapshot_path)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            return self._load_json_snapshot()
+        except Exception as e:
+            print(f"Error loading playlist snapshot: {e}")
+            return None
+        self.playlist.load_lazy(snapshot, snapshot.current)
+        self.playlist.shuffle_seed = snapshot.shuffle_seed
+        return snapshot.seq
+
+    def _load_json_snapshot(self):
+        """Snapshot en el formato JSON anterior (versión 1)"""
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Error loading playlist snapshot: {e}")
+            return None
+        self.playlist.extend(Track(path=path, title=title) for path, title in data.get('tracks', []))
+        current = data.get('current', -1)
+        if current >= 0:
+            self.playlist.current = self.playlist._node_at_index(current)
+        self._needs_snapshot = True
+        return data.get('seq', 0)
+
+    def _load_legacy(self, legacy_path):
+        try:
+            with open(legacy_path, 'rb') as f:
+                tracks = _LegacyUnpickler(f).load()
+            self.playlist.extend(tracks)
+            self._needs_snapshot = bool(tracks)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading legacy playlist: {e}")
+
+    def _replay(self, snapshot_seq):
+        try:
+            f = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            return
+        good_offset = 0
+        with f:
+            for line in f:
+                try:
+                    seq, op, *args = json.loads(line)
+                except ValueError:
+                    # Entrada incompleta (caída a mitad de escritura): descartar desde aquí
+                    print(f"Discarding truncated playlist journal tail at byte {good_offset}")
+                    break
+                good_offset += len(line)
+                self._offset = good_offset
+                if seq <= snapshot_seq:
+                    continue
+                try:
+                    self.playlist.apply(op, *_decode_args(op, args))
+                except Exception as e:
+                    print(f"Error replaying playlist journal entry {seq}: {e}")
+                self.seq = seq
+                self.records_since_snapshot += 1
+        if good_offset < os.path.getsize(self.journal_path):
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(good_offset)
+
+    def acquire(self):
+        """Entra a una sección de escritura: lock del proceso, flock exclusivo y puesta al día"""
+        self.playlist_lock.acquire()
+        try:
+            if self._depth == 0:
+                self._flock(self._lock_fd, 'exclusive')
+                try:
+                    with PROFILER.span('persistence'):
+                        self._catch_up()
+                except BaseException:
+                    self._flock(self._lock_fd, 'unlock')
+                    raise
+        except BaseException:
+            self.playlist_lock.release()
+            raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._flock(self._lock_fd, 'unlock')
+        self.playlist_lock.release()
+
+    @contextmanager
+    def mutation(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def refresh(self):
+        """Aplica lo que agregaron otros workers; si no hay nada nuevo no hace syscalls"""
+        if self._state is None or self._shared() == (self.generation, self.seq):
+            return False
+        self.acquire()
+        self.release()
+        return True
+
+    def follow(self, interval):
+        """Hilo que aplica los cambios de otros workers sin esperar a una petición (eventos SSE)"""
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Error following playlist journal: {e}")
+        threading.Thread(target=run, name='playlist-follow', daemon=True).start()
+
+    def _catch_up(self):
+        generation, seq = self._shared()
+        if (generation, seq) == (self.generation, self.seq):
+            return
+        if generation != self.generation:
+            # Otro worker compactó: el journal empieza de nuevo tras su snapshot
+            self.generation = generation
+            self._offset = 0
+            self.records_since_snapshot = 0
+            try:
+                snapshot = ColumnarSnapshot(self.snapshot_path)
+            except (OSError, ValueError) as e:
+                print(f"Error loading playlist snapshot: {e}")
+                snapshot = None
+            if snapshot is not None and snapshot.seq > self.seq:
+                self._reload(snapshot)
+        self._read_journal()
+
+    def _reload(self, snapshot):
+        playlist = self.playlist
+        self._replaying = True
+        try:
+            playlist.load_lazy(snapshot, snapshot.current)
+            playlist.shuffle_seed = snapshot.shuffle_seed
+            for index in playlist.indexes:
+                index.ready = False  # se reconstruyen con la próxima consulta
+            playlist.version = self.seq = snapshot.seq
+            playlist.changes.clear()
+            for callback in playlist.listeners:
+                callback('reload', ())
+        finally:
+            self._replaying = False
+
+    def _read_journal(self):
+        """Aplica las entradas del journal que escribieron otros workers"""
+        try:
+            f = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            return
+        self._replaying = True
+        try:
+            with f:
+                f.seek(self._offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # un worker murió a mitad de escritura (ver record)
+                    self._offset += len(line)
+                    try:
+                        seq, op, *args = json.loads(line)
+                    except ValueError:
+                        continue
+                    if seq <= self.seq:
+                        continue
+                    # Los listeners ven la misma versión que vio el worker que escribió
+                    self.playlist.version = seq - 1
+                    try:
+                        self.playlist.apply(op, *_decode_args(op, args))
+                    except Exception as e:
+                        print(f"Error replaying playlist journal entry {seq}: {e}")
+                    self.playlist.version = self.seq = seq
+                    self.records_since_snapshot += 1
+        finally:
+            self._replaying = False
+
+    @property
+    def replaying(self):
+        """True mientras se aplican operaciones del journal (de otro worker o al arrancar)"""
+        return self._replaying
+
+    def record(self, op, args):
+        """Listener de la playlist: agrega la operación al journal"""
+        if self._replaying:
+            return
+        with self._lock, PROFILER.span('persistence'):
+            if self._file is None:
+                return
+            held = self._depth > 0
+            if not held:
+                # Mutación fuera de mutation(): al menos la línea queda entera
+                self._flock(self._lock_fd, 'exclusive')
+            try:
+                self.seq += 1
+                line = json.dumps([self.seq, op, *_encode_args(op, args)], ensure_ascii=False, separators=(',', ':'))
+                if self._batch is not None and held:
+                    self._batch.append(line)
+                else:
+                    self._write([line], held)
+            finally:
+                if not held:
+                    self._flock(self._lock_fd, 'unlock')
+
+    def _write(self, lines, held):
+        text = '\n'.join(lines) + '\n'
+        if os.fstat(self._file.fileno()).st_size > self._offset and held:
+            text = '\n' + text  # cierra la línea a medias de un worker caído
+        self._file.write(text)
+        self._file.flush()
+        if held:
+            self._offset = os.fstat(self._file.fileno()).st_size
+        self._publish_state()
+        self.pending += len(lines)
+        self.records_since_snapshot += len(lines)
+        if self.pending >= self.fsync_batch or time.monotonic() - self.last_sync >= self.fsync_interval:
+            self._sync()
+        # Compactar cada O(n) entradas mantiene el coste amortizado constante
+        if held and self.records_since_snapshot >= max(self.compact_every, self.playlist.length):
+            self._compact()
+
+    @contextmanager
+    def batch(self):
+        """
+        ``mutation()`` cuyas entradas se escriben juntas al salir, con un solo
+        write y un solo fsync: los demás workers ven el lote completo o nada.
+        """
+        with self.mutation():
+            if self._batch is not None:  # lote anidado: se agrega al de afuera
+                yield
+                return
+            self._batch = []
+            try:
+                yield
+            finally:
+                with self._lock, PROFILER.span('persistence'):
+                    lines, self._batch = self._batch, None
+                    if lines and self._file is not None:
+                        self._write(lines, True)
+                        self._sync()
+
+    def sync(self):
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        if self._file and self.pending:
+            os.fsync(self._file.fileno())
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def compact(self):
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        playlist = self.playlist
+        write_snapshot(self.snapshot_path, playlist.get_all_tracks(), self.seq, playlist.current_index(),
+                       playlist.shuffle_seed)
+        self._fsync_dir()
+        # Las entradas con seq <= snapshot se ignoran al reproducir, así que
+        # una caída antes de truncar no duplica operaciones
+        if self._file:
+            self._file.close()
+        # Truncar y reabrir en modo append: con 'w' la posición de escritura sería
+        # propia de este worker y pisaría (o dejaría huecos en) lo que agreguen los demás
+        os.truncate(self.journal_path, 0)
+        self._file = open(self.journal_path, 'a', encoding='utf-8')
+        self.pending = 0
+        self.records_since_snapshot = 0
+        self.last_sync = time.monotonic()
+        self._offset = 0
+        self.generation += 1
+        self._publish_state()
+
+    def _fsync_dir(self):
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.snapshot_path)), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def close(self):
+        self._stop.set()
+        if self._file is None:
+            return
+        with self.mutation():
+            with self._lock:
+                if self._file:
+                    if self.records_since_snapshot:
+                        self._compact()
+                    self._sync()
+                    self._file.close()
+                    self._file = None
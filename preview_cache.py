@@ -0,0 +1,246 @@
+"""
+Preview Cache Module
+Caché en disco de los previews de Deezer por URL: una sola descarga por
+preview (las peticiones concurrentes leen el mismo archivo mientras se
+escribe), lectura por rangos y expulsión LRU por tamaño
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import REGISTRY
+
+CHUNK_SIZE = 64 * 1024
+
+# Métricas (/metrics)
+PREVIEW_REQUESTS = REGISTRY.counter(
+    'playerpro_preview_cache_requests_total', 'Previews abiertos por resultado (hit, miss, coalesced)', ('result',),
+)
+DEEZER_FETCH_SECONDS = REGISTRY.histogram(
+    'playerpro_deezer_fetch_seconds', 'Descarga completa de un preview desde Deezer', ('outcome',),
+)
+DEEZER_UPSTREAM_BYTES = REGISTRY.counter('playerpro_deezer_upstream_bytes_total', 'Bytes descargados de Deezer')
+PREVIEW_SERVED_BYTES = REGISTRY.counter('playerpro_deezer_proxy_bytes_total', 'Bytes de previews enviados a los clientes')
+
+
+class PreviewFetchError(Exception):
+    def __init__(self, message, status_code=502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _Fetch:
+    """Descarga en curso: los lectores esperan en ``cond`` a que crezca ``written``"""
+
+    def __init__(self, path):
+        self.path = path
+        self.cond = threading.Condition()
+        self.written = 0
+        self.total = None
+        self.content_type = None
+        self.started = False
+        self.done = False
+        self.error = None
+        self.status_code = 502
+
+
+class Preview:
+    """Resultado de ``PreviewCache.open``: tamaño, tipo y lectura por rangos"""
+
+    def __init__(self, path, size, content_type, fetch=None):
+        self.path = path
+        self.size = size
+        self.content_type = content_type
+        self._fetch = fetch
+
+    def wait_complete(self):
+        """Espera a que termine la descarga (para rangos cuando no se conoce el tamaño)"""
+        fetch = self._fetch
+        if fetch is None:
+            return
+        with fetch.cond:
+            fetch.cond.wait_for(lambda: fetch.done or fetch.error)
+            if fetch.error:
+                raise PreviewFetchError(fetch.error)
+            self.size = fetch.written
+
+    def iter_range(self, start=0, stop=None):
+        """Genera los bytes [start, stop) sin cargar el archivo en memoria"""
+        fetch = self._fetch
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            pos = start
+            while stop is None or pos < stop:
+                if fetch is not None:
+                    with fetch.cond:
+                        fetch.cond.wait_for(lambda: fetch.written > pos or fetch.done or fetch.error)
+                        if fetch.error:
+                            return
+                        available = fetch.written
+                    if pos >= available:
+                        return
+                else:
+                    available = self.size
+                limit = available if stop is None else min(stop, available)
+                chunk = f.read(min(CHUNK_SIZE, limit - pos))
+                if not chunk:
+                    return
+                pos += len(chunk)
+                PREVIEW_SERVED_BYTES.inc(amount=len(chunk))
+                yield chunk
+
+
+class PreviewCache:
+    """
+    ``open(url, headers)`` devuelve un Preview servible al instante: si está en
+    caché lee del disco; si no, arranca (o se une a) la descarga de esa URL
+    desde ``http`` y lee el archivo a medida que se escribe. El índice
+    (``.preview_index.json``) guarda tamaño, tipo y último acceso.
+    """
+
+    INDEX_NAME = '.preview_index.json'
+
+    def __init__(self, cache_dir, http, max_bytes, max_workers=4):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, self.INDEX_NAME)
+        self.http = http
+        self.max_bytes = max_bytes
+        self.entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='preview-fetch')
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+        atexit.register(self._save)
+
+    def open(self, url, headers=None):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        path = os.path.join(self.cache_dir, key)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and os.path.exists(path):
+                entry['last_access'] = time.time()
+                PREVIEW_REQUESTS.inc('hit')
+                return Preview(path, entry['size'], entry['content_type'])
+            fetch = self._inflight.get(key)
+            if fetch is None:
+                fetch = self._inflight[key] = _Fetch(path)
+                self._executor.submit(self._download, key, url, headers, fetch)
+                PREVIEW_REQUESTS.inc('miss')
+            else:
+                PREVIEW_REQUESTS.inc('coalesced')
+        with fetch.cond:
+            fetch.cond.wait_for(lambda: fetch.started or fetch.error)
+            if fetch.error:
+                raise PreviewFetchError(fetch.error, fetch.status_code)
+            return Preview(path, fetch.total, fetch.content_type, fetch)
+
+    def _download(self, key, url, headers, fetch):
+        start = time.perf_counter()
+        try:
+            response = self.http.get(url, headers=headers, stream=True)
+            with response:
+                if response.status_code != 200:
+                    raise PreviewFetchError(f'Failed to fetch audio: {response.status_code}', response.status_code)
+                length = response.headers.get('content-length')
+                with open(fetch.path, 'wb') as f:
+                    with fetch.cond:
+                        fetch.total = int(length) if length and length.isdigit() else None
+                        fetch.content_type = response.headers.get('content-type', 'audio/mpeg')
+                        fetch.started = True
+                        fetch.cond.notify_all()
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        if not chunk:
+                            continue
+                        f.write(chunk)
+                        # Visible para los lectores que tienen abierto el mismo archivo
+                        f.flush()
+                        DEEZER_UPSTREAM_BYTES.inc(amount=len(chunk))
+                        with fetch.cond:
+                            fetch.written += len(chunk)
+                            fetch.cond.notify_all()
+            if fetch.total is not None and fetch.written != fetch.total:
+                raise PreviewFetchError('Incomplete preview download')
+        except Exception as e:
+            DEEZER_FETCH_SECONDS.observe(time.perf_counter() - start, 'error')
+            # Borrar antes de liberar la clave: un reintento reescribe el mismo archivo
+            try:
+                os.remove(fetch.path)
+            except OSError:
+                pass
+            with self._lock:
+                del self._inflight[key]
+            with fetch.cond:
+                fetch.error = str(e)
+                if isinstance(e, PreviewFetchError):
+                    fetch.status_code = e.status_code
+                fetch.cond.notify_all()
+            return
+        DEEZER_FETCH_SECONDS.observe(time.perf_counter() - start, 'success')
+        with self._lock:
+            self.entries[key] = {
+                'size': fetch.written,
+                'content_type': fetch.content_type,
+                'last_access': time.time(),
+            }
+            del self._inflight[key]
+            self._evict(protect=key)
+            self._save()
+        with fetch.cond:
+            fetch.total = fetch.written
+            fetch.done = True
+            fetch.cond.notify_all()
+
+    def _evict(self, protect=None):
+        total = sum(entry['size'] for entry in self.entries.values())
+        if total <= self.max_bytes:
+            return
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            if key == protect:
+                continue
+            try:
+                os.remove(os.path.join(self.cache_dir, key))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Error evicting cached preview {key}: {e}")
+                continue
+            total -= entry['size']
+            del self.entries[key]
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            entries = {}
+        except Exception as e:
+            print(f"Error loading preview cache index: {e}")
+            entries = {}
+        self.entries = {
+            key: entry for key, entry in entries.items()
+            if os.path.exists(os.path.join(self.cache_dir, key))
+        }
+        # Descargas interrumpidas por un reinicio: archivos fuera del índice
+        for name in os.listdir(self.cache_dir):
+            if not name.startswith('.') and name not in self.entries:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+    def _save(self):
+        tmp_path = self.index_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"Error saving preview cache index: {e}")
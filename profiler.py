@@ -0,0 +1,245 @@
+"""
+Profiler Module
+Perfilado bajo demanda, activable en caliente: muestreo periódico de las pilas
+de todos los hilos (formato folded de flamegraph.pl/speedscope) y registro de
+las peticiones lentas con su tiempo por tramo y dónde estaban detenidas
+"""
+
+import collections
+import contextlib
+import os
+import sys
+import threading
+import time
+
+MAX_DEPTH = 64
+# Pilas distintas que guarda cada petición lenta
+MAX_TRACE_STACKS = 50
+
+
+def fold_stack(frame, thread_name, max_depth=MAX_DEPTH):
+    """'hilo;archivo:función;...' de la raíz a la hoja, como espera flamegraph.pl"""
+    names = []
+    while frame is not None and len(names) < max_depth:
+        code = frame.f_code
+        names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    names.append(thread_name.replace(';', ':'))
+    return ';'.join(reversed(names))
+
+
+class Trace:
+    """
+    Tiempo exclusivo por tramo: mientras un tramo anidado está abierto, el
+    de afuera no acumula. Lo que no cae en ningún tramo va a 'handler'
+    (operaciones de la playlist y lógica de la ruta).
+    """
+
+    __slots__ = ('route', 'method', 'thread_id', 'started_at', 'started', 'duration', 'status',
+                 'spans', 'stacks', '_open', '_mark')
+
+    def __init__(self, route, method):
+        self.route = route
+        self.method = method
+        self.thread_id = threading.get_ident()
+        self.started_at = time.time()
+        self.started = self._mark = time.perf_counter()
+        self.duration = None
+        self.status = None
+        self.spans = {}
+        self.stacks = collections.Counter()
+        self._open = []
+
+    def _charge(self):
+        now = time.perf_counter()
+        name = self._open[-1] if self._open else 'handler'
+        self.spans[name] = self.spans.get(name, 0.0) + now - self._mark
+        self._mark = now
+
+    def enter(self, name):
+        self._charge()
+        self._open.append(name)
+
+    def exit(self):
+        self._charge()
+        self._open.pop()
+
+    def finish(self, status):
+        self._charge()
+        self.status = status
+        self.duration = self._mark - self.started
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def to_dict(self):
+        return {
+            'route': self.route,
+            'method': self.method,
+            'status': self.status,
+            'started_at': self.started_at,
+            'duration_ms': round((self.duration if self.duration is not None else self.elapsed()) * 1000, 2),
+            'in_flight': self.duration is None,
+            'spans_ms': {name: round(value * 1000, 2) for name, value in dict(self.spans).items()},
+            'stacks': [{'stack': stack, 'samples': count} for stack, count in self.stacks.most_common()],
+        }
+
+
+class _Span:
+    __slots__ = ('trace', 'name')
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.trace.enter(self.name)
+
+    def __exit__(self, *exc):
+        self.trace.exit()
+
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+class Profiler:
+    """
+    Un hilo ``profiler`` se despierta cada ``interval`` s mientras el
+    muestreo o el registro de lentas estén activos. Con el muestreo suma la
+    pila de cada hilo; con el registro, guarda la pila de las peticiones en
+    curso que ya superaron ``slow_threshold`` (así se ve dónde está colgada
+    una petición antes de que termine). Desactivados no hay hilo y ``span``
+    no hace nada. El estado es por proceso (por worker de gunicorn).
+    """
+
+    def __init__(self, interval=0.01, slow_threshold=1.0, slow_log_size=100):
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.sampling = False
+        self.tracing = False
+        self.samples = 0
+        self.sampling_since = None
+        self._folded = collections.Counter()
+        self._slow = collections.deque(maxlen=slow_log_size)
+        self._active = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._stop.set()
+
+    def configure(self, sampling=None, tracing=None, interval=None, slow_threshold=None):
+        with self._lock:
+            if interval is not None:
+                if interval <= 0:
+                    raise ValueError('interval must be positive')
+                self.interval = interval
+            if slow_threshold is not None:
+                if slow_threshold < 0:
+                    raise ValueError('slow_threshold must not be negative')
+                self.slow_threshold = slow_threshold
+            if sampling is not None:
+                if sampling and not self.sampling:
+                    self.sampling_since = time.time()
+                self.sampling = bool(sampling)
+            if tracing is not None:
+                self.tracing = bool(tracing)
+                if not self.tracing:
+                    self._active.clear()
+            if not (self.sampling or self.tracing):
+                self._stop.set()
+            elif self._stop.is_set():
+                # Un evento por hilo: el anterior termina aunque aún no haya despertado
+                self._stop = threading.Event()
+                threading.Thread(target=self._run, args=(self._stop,), name='profiler', daemon=True).start()
+
+    def resize_slow_log(self, size):
+        with self._lock:
+            self._slow = collections.deque(self._slow, maxlen=size)
+
+    def reset(self):
+        with self._lock:
+            self._folded.clear()
+            self.samples = 0
+            self._slow.clear()
+            if self.sampling:
+                self.sampling_since = time.time()
+
+    def status(self):
+        return {
+            'pid': os.getpid(),
+            'sampling': self.sampling,
+            'tracing': self.tracing,
+            'interval': self.interval,
+            'slow_threshold': self.slow_threshold,
+            'samples': self.samples,
+            'sampling_since': self.sampling_since,
+            'distinct_stacks': len(self._folded),
+            'slow_requests': len(self._slow),
+        }
+
+    def folded(self):
+        """Una línea por pila: '<pila> <muestras>'"""
+        with self._lock:
+            items = self._folded.most_common()
+        return ''.join(f'{stack} {count}\n' for stack, count in items)
+
+    def slow_requests(self):
+        """Las más recientes primero; incluye las que siguen en curso y ya son lentas"""
+        with self._lock:
+            finished = [trace.to_dict() for trace in reversed(self._slow)]
+            running = [trace.to_dict() for trace in self._active.values()
+                       if trace.elapsed() >= self.slow_threshold]
+        return running + finished
+
+    # Peticiones
+
+    def begin(self, route, method):
+        if not self.tracing:
+            return
+        trace = self._local.trace = Trace(route, method)
+        with self._lock:
+            self._active[trace.thread_id] = trace
+
+    def end(self, status):
+        trace = getattr(self._local, 'trace', None)
+        if trace is None:
+            return
+        self._local.trace = None
+        trace.finish(status)
+        with self._lock:
+            self._active.pop(trace.thread_id, None)
+            if trace.duration >= self.slow_threshold:
+                self._slow.append(trace)
+
+    def span(self, name):
+        """``with PROFILER.span('persistence'):`` atribuye ese tiempo a la petición en curso"""
+        trace = getattr(self._local, 'trace', None)
+        if trace is None:
+            return _NO_SPAN
+        return _Span(trace, name)
+
+    # Hilo de muestreo
+
+    def _run(self, stop):
+        me = threading.get_ident()
+        while not stop.wait(self.interval):
+            frames = sys._current_frames()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            with self._lock:
+                if self.sampling:
+                    self.samples += 1
+                    for ident, frame in frames.items():
+                        if ident != me:
+                            self._folded[fold_stack(frame, names.get(ident, str(ident)))] += 1
+                for ident, trace in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is None or trace.elapsed() < self.slow_threshold:
+                        continue
+                    stack = fold_stack(frame, names.get(ident, str(ident)))
+                    if stack in trace.stacks or len(trace.stacks) < MAX_TRACE_STACKS:
+                        trace.stacks[stack] += 1
+            del frames
+
+
+# Perfilador del proceso
+PROFILER = Profiler()
@@ -0,0 +1,120 @@
+"""
+RWLock Module
+Lock de lectores/escritor para la playlist: las peticiones de lectura corren
+en paralelo entre sí y las mutaciones son exclusivas
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+class RWLock:
+    """
+    Por fases: si hay un escritor esperando, los lectores nuevos esperan (un
+    flujo continuo de lecturas no lo deja sin turno), y cuando un escritor
+    termina entran los lectores que ya esperaban en ese momento, y solo ellos,
+    antes que el siguiente escritor (un flujo continuo de escrituras tampoco).
+    Cada lector que espera guarda el número de fase en que llegó; ``release``
+    abre una fase nueva y cuenta cuántos lectores admite. ``acquire``/``release``
+    toman la escritura, así que sirve donde se esperaba un RLock. El escritor
+    es reentrante y puede tomar lecturas; las lecturas también son
+    reentrantes, pero un lector no puede pasar a escritor
+    (dos lectores que lo intentaran se bloquearían mutuamente): RuntimeError.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._write_depth = 0
+        self._waiting_writers = 0
+        self._waiting_readers = 0
+        # Fase de lectura actual y lectores admitidos en ella que aún no entraron
+        self._phase = 0
+        self._admitted = 0
+        self._local = threading.local()
+
+    def _reads(self):
+        return getattr(self._local, 'reads', 0)
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        reads = self._reads()
+        with self._cond:
+            if self._writer != me and not reads:
+                ticket = self._phase
+                self._waiting_readers += 1
+                try:
+                    while self._writer is not None or (self._waiting_writers and self._phase == ticket):
+                        self._cond.wait()
+                finally:
+                    self._waiting_readers -= 1
+                    if self._phase != ticket:
+                        # Admitido por release(); si la espera se interrumpió, el escritor no lo espera más
+                        self._admitted -= 1
+                        if not self._admitted:
+                            self._cond.notify_all()
+            self._readers += 1
+        self._local.reads = reads + 1
+
+    def release_read(self):
+        self._local.reads = self._reads() - 1
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._write_depth += 1
+                return True
+            if self._reads():
+                raise RuntimeError('Cannot upgrade a read lock to a write lock')
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers or self._admitted:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._write_depth = 1
+            return True
+
+    def release(self):
+        with self._cond:
+            if self._writer != threading.get_ident():
+                raise RuntimeError('Cannot release a write lock held by another thread')
+            self._write_depth -= 1
+            if not self._write_depth:
+                self._writer = None
+                self._phase += 1
+                self._admitted = self._waiting_readers
+                self._cond.notify_all()
+
+    acquire_write = acquire
+    release_write = release
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    @contextmanager
+    def read_locked(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_locked(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
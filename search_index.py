@@ -0,0 +1,204 @@
+"""
+Search Index Module
+Índices incrementales sobre los nodos de la playlist: índice invertido
+(tokens + trigramas) para /search y multimapas hash por título y por path
+"""
+
+import bisect
+import heapq
+import itertools
+import re
+import unicodedata
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def fold(text):
+    """Normaliza para buscar: sin acentos y con case folding Unicode ('Canción' -> 'cancion')"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def matches(folded_title, folded_query, prefix=False):
+    """Comprobación directa (sin índice) con la misma semántica que SearchIndex.search"""
+    if not prefix:
+        return folded_query in folded_title
+    words = _TOKEN_RE.findall(folded_title)
+    return all(any(word.startswith(token) for word in words) for token in _TOKEN_RE.findall(folded_query))
+
+
+class SearchIndex:
+    """
+    Mantiene, por nodo de la playlist, el título normalizado y sus postings de
+    tokens y trigramas. Se actualiza desde los hooks de inserción/borrado de la
+    playlist y se construye de forma diferida en la primera búsqueda.
+
+    - Subcadena: intersección de los postings de los trigramas de la consulta y
+      verificación sobre el título normalizado (coste según los candidatos).
+    - Prefijo: cada palabra de la consulta debe ser prefijo de alguna palabra
+      del título; el vocabulario ordenado permite ubicar los prefijos con bisect.
+    - Consultas sin trigramas (menos de 3 caracteres) o prefijo sin palabras:
+      no hay postings que filtren, se recorren los nodos en orden (``ordered``).
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.folded = {}
+        self.token_postings = {}
+        self.trigram_postings = {}
+        self.vocabulary = []
+
+    def rebuild(self, nodes):
+        self.clear()
+        self.ready = True
+        for node in nodes:
+            self._index(node)
+        # Ordenado una sola vez: insort por token sería O(V²) en el vocabulario
+        self.vocabulary = sorted(self.token_postings)
+
+    def clear(self):
+        self.folded = {}
+        self.token_postings = {}
+        self.trigram_postings = {}
+        self.vocabulary = []
+
+    def add(self, node):
+        if not self.ready:
+            return
+        for token in self._index(node):
+            bisect.insort(self.vocabulary, token)
+
+    def _index(self, node):
+        """Agrega el nodo a los postings; devuelve los tokens que no estaban en el vocabulario"""
+        folded = fold(node.track.title)
+        self.folded[node] = folded
+        new_tokens = []
+        for token in set(_TOKEN_RE.findall(folded)):
+            postings = self.token_postings.get(token)
+            if postings is None:
+                postings = self.token_postings[token] = set()
+                new_tokens.append(token)
+            postings.add(node)
+        for gram in trigrams(folded):
+            self.trigram_postings.setdefault(gram, set()).add(node)
+        return new_tokens
+
+    def discard(self, node):
+        if not self.ready:
+            return
+        folded = self.folded.pop(node, None)
+        if folded is None:
+            return
+        for token in set(_TOKEN_RE.findall(folded)):
+            postings = self.token_postings[token]
+            postings.discard(node)
+            if not postings:
+                del self.token_postings[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+        for gram in trigrams(folded):
+            postings = self.trigram_postings[gram]
+            postings.discard(node)
+            if not postings:
+                del self.trigram_postings[gram]
+
+    def search(self, query, prefix=False, ordered=None, limit=None, key=None):
+        """
+        Nodos que coinciden, a lo sumo ``limit``, en el orden de ``key`` (posición
+        en la playlist). Si la consulta no usa los postings y se pasa ``ordered``
+        (los nodos en ese mismo orden), se recorre y se corta en ``limit``.
+        """
+        query = fold(query).strip()
+        if prefix:
+            tokens = _TOKEN_RE.findall(query)
+            scan = not tokens
+        else:
+            scan = len(query) < 3
+        if scan:
+            # Sin trigramas ni palabras que filtren: títulos ya normalizados, en orden
+            nodes = self.folded if ordered is None else ordered
+            found = nodes if prefix else (node for node in nodes if query in self.folded[node])
+            if ordered is not None:
+                return list(itertools.islice(found, limit))
+        else:
+            found = self._search_prefix(tokens) if prefix else self._search_substring(query)
+        if limit is None:
+            return sorted(found, key=key)
+        return heapq.nsmallest(limit, found, key=key)
+
+    def _search_substring(self, query):
+        postings = []
+        for gram in trigrams(query):
+            gram_postings = self.trigram_postings.get(gram)
+            if not gram_postings:
+                return set()
+            postings.append(gram_postings)
+        postings.sort(key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        return {node for node in candidates if query in self.folded[node]}
+
+    def _search_prefix(self, tokens):
+        result = None
+        for token in sorted(set(tokens), key=len, reverse=True):
+            found = set()
+            i = bisect.bisect_left(self.vocabulary, token)
+            while i < len(self.vocabulary) and self.vocabulary[i].startswith(token):
+                found.update(self.token_postings[self.vocabulary[i]])
+                i += 1
+            result = found if result is None else result & found
+            if not result:
+                return set()
+        return result
+
+
+class LookupIndex:
+    """
+    Multimapas título (case folded) -> nodos y path -> nodos, con el mismo
+    protocolo de hooks que SearchIndex. Cada valor es un dict usado como
+    conjunto ordenado, así que altas y bajas son O(1) en promedio.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.by_title = {}
+        self.by_path = {}
+
+    def rebuild(self, nodes):
+        self.clear()
+        self.ready = True
+        for node in nodes:
+            self.add(node)
+
+    def clear(self):
+        self.by_title = {}
+        self.by_path = {}
+
+    def add(self, node):
+        if not self.ready:
+            return
+        self.by_title.setdefault(node.track.title.casefold(), {})[node] = None
+        self.by_path.setdefault(node.track.path, {})[node] = None
+
+    def discard(self, node):
+        if not self.ready:
+            return
+        self._discard(self.by_title, node.track.title.casefold(), node)
+        self._discard(self.by_path, node.track.path, node)
+
+    @staticmethod
+    def _discard(multimap, key, node):
+        nodes = multimap.get(key)
+        if nodes is None:
+            return
+        nodes.pop(node, None)
+        if not nodes:
+            del multimap[key]
+
+    def find_title(self, title):
+        return list(self.by_title.get(title.casefold(), ()))
+
+    def find_path(self, path):
+        return list(self.by_path.get(path, ()))
@@ -0,0 +1,68 @@
+"""
+Shuffle Order Module
+Orden aleatorio de reproducción sin reordenar la playlist: una permutación de
+las posiciones [0, n) que se calcula posición por posición (red de Feistel
+con cycle walking), con memoria O(1) y su inversa igual de barata
+"""
+
+MASK64 = (1 << 64) - 1
+ROUNDS = 4
+
+
+def _mix(value):
+    """Finalizador de splitmix64: difunde cada bit de entrada en toda la salida"""
+    value = (value ^ (value >> 30)) * 0xBF58476D1CE4E5B9 & MASK64
+    value = (value ^ (value >> 27)) * 0x94D049BB133111EB & MASK64
+    return value ^ (value >> 31)
+
+
+class ShuffleOrder:
+    """
+    Biyección ``forward`` de [0, n) en [0, n) determinada por ``seed``: la
+    posición k del orden aleatorio es la pista ``forward(k)``, y
+    ``inverse(i)`` dice en qué posición del orden está la pista i. La
+    permutación se recorre como un ciclo; el mismo (seed, n) da el mismo
+    orden en cualquier proceso.
+    """
+
+    __slots__ = ('seed', 'n', '_half_bits', '_half_mask', '_keys')
+
+    def __init__(self, seed, n):
+        self.seed = seed
+        self.n = n
+        # Dominio 2^(2h) >= n: menos de 4 vueltas de cycle walking en promedio
+        bits = max(2, (max(n, 2) - 1).bit_length())
+        self._half_bits = (bits + 1) // 2
+        self._half_mask = (1 << self._half_bits) - 1
+        self._keys = [_mix((seed & MASK64) ^ _mix(round_number + 1)) for round_number in range(ROUNDS)]
+
+    def _round(self, key, value):
+        return _mix(key ^ value) & self._half_mask
+
+    def _encrypt(self, value):
+        left, right = value >> self._half_bits, value & self._half_mask
+        for key in self._keys:
+            left, right = right, left ^ self._round(key, right)
+        return (left << self._half_bits) | right
+
+    def _decrypt(self, value):
+        left, right = value >> self._half_bits, value & self._half_mask
+        for key in reversed(self._keys):
+            left, right = right ^ self._round(key, left), left
+        return (left << self._half_bits) | right
+
+    def forward(self, position):
+        value = self._encrypt(position)
+        while value >= self.n:  # cycle walking: se queda dentro de [0, n)
+            value = self._encrypt(value)
+        return value
+
+    def inverse(self, index):
+        value = self._decrypt(index)
+        while value >= self.n:
+            value = self._decrypt(value)
+        return value
+
+    def step(self, index, offset):
+        """La pista ``offset`` lugares después (o antes) de ``index`` en el orden aleatorio"""
+        return self.forward((self.inverse(index) + offset) % self.n)
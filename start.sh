@@ -9,5 +9,9 @@ chmod 755 uploads downloads sessions
 # Set default port if not provided (Render uses 10000 by default)
 export PORT=${PORT:-10000}
 
-# Start the application
-exec gunicorn --bind 0.0.0.0:$PORT --workers 1 --timeout 120 --worker-class sync backend:app
\ No newline at end of file
+# Start the application (gthread: /events and audio streams hold a thread, not the
+# whole worker; SERVER=asgi serves /events with coroutines instead of threads)
+if [ "$SERVER" = asgi ]; then
+    exec uvicorn asgi:app --host 0.0.0.0 --port $PORT
+fi
+exec gunicorn --bind 0.0.0.0:$PORT --workers ${WEB_CONCURRENCY:-1} --timeout 120 --worker-class gthread --threads ${GUNICORN_THREADS:-32} backend:app
\ No newline at end of file
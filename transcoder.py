@@ -0,0 +1,168 @@
+"""
+Transcoder Module
+Versiones ligeras de cada pista (Opus 96k, MP3 128k) normalizadas en volumen
+según EBU R128, generadas con ffmpeg en segundo plano y guardadas en caché
+"""
+
+import atexit
+import json
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Objetivo de loudnorm (EBU R128 para streaming): -16 LUFS, pico real -1.5 dBTP
+LOUDNORM = 'I=-16:TP=-1.5:LRA=11'
+
+RENDITIONS = {
+    'opus': {
+        'extension': 'opus',
+        'mimetypes': ('audio/ogg', 'audio/opus'),
+        'args': ['-c:a', 'libopus', '-b:a', '96k', '-ar', '48000'],
+    },
+    'mp3': {
+        'extension': 'mp3',
+        'mimetypes': ('audio/mpeg', 'audio/mp3'),
+        'args': ['-c:a', 'libmp3lame', '-b:a', '128k', '-ar', '44100'],
+    },
+}
+
+
+def rendition_for_mimetypes(accept):
+    """
+    Versión pedida explícitamente en un header Accept (werkzeug MIMEAccept), o
+    None. Los comodines no cuentan: los navegadores envían */* para <audio>.
+    """
+    for value, quality in accept:
+        if quality <= 0 or '*' in value:
+            continue
+        for name, rendition in RENDITIONS.items():
+            if value in rendition['mimetypes']:
+                return name
+    return None
+
+
+class Transcoder:
+    """
+    ``submit(source)`` encola un trabajo por archivo: mide la sonoridad una vez
+    (primera pasada de loudnorm) y codifica cada versión que falte con los
+    valores medidos (segunda pasada, lineal). ``max_workers`` acota cuántos
+    ffmpeg corren a la vez. ``lookup`` devuelve la versión lista o la encola.
+    Las versiones viven en ``cache_dir`` como ``<carpeta>-<archivo>.<ext de la versión>``
+    y se expulsan por antigüedad cuando superan ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir, max_bytes, max_workers=1, ffmpeg='ffmpeg', timeout=600):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ffmpeg = ffmpeg
+        self.timeout = timeout
+        self._pending = set()
+        # source -> mtime del intento fallido: no se reintenta hasta que cambie el archivo
+        self._failed = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='transcode')
+        os.makedirs(cache_dir, exist_ok=True)
+        atexit.register(self.shutdown)
+
+    def rendition_filename(self, source, rendition):
+        folder = os.path.basename(os.path.dirname(source))
+        return f"{folder}-{os.path.basename(source)}.{RENDITIONS[rendition]['extension']}"
+
+    def lookup(self, source, rendition):
+        """Nombre del archivo de la versión en ``cache_dir`` si está al día; si no, la encola"""
+        filename = self.rendition_filename(source, rendition)
+        if self._is_fresh(source, os.path.join(self.cache_dir, filename)):
+            return filename
+        self.submit(source)
+        return None
+
+    def submit(self, source):
+        try:
+            mtime = os.path.getmtime(source)
+        except OSError:
+            return
+        with self._lock:
+            if source in self._pending or self._failed.get(source) == mtime:
+                return
+            self._pending.add(source)
+        self._executor.submit(self._transcode, source)
+
+    def _is_fresh(self, source, target):
+        try:
+            return os.path.getmtime(target) >= os.path.getmtime(source)
+        except OSError:
+            return False
+
+    def _transcode(self, source):
+        try:
+            missing = [
+                name for name in RENDITIONS
+                if not self._is_fresh(source, os.path.join(self.cache_dir, self.rendition_filename(source, name)))
+            ]
+            if not missing:
+                return
+            loudnorm = self._loudnorm_filter(source)
+            for name in missing:
+                target = os.path.join(self.cache_dir, self.rendition_filename(source, name))
+                tmp_path = f"{target}.tmp.{RENDITIONS[name]['extension']}"
+                self._run([
+                    self.ffmpeg, '-hide_banner', '-nostdin', '-y', '-i', source,
+                    '-vn', '-map_metadata', '0', '-af', loudnorm,
+                    *RENDITIONS[name]['args'], tmp_path,
+                ])
+                os.replace(tmp_path, target)
+            self._evict()
+        except (subprocess.SubprocessError, OSError, ValueError) as e:
+            print(f"Error transcoding {source}: {e}")
+            try:
+                self._failed[source] = os.path.getmtime(source)
+            except OSError:
+                pass
+        finally:
+            with self._lock:
+                self._pending.discard(source)
+
+    def _loudnorm_filter(self, source):
+        """Primera pasada: mide la sonoridad y devuelve el filtro de la segunda"""
+        result = self._run([
+            self.ffmpeg, '-hide_banner', '-nostdin', '-i', source,
+            '-vn', '-af', f'loudnorm={LOUDNORM}:print_format=json', '-f', 'null', '-',
+        ])
+        stderr = result.stderr.decode('utf-8', 'replace')
+        # loudnorm imprime el JSON al final de stderr
+        measured = json.loads(stderr[stderr.rindex('{'):stderr.rindex('}') + 1])
+        return (
+            f'loudnorm={LOUDNORM}'
+            f":measured_I={measured['input_i']}:measured_TP={measured['input_tp']}"
+            f":measured_LRA={measured['input_lra']}:measured_thresh={measured['input_thresh']}"
+            f":offset={measured['target_offset']}:linear=true"
+        )
+
+    def _run(self, command):
+        return subprocess.run(command, capture_output=True, timeout=self.timeout, check=True)
+
+    def _evict(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if '.tmp.' in name:
+                continue  # codificación en curso
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            # atime (relatime) se actualiza al servir el archivo: aproxima LRU
+            files.append((stat.st_atime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError as e:
+                print(f"Error evicting rendition {path}: {e}")
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
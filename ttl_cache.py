@@ -0,0 +1,124 @@
+"""
+TTL Cache Module
+Caché en memoria con expiración por entrada y expulsión LRU acotada, con un
+nivel opcional en disco (SQLite) que sobrevive a los reinicios
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    ``get``/``set`` sobre un OrderedDict (orden = recencia de uso). Si se indica
+    ``disk_path``, los valores (serializables en JSON) también se guardan en una
+    tabla SQLite compartida, separada por ``namespace``; un fallo en memoria
+    consulta el disco y promueve la entrada. Los contadores se exponen con ``stats``.
+    """
+
+    def __init__(self, maxsize=256, ttl=3600, disk_path=None, namespace='default'):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.namespace = namespace
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._db = None
+        if disk_path:
+            try:
+                self._db = sqlite3.connect(disk_path, check_same_thread=False)
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS cache ('
+                    'namespace TEXT, key TEXT, value TEXT, expires REAL, '
+                    'PRIMARY KEY (namespace, key))'
+                )
+                self._db.execute('DELETE FROM cache WHERE expires < ?', (time.time(),))
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Error opening cache database {disk_path}: {e}")
+                self._db = None
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.expirations += 1
+            entry = self._disk_get(key, now)
+            if entry is not None:
+                value, expires = entry
+                self._store(key, value, expires)
+                self.hits += 1
+                self.disk_hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._store(key, value, expires)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO cache (namespace, key, value, expires) VALUES (?, ?, ?, ?)',
+                        (self.namespace, key, json.dumps(value, ensure_ascii=False), expires)
+                    )
+                    self._db.commit()
+                except (sqlite3.Error, TypeError, ValueError) as e:
+                    print(f"Error writing cache entry to disk: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM cache WHERE namespace = ?', (self.namespace,))
+                self._db.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'disk_hits': self.disk_hits,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _store(self, key, value, expires):
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_get(self, key, now):
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                'SELECT value, expires FROM cache WHERE namespace = ? AND key = ?',
+                (self.namespace, key)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None or row[1] <= now:
+            return None
+        return json.loads(row[0]), row[1]
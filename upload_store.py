@@ -0,0 +1,288 @@
+"""
+Upload Store Module
+Subidas en streaming direccionadas por contenido: el cuerpo se escribe por
+bloques directo a disco calculando su SHA-256 (el mismo audio se guarda una
+sola vez) y las subidas grandes se pueden reanudar por sesiones
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+CHUNK_SIZE = 64 * 1024
+_EXTENSION_RE = re.compile(r'^\.[a-z0-9]{1,8}$')
+_SESSION_ID_RE = re.compile(r'[0-9a-f]{32}')
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code=400, **details):
+        super().__init__(message)
+        self.status_code = status_code
+        self.details = details
+
+
+def safe_extension(filename):
+    extension = os.path.splitext(filename or '')[1].lower()
+    return extension if _EXTENSION_RE.match(extension) else ''
+
+
+class IncomingFile:
+    """Archivo temporal que se va escribiendo y hasheando; ``commit`` lo deduplica"""
+
+    def __init__(self, store, extension):
+        self.store = store
+        self.extension = extension
+        self.path = os.path.join(store.upload_folder, f'.incoming-{uuid.uuid4().hex}')
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self._file = open(self.path, 'wb')
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.store.max_size:
+            raise UploadError('File too large', 413)
+        self._file.write(data)
+        self.hasher.update(data)
+
+    def commit(self):
+        self._file.close()
+        return self.store.commit(self.path, self.hasher.hexdigest(), self.extension)
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class UploadStore:
+    """
+    Los archivos se guardan como ``<sha256><extensión>`` en la carpeta de
+    subidas. Las sesiones reanudables viven en ``.sessions/``: ``<id>.json``
+    con los metadatos y ``<id>.part`` con los datos; el offset confirmado es el
+    tamaño del ``.part``, así que sobrevive a reinicios sin escribir estado por bloque.
+    """
+
+    SESSIONS_DIR = '.sessions'
+
+    def __init__(self, upload_folder, max_size, session_ttl=24 * 3600):
+        self.upload_folder = upload_folder
+        self.sessions_dir = os.path.join(upload_folder, self.SESSIONS_DIR)
+        self.max_size = max_size
+        self.session_ttl = session_ttl
+        # id de sesión -> (offset, hasher) para no rehashear el .part en cada bloque
+        self._hashers = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.sessions_dir, exist_ok=True)
+
+    def commit(self, tmp_path, digest, extension):
+        """Mueve ``tmp_path`` a su nombre por contenido; devuelve (filename, ya_existía)"""
+        filename = digest + extension
+        path = os.path.join(self.upload_folder, filename)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            return filename, True
+        os.replace(tmp_path, path)
+        return filename, False
+
+    def save_stream(self, stream, original_filename):
+        incoming = IncomingFile(self, safe_extension(original_filename))
+        try:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                incoming.write(chunk)
+        except BaseException:
+            incoming.abort()
+            raise
+        return incoming.commit()
+
+    def save_multipart(self, stream, boundary, field='file'):
+        """
+        Decodifica un cuerpo multipart/form-data por bloques y guarda el campo
+        ``field``. Devuelve (nombre original, filename, ya_existía) o None si no
+        vino; UploadError si vino sin nombre de archivo.
+        """
+        decoder = MultipartDecoder(boundary.encode('latin-1'))
+        incoming = None
+        original_filename = None
+        target = None
+        try:
+            while True:
+                event = decoder.next_event()
+                if isinstance(event, NeedData):
+                    decoder.receive_data(stream.read(CHUNK_SIZE) or None)
+                elif isinstance(event, File):
+                    target = None
+                    if event.name == field and incoming is None:
+                        # Sin nombre (el navegador no eligió archivo): nada que guardar
+                        if not event.filename:
+                            raise UploadError('No selected file')
+                        original_filename = event.filename
+                        incoming = target = IncomingFile(self, safe_extension(original_filename))
+                elif isinstance(event, Field):
+                    target = None
+                elif isinstance(event, Data):
+                    if target is not None:
+                        target.write(event.data)
+                elif isinstance(event, Epilogue):
+                    break
+        except BaseException:
+            if incoming is not None:
+                incoming.abort()
+            raise
+        if incoming is None:
+            return None
+        filename, existed = incoming.commit()
+        return original_filename, filename, existed
+
+    # Sesiones reanudables
+
+    def create_session(self, original_filename, size):
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError('A positive size is required')
+        if size > self.max_size:
+            raise UploadError('File too large', 413)
+        self._purge_expired()
+        session = {
+            'id': uuid.uuid4().hex,
+            'filename': original_filename,
+            'extension': safe_extension(original_filename),
+            'size': size,
+            'created_at': time.time(),
+        }
+        open(self._part_path(session['id']), 'wb').close()
+        self._write_session(session)
+        return self._status(session)
+
+    def get_session(self, upload_id):
+        session = self._read_session(upload_id)
+        return self._status(session) if session else None
+
+    def append(self, upload_id, offset, stream):
+        """
+        Agrega el cuerpo en ``offset``; si no coincide con lo recibido responde 409
+        con el offset real. Al completar el tamaño declarado, guarda el archivo.
+        """
+        if not _SESSION_ID_RE.fullmatch(upload_id):
+            raise UploadError('Upload session not found', 404)
+        with self._session_lock(upload_id):
+            session = self._read_session(upload_id)
+            if session is None:
+                raise UploadError('Upload session not found', 404)
+            part_path = self._part_path(upload_id)
+            current = os.path.getsize(part_path)
+            if offset != current:
+                raise UploadError('Offset mismatch', 409, offset=current)
+            hasher = self._hasher(upload_id, part_path, current)
+            try:
+                with open(part_path, 'ab') as f:
+                    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                        if current + len(chunk) > session['size']:
+                            raise UploadError('Chunk exceeds declared size', 413)
+                        f.write(chunk)
+                        hasher.update(chunk)
+                        current += len(chunk)
+            except UploadError:
+                # Se descarta el bloque entero que excede el tamaño declarado
+                self._hashers.pop(upload_id, None)
+                with open(part_path, 'r+b') as f:
+                    f.truncate(offset)
+                raise
+            except BaseException:
+                # Bloque cortado: lo confirmado es lo que llegó a disco, se rehashea al reanudar
+                self._hashers.pop(upload_id, None)
+                raise
+            self._hashers[upload_id] = (current, hasher)
+            status = self._status(session, current)
+            if current == session['size']:
+                filename, existed = self.commit(part_path, hasher.hexdigest(), session['extension'])
+                self._drop_session(upload_id)
+                status.update({'complete': True, 'stored_filename': filename, 'duplicate': existed})
+            return status
+
+    def cancel(self, upload_id):
+        if not _SESSION_ID_RE.fullmatch(upload_id):
+            return False
+        with self._session_lock(upload_id):
+            if self._read_session(upload_id) is None:
+                return False
+            self._drop_session(upload_id)
+            try:
+                os.remove(self._part_path(upload_id))
+            except OSError:
+                pass
+            return True
+
+    def _status(self, session, offset=None):
+        if offset is None:
+            offset = os.path.getsize(self._part_path(session['id']))
+        return {
+            'id': session['id'],
+            'filename': session['filename'],
+            'size': session['size'],
+            'offset': offset,
+            'complete': False,
+        }
+
+    def _hasher(self, upload_id, part_path, offset):
+        cached = self._hashers.get(upload_id)
+        if cached is not None and cached[0] == offset:
+            return cached[1]
+        hasher = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                hasher.update(chunk)
+        return hasher
+
+    def _session_lock(self, upload_id):
+        with self._lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _session_path(self, upload_id):
+        return os.path.join(self.sessions_dir, f'{upload_id}.json')
+
+    def _part_path(self, upload_id):
+        return os.path.join(self.sessions_dir, f'{upload_id}.part')
+
+    def _read_session(self, upload_id):
+        if not _SESSION_ID_RE.fullmatch(upload_id):
+            return None
+        try:
+            with open(self._session_path(upload_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_session(self, session):
+        with open(self._session_path(session['id']), 'w', encoding='utf-8') as f:
+            json.dump(session, f, ensure_ascii=False)
+
+    def _drop_session(self, upload_id):
+        self._hashers.pop(upload_id, None)
+        with self._lock:
+            self._locks.pop(upload_id, None)
+        try:
+            os.remove(self._session_path(upload_id))
+        except OSError:
+            pass
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.session_ttl
+        for name in os.listdir(self.sessions_dir):
+            upload_id, extension = os.path.splitext(name)
+            if extension != '.json':
+                continue
+            try:
+                # El .part se toca en cada bloque: cuenta como última actividad
+                last_activity = os.path.getmtime(self._part_path(upload_id))
+            except OSError:
+                last_activity = 0
+            if last_activity < cutoff:
+                self.cancel(upload_id)
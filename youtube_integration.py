@@ -5,16 +5,79 @@ Maneja la búsqueda y descarga de audio desde YouTube usando API oficial
 
 import yt_dlp
 import os
+import re
+import time
 import uuid
 import requests
+from urllib.parse import urlparse, parse_qs
 from config import Config
+from download_cache import DownloadCache
+from http_client import HTTPClient
+from metrics import REGISTRY
+from profiler import PROFILER
+from ttl_cache import TTLCache
+
+_VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+# Métricas (/metrics): yt-dlp por operación y estrategia, latencia y cuota de la API
+YTDLP_SECONDS = REGISTRY.histogram(
+    'playerpro_ytdlp_seconds', 'Duración de extracciones y descargas con yt-dlp',
+    ('operation', 'strategy', 'outcome'),
+)
+YOUTUBE_API_SECONDS = REGISTRY.histogram(
+    'playerpro_youtube_api_seconds', 'Latencia de la YouTube Data API', ('endpoint', 'status'),
+)
+YOUTUBE_API_QUOTA = REGISTRY.counter(
+    'playerpro_youtube_api_quota_units_total', 'Unidades de cuota de la YouTube Data API consumidas', ('endpoint',),
+)
+# Coste en unidades de cuota por llamada (se cobra aunque la llamada falle)
+API_QUOTA_COST = {'search': 100, 'videos': 1}
+
+
+def observe_ytdlp(operation, strategy, start, ok):
+    YTDLP_SECONDS.observe(time.perf_counter() - start, operation, strategy, 'success' if ok else 'error')
+
+
+def extract_video_id(video_url):
+    """Id canónico de 11 caracteres de cualquier forma de URL de YouTube (o None)"""
+    video_url = (video_url or '').strip()
+    if _VIDEO_ID_RE.match(video_url):
+        return video_url
+    parsed = urlparse(video_url if '://' in video_url else f'https://{video_url}')
+    host = (parsed.hostname or '').lower()
+    candidate = None
+    if host == 'youtu.be':
+        candidate = parsed.path.lstrip('/').split('/')[0]
+    elif host in ('youtube.com', 'youtube-nocookie.com') or host.endswith(('.youtube.com', '.youtube-nocookie.com')):
+        if parsed.path == '/watch':
+            candidate = parse_qs(parsed.query).get('v', [None])[0]
+        else:
+            parts = parsed.path.strip('/').split('/')
+            if len(parts) >= 2 and parts[0] in ('embed', 'shorts', 'live', 'v', 'e'):
+                candidate = parts[1]
+    if candidate and _VIDEO_ID_RE.match(candidate):
+        return candidate
+    return None
+
 
 class YouTubeIntegration:
-    def __init__(self, download_path='downloads'):
+    FALLBACK_FORMAT = 'worst[ext=mp4]/worst'
+
+    def __init__(self, download_path='downloads', is_pinned=None, http=None):
         self.download_path = download_path
+        # Cliente HTTP con conexiones reutilizables (lo comparte la app)
+        self.http = http or HTTPClient()
         self.api_key = Config.YOUTUBE_API_KEY
         self.base_url = "https://www.googleapis.com/youtube/v3"
         os.makedirs(download_path, exist_ok=True)
+        # Caché de audios por id de video; is_pinned protege lo que sigue en la playlist
+        self.download_cache = DownloadCache(download_path, Config.DOWNLOAD_CACHE_MAX_BYTES, is_pinned)
+        # Cachés TTL + LRU de búsquedas e información de videos (opcionalmente en disco)
+        cache_db = Config.YOUTUBE_CACHE_DB or None
+        self.search_cache = TTLCache(Config.YOUTUBE_SEARCH_CACHE_SIZE, Config.YOUTUBE_SEARCH_CACHE_TTL,
+                                     disk_path=cache_db, namespace='search')
+        self.info_cache = TTLCache(Config.YOUTUBE_INFO_CACHE_SIZE, Config.YOUTUBE_INFO_CACHE_TTL,
+                                   disk_path=cache_db, namespace='video_info')
         
         # Configuración para yt-dlp con anti-detección de bots
         self.ydl_opts = {
@@ -68,7 +131,6 @@ class YouTubeIntegration:
             return self.search_youtube_fallback(query, max_results)
         
         try:
-            url = f"{self.base_url}/search"
             params = {
                 'part': 'snippet',
                 'q': query,
@@ -79,7 +141,7 @@ class YouTubeIntegration:
                 'order': 'relevance'
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            response = self._api_get('search', params)
             response.raise_for_status()
             data = response.json()
             
@@ -132,17 +194,27 @@ class YouTubeIntegration:
             print(f"Error inesperado en YouTube API: {e}")
             return self.search_youtube_fallback(query, max_results)
     
+    def _api_get(self, endpoint, params):
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            response = self.http.get(f"{self.base_url}/{endpoint}", params=params)
+            status = str(response.status_code)
+            return response
+        finally:
+            YOUTUBE_API_SECONDS.observe(time.perf_counter() - start, endpoint, status)
+            YOUTUBE_API_QUOTA.inc(endpoint, amount=API_QUOTA_COST[endpoint])
+
     def get_video_details(self, video_ids):
         """Obtiene detalles adicionales de los videos"""
         try:
-            url = f"{self.base_url}/videos"
             params = {
                 'part': 'contentDetails,statistics',
                 'id': ','.join(video_ids),
                 'key': self.api_key
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            response = self._api_get('videos', params)
             response.raise_for_status()
             data = response.json()
             
@@ -180,6 +252,13 @@ class YouTubeIntegration:
     
     def search_youtube_fallback(self, query, max_results=10):
         """Método de respaldo usando yt-dlp cuando no hay API key"""
+        start = time.perf_counter()
+        with PROFILER.span('ytdlp'):
+            results = self._search_youtube_fallback(query, max_results)
+        observe_ytdlp('search', 'standard', start, bool(results))
+        return results
+
+    def _search_youtube_fallback(self, query, max_results):
         try:
             opts = {
                 'quiet': True,
@@ -221,44 +300,104 @@ class YouTubeIntegration:
     
     def search_youtube(self, query, max_results=10):
         """Método principal de búsqueda (usa API si está disponible)"""
-        return self.search_youtube_api(query, max_results)
+        # Misma consulta con otro espaciado o mayúsculas -> misma entrada de caché
+        key = f"{' '.join(query.casefold().split())}|{max_results}"
+        results = self.search_cache.get(key)
+        if results is None:
+            results = self.search_youtube_api(query, max_results)
+            # Las listas vacías suelen ser errores transitorios: no se cachean
+            if results:
+                self.search_cache.set(key, results)
+        return results
+
+    def cache_stats(self):
+        return {
+            'search': self.search_cache.stats(),
+            'video_info': self.info_cache.stats(),
+        }
     
-    def download_audio(self, video_url):
+    def download_audio(self, video_url, progress_hook=None, cancelled=None):
+        """
+        Descarga audio de un video de YouTube, reutilizando la caché si ya se descargó.
+        ``cancelled()`` indica si quien pidió la descarga la canceló (ver DownloadCache.coalesce).
+        """
+        video_id = extract_video_id(video_url)
+        if video_id is None:
+            return self._download_audio(video_url, None, progress_hook)
+
+        # Primero el formato preferido; si solo hay la versión de respaldo, también sirve
+        for audio_format in (self.ydl_opts['format'], self.FALLBACK_FORMAT):
+            cached = self.download_cache.get(f'{video_id}:{audio_format}')
+            if cached:
+                return cached
+
+        return self.download_cache.coalesce(
+            f'{video_id}:download',
+            lambda: self._download_audio(video_url, video_id, progress_hook),
+            cancelled
+        )
+
+    def _downloaded_file(self, ydl, info):
+        """Archivo que dejó yt-dlp, a partir de su info (sin listar el directorio)"""
+        for download in info.get('requested_downloads') or []:
+            filepath = download.get('filepath')
+            if filepath and os.path.exists(filepath):
+                return filepath
+        filepath = ydl.prepare_filename(info)
+        return filepath if os.path.exists(filepath) else None
+
+    def _download_with(self, opts, video_url, video_id, strategy):
+        """Extrae y descarga en una sola pasada; registra el archivo en la caché"""
+        start = time.perf_counter()
+        result = None
+        try:
+            result = self._extract_and_download(opts, video_url, video_id)
+            return result
+        finally:
+            observe_ytdlp('download', strategy, start, bool(result and result.get('success')))
+
+    def _extract_and_download(self, opts, video_url, video_id):
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            info = ydl.extract_info(video_url, download=True)
+            if not info:
+                return {'success': False, 'error': 'No se pudo obtener información del video'}
+            title = info.get('title', 'Unknown')
+            uploader = info.get('uploader', 'Unknown')
+
+            filepath = self._downloaded_file(ydl, info)
+            if not filepath:
+                return {'success': False, 'error': 'File not found after download'}
+
+            filename = os.path.basename(filepath)
+            result = {
+                'success': True,
+                'filename': filename,
+                'title': title,
+                'artist': uploader,
+                'path': filepath
+            }
+            if video_id:
+                # Desde aquí el archivo es de la caché (lo libera su desalojo)
+                result['cache_key'] = f'{video_id}:{opts["format"]}'
+                self.download_cache.put(result['cache_key'], filename, title, uploader)
+            return result
+
+    def _download_audio(self, video_url, video_id, progress_hook=None):
         """Descarga audio de un video de YouTube con múltiples estrategias anti-bot"""
         try:
-            # Generar nombre único para el archivo
-            unique_id = str(uuid.uuid4())[:8]
+            # Nombre estable por id de video (caché); único si la URL no es de YouTube
+            file_stem = video_id or str(uuid.uuid4())[:8] + '_%(title)s'
             
             # Configuración específica para descarga
             download_opts = self.ydl_opts.copy()
-            download_opts['outtmpl'] = os.path.join(
-                self.download_path, 
-                f'{unique_id}_%(title)s.%(ext)s'
-            )
+            download_opts['outtmpl'] = os.path.join(self.download_path, f'{file_stem}.%(ext)s')
+            # Progreso (y cancelación) para la cola de descargas en segundo plano
+            if progress_hook:
+                download_opts['progress_hooks'] = [progress_hook]
             
             # Estrategia 1: Configuración estándar mejorada
             try:
-                with yt_dlp.YoutubeDL(download_opts) as ydl:
-                    # Extraer información del video
-                    info = ydl.extract_info(video_url, download=False)
-                    title = info.get('title', 'Unknown')
-                    uploader = info.get('uploader', 'Unknown')
-                    
-                    # Descargar el audio
-                    ydl.download([video_url])
-                    
-                    # Encontrar el archivo descargado
-                    for file in os.listdir(self.download_path):
-                        if file.startswith(unique_id):
-                            return {
-                                'success': True,
-                                'filename': file,
-                                'title': title,
-                                'artist': uploader,
-                                'path': os.path.join(self.download_path, file)
-                            }
-                    
-                    return {'success': False, 'error': 'File not found after download'}
+                return self._download_with(download_opts, video_url, video_id, 'standard')
                     
             except Exception as e1:
                 error_msg = str(e1).lower()
@@ -276,31 +415,20 @@ class YouTubeIntegration:
                         'extractor_retries': 5,
                         'youtube_skip_dash_manifest': True,
                         'youtube_include_dash_manifest': False,
-                        'format': 'worst[ext=mp4]/worst',  # Formato más básico
+                        'format': self.FALLBACK_FORMAT,  # Formato más básico
+                        'outtmpl': os.path.join(self.download_path, f'{file_stem}.fallback.%(ext)s'),
                     })
                     
                     try:
-                        with yt_dlp.YoutubeDL(fallback_opts) as ydl_fallback:
-                            info = ydl_fallback.extract_info(video_url, download=False)
-                            title = info.get('title', 'Unknown')
-                            uploader = info.get('uploader', 'Unknown')
-                            
-                            ydl_fallback.download([video_url])
-                            
-                            for file in os.listdir(self.download_path):
-                                if file.startswith(unique_id):
-                                    return {
-                                        'success': True,
-                                        'filename': file,
-                                        'title': title,
-                                        'artist': uploader,
-                                        'path': os.path.join(self.download_path, file)
-                                    }
+                        result = self._download_with(fallback_opts, video_url, video_id, 'fallback')
+                        if result.get('success'):
+                            return result
                                     
                     except Exception as e2:
                         print(f"🔄 Fallback method also failed: {e2}")
                         
                         # Estrategia 3: Solo extraer información (sin descarga)
+                        start = time.perf_counter()
                         try:
                             info_opts = {
                                 'quiet': True,
@@ -311,6 +439,7 @@ class YouTubeIntegration:
                             
                             with yt_dlp.YoutubeDL(info_opts) as ydl_info:
                                 info = ydl_info.extract_info(video_url, download=False)
+                                observe_ytdlp('download', 'info_only', start, True)
                                 
                                 return {
                                     'success': False, 
@@ -323,6 +452,7 @@ class YouTubeIntegration:
                                 }
                                 
                         except Exception as e3:
+                            observe_ytdlp('download', 'info_only', start, False)
                             return {
                                 'success': False, 
                                 'error': f'YouTube bot detection active. All extraction methods failed. Error: {str(e1)}'
@@ -341,7 +471,19 @@ class YouTubeIntegration:
             return {'success': False, 'error': str(e)}
     
     def get_video_info(self, video_url):
-        """Obtiene información de un video sin descargarlo"""
+        """Obtiene información de un video sin descargarlo (en caché por id de video)"""
+        key = extract_video_id(video_url) or video_url.strip()
+        info = self.info_cache.get(key)
+        if info is None:
+            start = time.perf_counter()
+            with PROFILER.span('ytdlp'):
+                info = self._get_video_info(video_url)
+            observe_ytdlp('info', 'standard', start, 'error' not in info)
+            if 'error' not in info:
+                self.info_cache.set(key, info)
+        return info
+
+    def _get_video_info(self, video_url):
         try:
             opts = {
                 'quiet': True,